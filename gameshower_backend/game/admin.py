@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Game, GameParticipant, JepardyColumn, JepardyQuestion, JepardyTable, GameQuestion, CurrentView
+from .models import Game, GameParticipant, JepardyColumn, JepardyQuestion, JepardyTable, GameQuestion, CurrentView, QuestionImageFrame, JepardyQuestionPlayState, Tournament, TournamentEntry
 
 # Register your models here.
 admin.site.register(Game)
@@ -10,3 +10,7 @@ admin.site.register(JepardyQuestion)
 admin.site.register(JepardyTable)
 admin.site.register(GameQuestion)
 admin.site.register(CurrentView)
+admin.site.register(QuestionImageFrame)
+admin.site.register(JepardyQuestionPlayState)
+admin.site.register(Tournament)
+admin.site.register(TournamentEntry)
@@ -0,0 +1,68 @@
+import bisect
+import hashlib
+from functools import lru_cache
+from django.conf import settings
+from .settings import WORKER_RING_REPLICAS
+
+
+def ring_hash(key: str) -> int:
+    """Stable 64 bit hash of a key, equal in every process."""
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """
+    Consistent hash ring mapping keys to nodes.
+    Every node is placed replicas times on the ring, a key belongs to the next node clockwise.
+    Adding or removing a node only moves the keys of that node's ring segments, about 1/n of all keys.
+    """
+
+    def __init__(self, nodes=(), replicas: int = WORKER_RING_REPLICAS):
+        self.replicas = replicas
+        self._points: list[int] = []
+        self._nodes: list[str] = []
+        for node in nodes:
+            self.add(node)
+
+    def __len__(self):
+        return len(set(self._nodes))
+
+    def add(self, node: str):
+        """Places a node on the ring."""
+        for replica in range(self.replicas):
+            point = ring_hash(f'{node}#{replica}')
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._nodes.insert(index, node)
+
+    def remove(self, node: str):
+        """Takes a node off the ring."""
+        kept = [(point, owner) for point, owner in zip(self._points, self._nodes) if owner != node]
+        self._points = [point for point, _ in kept]
+        self._nodes = [owner for _, owner in kept]
+
+    def node_for(self, key) -> str | None:
+        """The node owning key, None for an empty ring."""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, ring_hash(str(key))) % len(self._points)
+        return self._nodes[index]
+
+
+@lru_cache(maxsize=1)
+def get_worker_ring() -> HashRing:
+    """The ring of all configured worker processes, see GAME_WORKERS."""
+    return HashRing(settings.GAME_WORKERS)
+
+
+def worker_for_game(game_id: int) -> str | None:
+    """The websocket base URL of the worker a game belongs to, None if affinity routing is off."""
+    if not settings.GAME_WORKER or not settings.GAME_WORKERS:
+        return None
+    return get_worker_ring().node_for(f'game_{game_id}')
+
+
+def is_local_game(game_id: int) -> bool:
+    """Whether the connections of a game belong on this worker process."""
+    worker = worker_for_game(game_id)
+    return worker is None or worker == settings.GAME_WORKER
@@ -0,0 +1,287 @@
+from dataclasses import dataclass, field
+from django.db import transaction
+from django.db.models import Q
+from django.template.loader import render_to_string
+from .map_scoring import parse_coordinates
+from .media import IMAGE_QUESTION_TYPES
+from .models import QUESTION_TYPES, GameQuestion, JepardyColumn, JepardyQuestion, JepardyTable
+from .play_state import bump_table_revisions, tables_of
+
+TableColumn = JepardyTable.columns.through
+ColumnQuestion = JepardyColumn.questions.through
+
+OPERATIONS = {
+    'rename_table': ('table', 'name'),
+    'add_column': ('table', 'name'),
+    'rename_column': ('column', 'name'),
+    'remove_column': ('table', 'column'),
+    'add_question': ('column', 'question', 'answer', 'points'),
+    'update_question': ('jepardy_question',),
+    'remove_question': ('column', 'jepardy_question'),
+}
+"""Edit operations of a patch mapped to their required fields. add_column and add_question may carry a 'ref'
+that later operations of the same patch use in place of the id. update_question takes any of question, answer,
+points and type."""
+ID_FIELDS = {'table': JepardyTable, 'column': JepardyColumn, 'jepardy_question': JepardyQuestion}
+"""Fields naming an object, with the model of the object. Columns and questions may be named by ref."""
+QUESTION_FIELDS = {'question': 'question', 'answer': 'answer', 'type': 'question_type'}
+"""Fields of update_question / add_question that live on the GameQuestion, with their model field."""
+
+
+@dataclass
+class PatchResult:
+    created: dict[str, int] = field(default_factory=dict)
+    """Ids of the objects created for the refs of the patch."""
+    table_ids: set[int] = field(default_factory=set)
+    column_ids: set[int] = field(default_factory=set)
+    """Tables and columns whose fragments changed."""
+
+
+class Patch:
+    """Applies edit operations to quiz tables with one lookup per model and one write per kind of change."""
+
+    def __init__(self, operations: list[dict]):
+        self.operations = operations
+        self.refs: dict[str, JepardyColumn | JepardyQuestion] = {}
+        self.new_columns: list[JepardyColumn] = []
+        self.new_questions: list[JepardyQuestion] = []
+        self.table_column_adds: list[tuple[int, JepardyColumn]] = []
+        self.table_column_removes: set[tuple[int, int]] = set()
+        self.column_question_adds: list[tuple[JepardyColumn, JepardyQuestion]] = []
+        self.column_question_removes: set[tuple[int, int]] = set()
+        self.dirty: dict[type, dict[int, object]] = {JepardyTable: {}, JepardyColumn: {}, GameQuestion: {}, JepardyQuestion: {}}
+        self.result = PatchResult()
+
+    def check(self):
+        """Checks the shape of every operation before anything is looked up."""
+        if not isinstance(self.operations, list) or not self.operations:
+            raise ValueError('A patch needs a non-empty list of operations')
+        for index, operation in enumerate(self.operations):
+            if not isinstance(operation, dict) or operation.get('op') not in OPERATIONS:
+                raise ValueError(f'Operation {index}: unknown op, use one of {", ".join(OPERATIONS)}')
+            missing = [name for name in OPERATIONS[operation['op']] if name not in operation]
+            if missing:
+                raise ValueError(f'Operation {index}: {operation["op"]} needs {", ".join(missing)}')
+            if 'points' in operation and (not isinstance(operation['points'], int) or isinstance(operation['points'], bool)):
+                raise ValueError(f'Operation {index}: points must be a number')
+            if 'type' in operation and operation['type'] not in QUESTION_TYPES:
+                raise ValueError(f'Operation {index}: type must be one of {", ".join(QUESTION_TYPES)}')
+            for name in ID_FIELDS:
+                if name in operation and not isinstance(operation[name], (int, str)):
+                    raise ValueError(f'Operation {index}: {name} must be an id or a ref')
+            for name in ('name', *QUESTION_FIELDS):
+                if name in operation and not isinstance(operation[name], str):
+                    raise ValueError(f'Operation {index}: {name} must be text')
+            if operation['op'] in ('add_column', 'add_question') and 'ref' in operation:
+                if not isinstance(operation['ref'], str) or operation['ref'] in self.refs:
+                    raise ValueError(f'Operation {index}: refs must be unique strings')
+                self.refs[operation['ref']] = None
+
+    #region lookups
+    def load(self):
+        """Fetches every table, column and question the operations name, and how they are linked, in five queries."""
+        table_ids, column_ids, question_ids = set(), set(), set()
+        for operation in self.operations:
+            for name, ids in (('table', table_ids), ('column', column_ids), ('jepardy_question', question_ids)):
+                if isinstance(operation.get(name), int):
+                    ids.add(operation[name])
+        self.tables = JepardyTable.objects.in_bulk(table_ids)
+        self.columns = JepardyColumn.objects.in_bulk(column_ids)
+        self.questions = JepardyQuestion.objects.select_related('question').in_bulk(question_ids)
+        self.table_columns = set(TableColumn.objects.filter(jepardytable_id__in=table_ids).values_list('jepardytable_id', 'jepardycolumn_id'))
+        self.column_questions = set(
+            ColumnQuestion.objects.filter(Q(jepardycolumn_id__in=column_ids) | Q(jepardyquestion_id__in=question_ids))
+            .values_list('jepardycolumn_id', 'jepardyquestion_id')
+        )
+
+    def lookup(self, index: int, operation: dict, name: str, objects: dict):
+        key = operation[name]
+        found = self.refs.get(key) if isinstance(key, str) else objects.get(key)
+        if found is None:
+            raise ValueError(f'Operation {index}: unknown {name} {key}')
+        if not isinstance(found, ID_FIELDS[name]):
+            raise ValueError(f'Operation {index}: ref {key} is no {name}')
+        return found
+
+    def forget(self, created: JepardyColumn | JepardyQuestion):
+        """Drops an object created earlier in the patch again, later operations can no longer use its ref."""
+        for ref, found in self.refs.items():
+            if found is created:
+                self.refs[ref] = None
+        if isinstance(created, JepardyColumn):
+            self.new_columns.remove(created)
+            self.table_column_adds = [(table_id, column) for table_id, column in self.table_column_adds if column is not created]
+            for column, question in [(column, question) for column, question in self.column_question_adds if column is created]:
+                self.forget(question)
+        else:
+            self.new_questions.remove(created)
+            self.column_question_adds = [(column, question) for column, question in self.column_question_adds if question is not created]
+    #endregion
+
+    #region operations
+    def apply(self):
+        for index, operation in enumerate(self.operations):
+            getattr(self, operation['op'])(index, operation)
+
+    def rename_table(self, index: int, operation: dict):
+        table = self.lookup(index, operation, 'table', self.tables)
+        table.name = operation['name']
+        self.dirty[JepardyTable][table.id] = table
+        self.result.table_ids.add(table.id)
+
+    def add_column(self, index: int, operation: dict):
+        table = self.lookup(index, operation, 'table', self.tables)
+        column = JepardyColumn(name=operation['name'])
+        self.new_columns.append(column)
+        self.table_column_adds.append((table.id, column))
+        if 'ref' in operation:
+            self.refs[operation['ref']] = column
+        self.result.table_ids.add(table.id)
+
+    def rename_column(self, index: int, operation: dict):
+        column = self.lookup(index, operation, 'column', self.columns)
+        column.name = operation['name']
+        if column.pk is not None:
+            self.dirty[JepardyColumn][column.id] = column
+            self.result.column_ids.add(column.id)
+
+    def remove_column(self, index: int, operation: dict):
+        table = self.lookup(index, operation, 'table', self.tables)
+        column = self.lookup(index, operation, 'column', self.columns)
+        if column.pk is None:
+            self.forget(column)
+        elif (table.id, column.id) in self.table_column_removes or (table.id, column.id) not in self.table_columns:
+            raise ValueError(f'Operation {index}: column {column.id} is not in table {table.id}')
+        else:
+            self.table_column_removes.add((table.id, column.id))
+        self.result.table_ids.add(table.id)
+
+    def add_question(self, index: int, operation: dict):
+        column = self.lookup(index, operation, 'column', self.columns)
+        game_question = GameQuestion(question_type='Text')
+        self.set_question_fields(index, operation, game_question)
+        question = JepardyQuestion(question=game_question, points=operation['points'])
+        self.new_questions.append(question)
+        self.column_question_adds.append((column, question))
+        if 'ref' in operation:
+            self.refs[operation['ref']] = question
+        self.touch_column(column)
+
+    def update_question(self, index: int, operation: dict):
+        question = self.lookup(index, operation, 'jepardy_question', self.questions)
+        self.set_question_fields(index, operation, question.question)
+        if 'points' in operation:
+            question.points = operation['points']
+        if question.pk is None:
+            for column, added in self.column_question_adds:
+                if added is question:
+                    self.touch_column(column)
+        else:
+            self.dirty[GameQuestion][question.question.id] = question.question
+            self.dirty[JepardyQuestion][question.id] = question
+            self.result.column_ids.update(column_id for column_id, question_id in self.column_questions if question_id == question.id)
+
+    def remove_question(self, index: int, operation: dict):
+        column = self.lookup(index, operation, 'column', self.columns)
+        question = self.lookup(index, operation, 'jepardy_question', self.questions)
+        if question.pk is None:
+            if (column, question) not in [(added_to, added) for added_to, added in self.column_question_adds]:
+                raise ValueError(f'Operation {index}: question {operation["jepardy_question"]} is not in column {operation["column"]}')
+            self.forget(question)
+        elif column.pk is None or (column.id, question.id) in self.column_question_removes or (column.id, question.id) not in self.column_questions:
+            raise ValueError(f'Operation {index}: question {question.id} is not in column {column.pk}')
+        else:
+            self.column_question_removes.add((column.id, question.id))
+        self.touch_column(column)
+
+    def set_question_fields(self, index: int, operation: dict, game_question: GameQuestion):
+        question_type = operation.get('type', game_question.question_type)
+        if question_type != game_question.question_type and (question_type in IMAGE_QUESTION_TYPES or game_question.question_type in IMAGE_QUESTION_TYPES):
+            raise ValueError(f'Operation {index}: image questions need an image, create them with the full game import')
+        for name, model_field in QUESTION_FIELDS.items():
+            if name in operation:
+                setattr(game_question, model_field, operation[name])
+        if game_question.question_type == 'Map' and parse_coordinates(game_question.answer) is None:
+            raise ValueError(f"Operation {index}: map question '{game_question.question}' needs 'lat, lon' as answer")
+
+    def touch_column(self, column: JepardyColumn):
+        if column.pk is not None:
+            self.result.column_ids.add(column.id)
+        else:
+            self.result.table_ids.update(table_id for table_id, added in self.table_column_adds if added is column)
+    #endregion
+
+    #region writes
+    def save(self):
+        """Writes all changes: bulk inserts for new rows and links, one bulk update per model, then removals."""
+        JepardyColumn.objects.bulk_create(self.new_columns)
+        GameQuestion.objects.bulk_create([question.question for question in self.new_questions])
+        for question in self.new_questions:
+            question.question_id = question.question.id
+        JepardyQuestion.objects.bulk_create(self.new_questions)
+        TableColumn.objects.bulk_create([TableColumn(jepardytable_id=table_id, jepardycolumn_id=column.id) for table_id, column in self.table_column_adds])
+        ColumnQuestion.objects.bulk_create([ColumnQuestion(jepardycolumn_id=column.id, jepardyquestion_id=question.id) for column, question in self.column_question_adds])
+        for model, fields in ((JepardyTable, ['name']), (JepardyColumn, ['name']), (GameQuestion, ['question', 'answer', 'question_type']), (JepardyQuestion, ['points'])):
+            if self.dirty[model]:
+                model.objects.bulk_update(list(self.dirty[model].values()), fields)
+        self.remove_links()
+        for ref, created in self.refs.items():
+            if created is not None and created.pk is not None:
+                self.result.created[ref] = created.pk
+
+    def remove_links(self):
+        """Unlinks removed columns and questions, and deletes the ones no other table, column or open game view uses any more."""
+        if not self.table_column_removes and not self.column_question_removes:
+            return
+        removed_column_ids = {column_id for table_id, column_id in self.table_column_removes}
+        links = Q(pk__in=[])
+        for table_id, column_id in self.table_column_removes:
+            links |= Q(jepardytable_id=table_id, jepardycolumn_id=column_id)
+        TableColumn.objects.filter(links).delete()
+        orphan_column_ids = list(JepardyColumn.objects.filter(id__in=removed_column_ids, jepardytable__isnull=True).values_list('id', flat=True))
+        candidate_question_ids = {question_id for column_id, question_id in self.column_question_removes}
+        candidate_question_ids.update(ColumnQuestion.objects.filter(jepardycolumn_id__in=orphan_column_ids).values_list('jepardyquestion_id', flat=True))
+        links = Q(pk__in=[])
+        for column_id, question_id in self.column_question_removes:
+            links |= Q(jepardycolumn_id=column_id, jepardyquestion_id=question_id)
+        ColumnQuestion.objects.filter(links | Q(jepardycolumn_id__in=orphan_column_ids)).delete()
+        JepardyColumn.objects.filter(id__in=orphan_column_ids).delete()
+        orphan_questions = JepardyQuestion.objects.filter(id__in=candidate_question_ids, columns__isnull=True)
+        game_question_ids = list(orphan_questions.values_list('question_id', flat=True))
+        orphan_questions.delete()
+        # A question open in a game stays, deleting it would cascade through the current view to the game
+        GameQuestion.objects.filter(id__in=game_question_ids, jepardyquestion__isnull=True, currentview__isnull=True).delete()
+        self.result.column_ids -= removed_column_ids
+    #endregion
+
+
+@transaction.atomic
+def apply_patch(operations: list[dict]) -> PatchResult:
+    """
+    Applies a list of edit operations (see OPERATIONS) to quiz tables in one transaction: all or nothing.
+    Raises ValueError naming the first invalid operation.
+    """
+    patch = Patch(operations)
+    patch.check()
+    patch.load()
+    patch.apply()
+    patch.save()
+    # Bulk writes send no model signals
+    bump_table_revisions(tables_of(JepardyTable, patch.result.table_ids) | tables_of(JepardyColumn, patch.result.column_ids))
+    return patch.result
+
+
+def render_fragments(result: PatchResult) -> str:
+    """The out of band fragments of the tables and columns a patch changed."""
+    tables = JepardyTable.objects.filter(id__in=result.table_ids).prefetch_related('columns__questions__question')
+    fragments = [render_to_string('creation/authoring_table.html', {'table': table, 'oob': True}) for table in tables]
+    column_ids = result.column_ids - {column.id for table in tables for column in table.columns.all()}
+    columns = JepardyColumn.objects.filter(id__in=column_ids).prefetch_related('questions__question')
+    fragments += [render_to_string('creation/authoring_column.html', {'column': column, 'oob': True}) for column in columns]
+    return ''.join(fragments)
+
+
+def patch_quiz_tables(operations: list[dict]) -> tuple[str, dict[str, int]]:
+    """Applies a patch and renders what it changed. Returns the fragments and the ids created for the refs."""
+    result = apply_patch(operations)
+    return render_fragments(result), result.created
@@ -0,0 +1,83 @@
+import asyncio
+import contextvars
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from .models import Game, GameParticipant
+from .settings import BUZZ_ARBITRATION_WINDOW
+from .versioning import bump_game_version
+
+
+def award_buzz(game_id: int, participant_id: int) -> bool:
+    """Gives the buzz to a participant unless the buzzers got locked meanwhile. Returns whether it was given."""
+    if GameParticipant.objects.filter(id=participant_id, round_lock=False).update(round_lock=True) == 0:
+        return False
+    if Game.objects.filter(id=game_id, buzzers_locked=False).update(buzzers_locked=True, buzz_player_id=participant_id) == 0:
+        GameParticipant.objects.filter(id=participant_id).update(round_lock=False)
+        return False
+    return True
+
+
+class BuzzArbiter:
+    """
+    Decides the buzz race of one game by the time players pressed their buzzer instead of by arrival.
+    The first buzz opens an arbitration window of BUZZ_ARBITRATION_WINDOW seconds, afterwards the buzz with the
+    earliest press time wins. Press times are client timestamps converted to server time, see ClockEstimator.
+    """
+
+    def __init__(self, game_id: int, loop: asyncio.AbstractEventLoop, window: float = BUZZ_ARBITRATION_WINDOW):
+        self.game_id = game_id
+        self.loop = loop
+        self.window = window
+        self._buzzes: dict[int, float] = {}
+        self._decision: asyncio.TimerHandle | None = None
+
+    def submit(self, participant_id: int, pressed: float):
+        """Records a buzz. May be called from any thread."""
+        # A fresh context keeps the consumer thread's sync_to_async state out of the database call in _award
+        self.loop.call_soon_threadsafe(self._submit, participant_id, pressed, context=contextvars.Context())
+
+    def _submit(self, participant_id: int, pressed: float):
+        if not self._buzzes:
+            self._decision = self.loop.call_later(self.window, self._decide)
+        self._buzzes.setdefault(participant_id, pressed)
+
+    def close(self):
+        """Drops the buzzes not decided yet. May be called from any thread."""
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._close)
+
+    def _close(self):
+        if self._decision is not None:
+            self._decision.cancel()
+        self._buzzes = {}
+
+    def _decide(self):
+        self._decision = None
+        buzzes, self._buzzes = self._buzzes, {}
+        ranking = sorted(buzzes, key=lambda participant_id: (buzzes[participant_id], participant_id))
+        self.loop.create_task(self._award(ranking))
+
+    async def _award(self, ranking: list[int]):
+        for participant_id in ranking:
+            if await database_sync_to_async(award_buzz)(self.game_id, participant_id):
+                version = await database_sync_to_async(bump_game_version)(self.game_id)
+                await get_channel_layer().group_send(f'game_{self.game_id}', {'type': 'buzz_update', 'version': version})
+                return
+
+
+_arbiters: dict[int, BuzzArbiter] = {}
+
+
+def get_buzz_arbiter(game_id: int, loop: asyncio.AbstractEventLoop) -> BuzzArbiter:
+    """The buzz arbiter of a game, created on first use."""
+    arbiter = _arbiters.get(game_id)
+    if arbiter is None:
+        arbiter = _arbiters.setdefault(game_id, BuzzArbiter(game_id, loop))
+    return arbiter
+
+
+def discard_buzz_arbiter(game_id: int):
+    """Drops the buzz arbiter of a game, e.g. when its question is closed."""
+    arbiter = _arbiters.pop(game_id, None)
+    if arbiter is not None:
+        arbiter.close()
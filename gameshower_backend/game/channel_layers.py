@@ -0,0 +1,234 @@
+import asyncio
+import errno
+import json
+import logging
+import os
+import random
+import socket
+import string
+import time
+from channels.exceptions import ChannelFull
+from channels.layers import InMemoryChannelLayer
+
+PEER_CACHE_SECONDS = 1.0
+"""How long the list of peer sockets is reused before the socket directory is scanned again."""
+SEND_RETRIES = 500
+"""How often a datagram is retried while the receiving process' buffer is full, waiting 1 ms each time."""
+MAX_PACKET_BYTES = 128 * 1024
+"""Largest datagram sent to another process, fits in the default socket buffer of Linux."""
+
+logger = logging.getLogger(__name__)
+
+
+class PacketTooLarge(ValueError):
+    """A message that does not fit into one datagram of MAX_PACKET_BYTES."""
+
+
+class UnixSocketChannelLayer(InMemoryChannelLayer):
+    """
+    Channel layer for several worker processes on one host, without Redis.
+
+    Every process binds a unix datagram socket named after itself in socket_dir. Channel names carry the name of
+    the process that created them, so a send to a channel of another process is a single datagram to that process.
+    Group memberships are kept by the process owning the channel; group_send delivers to the local members and
+    broadcasts one datagram to every other process, which then delivers to its own members.
+    Messages need to be JSON serializable and may be at most MAX_PACKET_BYTES long, encoded.
+    """
+
+    def __init__(self, socket_dir, expiry=60, group_expiry=86400, capacity=100, channel_capacity=None, **kwargs):
+        super().__init__(expiry=expiry, group_expiry=group_expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        self.socket_dir = str(socket_dir)
+        self.process_name = f'w{os.getpid()}'
+        self._socket: socket.socket | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._inbox: asyncio.Queue | None = None
+        self._dispatcher: asyncio.Task | None = None
+        self._peers: list[str] = []
+        self._peers_read_at = float('-inf')
+
+    #region sockets
+    @property
+    def socket_path(self) -> str:
+        """The path of this process' socket."""
+        return self.socket_path_of(self.process_name)
+
+    def socket_path_of(self, process_name: str) -> str:
+        """The path of the socket of a process."""
+        return os.path.join(self.socket_dir, f'{process_name}.sock')
+
+    def _ensure_socket(self):
+        """Binds this process' socket on first use and reads from it on the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._socket is not None and self._loop is loop:
+            return
+        if self._socket is None:
+            os.makedirs(self.socket_dir, exist_ok=True)
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._socket.setblocking(False)
+            self._socket.bind(self.socket_path)
+        elif not self._loop.is_closed():
+            self._loop.remove_reader(self._socket.fileno())
+            self._dispatcher.cancel()
+        self._inbox = asyncio.Queue()
+        self._dispatcher = loop.create_task(self._dispatch())
+        loop.add_reader(self._socket.fileno(), self._on_readable)
+        self._loop = loop
+
+    def _on_readable(self):
+        """Queues all datagrams waiting on the socket."""
+        while True:
+            try:
+                data = self._socket.recv(MAX_PACKET_BYTES)
+            except BlockingIOError:
+                return
+            try:
+                self._inbox.put_nowait(json.loads(data))
+            except ValueError:
+                logger.exception('Dropping undecodable packet of %d bytes', len(data))
+
+    async def _dispatch(self):
+        """
+        Handles received datagrams one after another, so messages keep the order they were sent in.
+        A packet that fails, e.g. for a full channel, is logged and dropped, the following ones are still delivered.
+        """
+        while True:
+            packet = await self._inbox.get()
+            try:
+                await self._handle_packet(packet)
+            except Exception:
+                logger.exception('Dropping %s packet', packet.get('op') if isinstance(packet, dict) else type(packet).__name__)
+
+    async def _handle_packet(self, packet: dict):
+        """Carries out one received datagram."""
+        match packet.get('op'):
+            case 'send':
+                await self._send_local(packet['channel'], packet['message'])
+            case 'group_send':
+                await super().group_send(packet['group'], packet['message'])
+            case 'group_add':
+                await super().group_add(packet['group'], packet['channel'])
+            case 'group_discard':
+                await super().group_discard(packet['group'], packet['channel'])
+            case op:
+                raise ValueError(f'Unknown packet op {op!r}')
+
+    def _peer_names(self) -> list[str]:
+        """Names of all other processes with a socket in socket_dir."""
+        now = time.monotonic()
+        if now - self._peers_read_at > PEER_CACHE_SECONDS:
+            self._peers = [
+                entry.name[:-len('.sock')] for entry in os.scandir(self.socket_dir)
+                if entry.name.endswith('.sock') and entry.name != f'{self.process_name}.sock'
+            ]
+            self._peers_read_at = now
+        return self._peers
+
+    def _encode(self, packet: dict) -> bytes:
+        """A packet as datagram, raises PacketTooLarge if it is longer than MAX_PACKET_BYTES."""
+        data = json.dumps(packet).encode('utf-8')
+        if len(data) > MAX_PACKET_BYTES:
+            raise PacketTooLarge(f'{packet["op"]} packet of {len(data)} bytes is larger than {MAX_PACKET_BYTES} bytes')
+        return data
+
+    async def _send_packet(self, process_name: str, data: bytes):
+        """Sends a datagram to another process. Dead processes are forgotten, a full buffer raises ChannelFull."""
+        path = self.socket_path_of(process_name)
+        for _ in range(SEND_RETRIES):
+            try:
+                self._socket.sendto(data, path)
+                return
+            except BlockingIOError:
+                await asyncio.sleep(0.001)
+            except (ConnectionRefusedError, FileNotFoundError):
+                if os.path.exists(path):
+                    os.unlink(path)
+                if process_name in self._peers:
+                    self._peers.remove(process_name)
+                return
+            except OSError as error:
+                if error.errno == errno.EMSGSIZE:
+                    raise PacketTooLarge(f'{len(data)} bytes do not fit into the socket buffer') from error
+                raise
+        raise ChannelFull(process_name)
+
+    async def _broadcast_packet(self, process_name: str, data: bytes):
+        """Sends a datagram to another process, ignoring a full buffer like group_send ignores full channels."""
+        try:
+            await self._send_packet(process_name, data)
+        except ChannelFull:
+            pass
+
+    def owner_of(self, channel: str) -> str | None:
+        """The name of the process that created a channel, None for channels not created by this layer."""
+        local_part, separator, _ = channel.rpartition('!')
+        if not separator:
+            return None
+        return local_part.rpartition('.')[2]
+
+    def is_local(self, channel: str) -> bool:
+        """Whether a channel belongs to this process."""
+        owner = self.owner_of(channel)
+        return owner is None or owner == self.process_name
+    #endregion
+
+    #region channel layer API
+    async def new_channel(self, prefix='specific.'):
+        """Returns a new channel name owned by this process."""
+        self._ensure_socket()
+        return '%s.%s!%s' % (prefix, self.process_name, ''.join(random.choice(string.ascii_letters) for i in range(12)))
+
+    async def _send_local(self, channel, message):
+        await super().send(channel, message)
+
+    async def send(self, channel, message):
+        """Sends a message to a channel of this or another process."""
+        self._ensure_socket()
+        if self.is_local(channel):
+            await self._send_local(channel, message)
+            return
+        self.require_valid_channel_name(channel)
+        await self._send_packet(self.owner_of(channel), self._encode({'op': 'send', 'channel': channel, 'message': message}))
+
+    async def receive(self, channel):
+        self._ensure_socket()
+        return await super().receive(channel)
+
+    async def group_add(self, group, channel):
+        """Adds a channel to a group. The membership is stored by the process owning the channel."""
+        self._ensure_socket()
+        if self.is_local(channel):
+            await super().group_add(group, channel)
+            return
+        await self._send_packet(self.owner_of(channel), self._encode({'op': 'group_add', 'group': group, 'channel': channel}))
+
+    async def group_discard(self, group, channel):
+        """Removes a channel from a group."""
+        self._ensure_socket()
+        if self.is_local(channel):
+            await super().group_discard(group, channel)
+            return
+        await self._send_packet(self.owner_of(channel), self._encode({'op': 'group_discard', 'group': group, 'channel': channel}))
+
+    async def group_send(self, group, message):
+        """Sends a message to all members of a group in all processes."""
+        self._ensure_socket()
+        self.require_valid_group_name(group)
+        data = self._encode({'op': 'group_send', 'group': group, 'message': message})
+        await asyncio.gather(*(self._broadcast_packet(peer, data) for peer in self._peer_names()))
+        await super().group_send(group, message)
+
+    async def close(self):
+        """Closes and removes this process' socket."""
+        if self._socket is None:
+            return
+        if not self._loop.is_closed():
+            self._loop.remove_reader(self._socket.fileno())
+            self._dispatcher.cancel()
+        self._socket.close()
+        self._socket = None
+        self._loop = None
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+    #endregion
@@ -0,0 +1,68 @@
+import asyncio
+import time
+from collections import deque
+from channels.layers import get_channel_layer
+from .settings import CLOCK_SAMPLE_COUNT, BUZZ_MAX_COMPENSATION_MS
+
+
+def server_time() -> float:
+    """Monotonic server time in milliseconds. Only comparable within one process."""
+    return time.monotonic() * 1000
+
+
+class ClockEstimator:
+    """
+    Estimates the clock offset and round trip time of one client from ping/pong pairs.
+    The offset is taken from the sample with the smallest round trip, it has the least queueing noise.
+    """
+
+    def __init__(self, sample_count: int = CLOCK_SAMPLE_COUNT):
+        self._samples: deque[tuple[float, float]] = deque(maxlen=sample_count)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add_sample(self, ping_sent: float, client_time: float, pong_received: float):
+        """Adds a sample: server time of the ping, client time of its receipt and server time of the pong."""
+        rtt = pong_received - ping_sent
+        if rtt < 0:
+            return
+        self._samples.append((rtt, client_time - (ping_sent + pong_received) / 2))
+
+    @property
+    def rtt(self) -> float | None:
+        """The smallest measured round trip time in ms."""
+        if not self._samples:
+            return None
+        return min(self._samples)[0]
+
+    @property
+    def offset(self) -> float | None:
+        """Client clock minus server clock in ms."""
+        if not self._samples:
+            return None
+        return min(self._samples)[1]
+
+    def to_server_time(self, client_time, received: float) -> float:
+        """
+        Converts a client timestamp of a message to server time.
+        The result never lies after the receipt of the message nor more than one round trip
+        (at most BUZZ_MAX_COMPENSATION_MS) before it, so a client can not buzz into the past.
+        """
+        offset = self.offset
+        try:
+            client_time = float(client_time)
+        except (TypeError, ValueError):
+            return received
+        if offset is None or client_time != client_time:
+            return received
+        earliest = received - min(self.rtt, BUZZ_MAX_COMPENSATION_MS)
+        return min(received, max(earliest, client_time - offset))
+
+
+def send_later(loop: asyncio.AbstractEventLoop, delay: float, channel_name: str, message: dict):
+    """Sends a channel layer message after delay seconds. May be called from any thread."""
+    async def send():
+        await get_channel_layer().send(channel_name, message)
+
+    loop.call_soon_threadsafe(lambda: loop.call_later(delay, lambda: loop.create_task(send())))
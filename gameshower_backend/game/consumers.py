@@ -1,11 +1,35 @@
 import json
 import asyncio
+import logging
+from contextlib import contextmanager
+from channels.consumer import get_handler_name
 from channels.generic.websocket import WebsocketConsumer
 from django.shortcuts import get_object_or_404
-from .models import Game, GameParticipant, JepardyQuestion
+from .models import CurrentView, Game, GameParticipant, Tournament
 from django.template.loader import render_to_string
 from asgiref.sync import async_to_sync
-from .settings import JEPARDY_LOOSE_FACTOR
+from .settings import JEPARDY_LOOSE_FACTOR, LEADERBOARD_PAGE_SIZE, GUESS_HISTOGRAM_SIZE, GUESS_CLOSEST_COUNT, GUESS_MAX_LENGTH, CLOCK_PING_BURST, HEARTBEAT_INTERVAL, HEARTBEAT_TIMEOUT, DRAIN_CLOSE_CODE, TOURNAMENT_PUSH_INTERVAL, TOURNAMENT_STANDINGS_SIZE
+from .leaderboard import discard_leaderboard, get_leaderboard
+from .guessing import start_guessing, get_aggregator, stop_guessing, discard_guessing, moderator_group_name
+from .map_scoring import MapGuessAggregator
+from .media import get_frame_urls
+from .scoring import apply_score_deltas
+from .affinity import is_local_game, worker_for_game
+from .clock import ClockEstimator, server_time, send_later
+from .buzzing import discard_buzz_arbiter, get_buzz_arbiter
+from .throttle import Throttle, get_event_loop
+from .versioning import bump_game_version
+from .live_state import LiveState, discard_live_state, get_live_state
+from .presence import join_game, leave_game, get_presence
+from .play_state import get_question_index, set_play_state
+from .provisioning import add_participants
+from .profiling import profile_message
+from .handoff import is_draining, register_loop, restore_snapshots, worker_group_name
+from .timers import get_timer_count, set_timer_count
+from .messages import ADMIN_MESSAGES, PLAYER_MESSAGES, MODERATOR_MESSAGES, TOURNAMENT_MESSAGES
+from .tournaments import tournament_group_name, get_tournament_leaderboard, apply_standings, watch_tournament, unwatch_tournament
+
+logger = logging.getLogger(__name__)
 
 class AdminConsumer(WebsocketConsumer):
     def connect(self):
@@ -16,34 +40,55 @@ class AdminConsumer(WebsocketConsumer):
         pass
     
     def receive(self, text_data):
-        print('Received data: ', text_data)
-        json_data = json.loads(text_data)
-        print('Received JSON data: ', json_data)
-        match json_data.get('type'):
-            case 'create-game':
-                self.create_game(json_data)
-
-    def create_game(self, json_data: dict):
-        print('Creating game with data: ', json_data)
-        player_names = json_data.get('player_names', [])
-        game_name = json_data.get('game_name', 'New Game')
-
-        new_game = Game.objects.create()
-        new_game.name = game_name
-        new_game.save()
-        for name in player_names:
-            participant = GameParticipant(name=name, game=new_game)
-            participant.save()
+        logger.debug('Received admin message: %s', text_data)
+        ADMIN_MESSAGES.dispatch(self, text_data)
+
+    def create_game(self, game_name: str, player_names: list[str]):
+        logger.info('Creating game %s with %d players', game_name, len(player_names))
+        new_game = Game.objects.create(name=game_name)
+        add_participants(new_game.id, player_names)
         self.game = new_game
         self.send(text_data=json.dumps({'game_id': new_game.id}))
 
-def switch_to_question_view(game: Game, question_id: int):
-    game.current_view.page = 'TextQuestion'
-    jepardy_question = JepardyQuestion.objects.get(id=question_id)
-    game.current_view.question_id = jepardy_question.question
-    game.current_view.save()
-    jepardy_question.is_active = True
-    jepardy_question.save()
+VERSIONED_EVENTS = {
+    'view_update': 'view',
+    'question_view_update': 'question',
+    'answer_text_update': 'answer',
+    'buzz_update': 'buzz',
+    'score_update': 'score',
+    'image_update': 'image',
+}
+"""Game events that follow a mutation, mapped to the part of the client view they render."""
+
+
+def coalesce_game_events(events: list[dict]) -> list[dict]:
+    """
+    Drops events superseded by a later event of the same type in a batch. Only events
+    carrying nothing but their version are dropped, the later one renders the same state.
+    """
+    last = {event['type']: index for index, event in enumerate(events) if event.keys() <= {'type', 'version'}}
+    return [event for index, event in enumerate(events) if last.get(event['type'], index) == index]
+
+
+def switch_to_question_view(game_id: int, question_id: int) -> bool:
+    """Opens a question of the game's quiz tables from the question index. Returns False for questions not on them."""
+    jepardy_question = get_question_index(game_id).get(question_id)
+    if jepardy_question is None:
+        return False
+    match jepardy_question.question_type:
+        case 'Input':
+            page = 'InputQuestion'
+            start_guessing(game_id, jepardy_question.id, jepardy_question.answer)
+        case 'Map':
+            page = 'InputQuestion'
+            start_guessing(game_id, jepardy_question.id, jepardy_question.answer, MapGuessAggregator)
+        case _:
+            page = 'TextQuestion'
+    CurrentView.objects.filter(game=game_id).update(
+        page=page, question_id=jepardy_question.question_id, jepardy_question=jepardy_question.id, image_step=0,
+    )
+    set_play_state(game_id, jepardy_question.id, is_active=True)
+    return True
 
 class GameConsumer(WebsocketConsumer):
     """
@@ -52,28 +97,47 @@ class GameConsumer(WebsocketConsumer):
         game (Game | None): The current game instance.
         game_group_name (str): The name of the game group for WebSocket communication.
         user_id (str): The ID of the user connected to the WebSocket.
+        scoreboard_page (int): The scoreboard page shown to the client.
+        rendered_versions (dict): The game version each part of the client view was last rendered at.
     WebSocket Connection Methods:
+        connect(): Initializes the connection of the WebSocket and starts the heartbeat.
         disconnect(code): Handles the disconnection of the WebSocket.
+        websocket_receive(message): Notes the time of every client message before handling it.
+        send(text_data): Sends to the client, collected into one frame while a batch of game events is applied.
+    Heartbeat Methods:
+        schedule_heartbeat(): Schedules the next heartbeat check of the connection.
+        push_clock_ping(): Sends a clock ping the client answers with its own time.
+        handle_clock_pong(ping_time, client_time): Adds a clock sample from the answer to the last ping.
+        reap(): Drops a connection that stopped answering from the game group and closes it.
     Game Group Methods:
         enter_game_group(): Adds the WebSocket to the game group.
         leave_game_group(): Removes the WebSocket from the game group.
+        move_to_game_worker(game_id, login_key): Sends the client to the worker process owning the game.
     HTML Update Methods:
-        send_player_score_setup(): Sends the initial player score setup to the client.
-        send_player_scores(): Sends the player scores to the client.
+        send_player_scores(): Sends the current scoreboard page to the client.
         player_buzzed(): Sends the buzzer status to the client.
         push_question_text(): Sends the current question text to the client.
         push_answer_text(): Sends the current answer text to the client.
         push_timer(count): Sends the timer count to the client.
+        push_running_timer(): Sends the timer count to a client that just logged in.
+        push_image(): Sends the current question image frame to the client.
     Game Group Trigger Methods:
         trigger_enter_group_event(): Triggers an event when a user enters the group.
         trigger_leave_group_event(): Triggers an event when a user leaves the group.
         trigger_buzz_update_event(): Triggers an event to update the buzzer status.
         trigger_view_update_event(): Triggers an event to update the view.
         trigger_question_view_update_event(): Triggers an event to update the question view.
-        trigger_score_update_event(): Triggers an event to update the scores.
+        trigger_score_update_event(scores): Triggers an event to update the scores.
         trigger_push_answer_event(): Triggers an event to update the answer text.
         trigger_timer_update_event(count): Triggers an event to update the timer count.
+        trigger_guess_update_event(): Triggers an event to update the guess statistics.
+        trigger_image_update_event(): Triggers an event to update the question image.
+        batched_game_events(): Sends the game events raised while handling a client message as one batch.
+    Versioning Methods:
+        is_stale_event(event, kind): Whether the client already shows the state of a game event.
+        live_state(): The live state of the game, shared with the other connections rendering the same event.
     Game Group Event Handlers:
+        game_batch(event): Handles the game events raised by one command.
         question_view_update(event): Handles the question view update event.
         score_update(event): Handles the score update event.
         answer_text_update(event): Handles the answer text update event.
@@ -82,6 +146,11 @@ class GameConsumer(WebsocketConsumer):
         user_entered(event): Handles the user entered event.
         user_left(event): Handles the user left event.
         buzz_update(event): Handles the buzz update event.
+        guess_update(event): Handles the guess update event.
+        image_update(event): Handles the image update event.
+        heartbeat(event): Pings the client or reaps the connection if it went silent.
+        clock_ping(event): Handles a scheduled clock ping.
+        drain(event): Sends the client off to reconnect while this worker drains.
     """
 
     #region Properties
@@ -90,58 +159,183 @@ class GameConsumer(WebsocketConsumer):
     @property
     def game_group_name(self):
         """The name of the game group for WebSocket communication."""
-        return f'game_{self.game.id}'
+        return f'game_{self.game_id}'
+    game_id: None | int = None
+    """The ID of the game, set at login."""
+    game_participant_id: None | int = None
+    """The ID of the game participant, None for moderators."""
+    login_key: None | str = None
+    """The key the client logged in with."""
     user_id = 'unknown'
     """The ID of the user connected to the WebSocket."""
+    scoreboard_page = 0
+    """The scoreboard page shown to the client."""
+    htmx_wrap_template = None
+    """The template of the element holding the websocket connection of the client."""
+    rendered_versions: dict[str, int]
+    """The game version each part of the client view was last rendered at."""
+    rendering_version: None | int = None
+    """The game version the client view is rendered at, None while a client message is handled until the live state is read."""
+    clock: ClockEstimator
+    """Clock offset and round trip estimate of the client."""
+    last_clock_ping: None | float = None
+    """Server time of the last clock ping not answered yet."""
+    last_seen: float
+    """Server time of the last message from the client."""
+    pending_events: None | dict[str, list[dict]] = None
+    """Game events raised while a client message is handled, by group. Sent as one batch once it is handled."""
+    outgoing: None | list[str] = None
+    """HTML rendered while a batch of game events is applied, sent to the client in one frame."""
     #endregion
 
     #region websocket connection
+    def connect(self):
+        """
+        Initializes the connection of the WebSocket and starts the heartbeat.
+        A draining worker refuses the connection, the client retries and reaches the replacement worker.
+        """
+        if is_draining():
+            self.close(code=DRAIN_CLOSE_CODE)
+            return
+        self.rendered_versions = {}
+        self.clock = ClockEstimator()
+        self.loop = get_event_loop()
+        register_loop(self.loop)
+        restore_snapshots()
+        self.last_seen = server_time()
+        async_to_sync(self.channel_layer.group_add)(worker_group_name(), self.channel_name)
+        self.accept()
+        self.push_login()
+        self.schedule_heartbeat()
+
     def disconnect(self, code):
         """Handles the disconnection of the WebSocket."""
+        async_to_sync(self.channel_layer.group_discard)(worker_group_name(), self.channel_name)
+        self.leave_game_group()
+
+    def websocket_receive(self, message):
+        """Notes the time of every client message before handling it, profiles it if switched on."""
+        self.last_seen = server_time()
+        self.rendering_version = None
+        with profile_message(message.get('text'), self.game_id), self.batched_game_events():
+            super().websocket_receive(message)
+
+    def send(self, text_data=None, bytes_data=None, close=False):
+        """Sends to the client. While a batch of game events is applied, the HTML is collected into one frame."""
+        if self.outgoing is not None and text_data is not None and bytes_data is None and not close:
+            self.outgoing.append(text_data)
+            return
+        super().send(text_data=text_data, bytes_data=bytes_data, close=close)
+    #endregion
+
+    #region heartbeat
+    def schedule_heartbeat(self):
+        """Schedules the next heartbeat check of the connection."""
+        send_later(self.loop, HEARTBEAT_INTERVAL, self.channel_name, {'type': 'heartbeat'})
+
+    def push_clock_ping(self):
+        """Sends a clock ping, the client answers it with its own time. Sent without rendering to keep the timing tight."""
+        self.last_clock_ping = server_time()
+        self.send(text_data=f'<div id="clock_ping" data-server-time="{self.last_clock_ping:.3f}"></div>')
+
+    def handle_clock_pong(self, ping_time: float, client_time: float):
+        """Adds a clock sample from the answer to the last ping. Pings follow each other until the first estimate is done."""
+        if self.last_clock_ping is None or abs(ping_time - self.last_clock_ping) > 0.001:
+            return
+        self.last_clock_ping = None
+        self.clock.add_sample(ping_time, client_time, self.last_seen)
+        if len(self.clock) < CLOCK_PING_BURST:
+            send_later(self.loop, 0, self.channel_name, {'type': 'clock_ping'})
+
+    def reap(self):
+        """Drops a connection that stopped answering from the game group and closes it."""
+        logger.info('Reaping idle connection %s', self.channel_name)
         self.leave_game_group()
+        self.close()
     #endregion
 
     #region gamegroup
     def enter_game_group(self):
         """Adds the WebSocket to the game group. The game property needs to be set."""
         async_to_sync(self.channel_layer.group_add)(self.game_group_name, self.channel_name)
+        join_game(self.game_id, self.channel_name, self.game_participant_id)
+        self.trigger_enter_group_event()
 
     def leave_game_group(self):
         """Removes the WebSocket from the game group."""
+        if self.game_id is None:
+            return
         if self.channel_name in self.channel_layer.groups.get(self.game_group_name, set()):
-            self.trigger_leave_group_event()
             async_to_sync(self.channel_layer.group_discard)(self.game_group_name, self.channel_name)
+            if leave_game(self.game_id, self.channel_name):
+                discard_live_state(self.game_id)
+                discard_buzz_arbiter(self.game_id)
+                discard_leaderboard(self.game_id)
+            self.trigger_leave_group_event()
+
+    def move_to_game_worker(self, game_id: int, login_key: str) -> bool:
+        """
+        Sends the client to the worker process owning the game if that is not this one.
+        The client reconnects there and logs in again with login_key. Returns whether the client was moved.
+        """
+        if is_local_game(game_id):
+            return False
+        ws_url = worker_for_game(game_id).rstrip('/') + self.scope['path']
+        html = render_to_string(self.htmx_wrap_template, {'ws_url': ws_url, 'login_key': login_key})
+        self.send(text_data=html)
+        return True
     #endregion
     
     #region html updates
-    def send_player_score_setup(self):
-        """Sends the initial player score setup to the client."""
+    def send_player_scores(self):
+        """Sends the current scoreboard page to the client."""
+        leaderboard = get_leaderboard(self.game_id)
+        page_count = max(1, -(-len(leaderboard) // LEADERBOARD_PAGE_SIZE))
+        self.scoreboard_page = min(max(self.scoreboard_page, 0), page_count - 1)
         context = {
-            'participants': [participant.to_json() for participant in self.game.participants.all()]
+            'participants': leaderboard.top(LEADERBOARD_PAGE_SIZE, self.scoreboard_page * LEADERBOARD_PAGE_SIZE),
+            'page': self.scoreboard_page,
+            'page_count': page_count,
         }
         self.send(text_data=render_to_string('game/score_setup_partial.html', context=context))
-        self.send_player_scores()
 
-    def send_player_scores(self):
-        """Sends the player scores to the client."""
-        for participant in self.game.participants.all():
-            self.send(text_data=render_to_string('game/score_partial.html', {'id': participant.id, 'score': participant.score}))
+    def change_scoreboard_page(self, page: int):
+        """Shows another scoreboard page to the client."""
+        self.scoreboard_page = page
+        self.send_player_scores()
     
     def push_question_text(self):
         """Sends the current question text to the client."""
-        if self.game.current_view.question_visible:
-            html = render_to_string('player/question_text_partial.html', {'question_text': self.game.current_view.question_id.question})
+        state = self.live_state()
+        if state.question_visible:
+            html = render_to_string('player/question_text_partial.html', {'question_text': state.question})
             self.send(text_data=html)
 
     def push_answer_text(self):
         """Sends the current answer text to the client."""
-        html = render_to_string('game/question_partials/answer_wrap.html', {'answer_text': self.game.current_view.question_id.answer, 'answer_visible': self.game.current_view.answer_visible})
+        state = self.live_state()
+        html = render_to_string('game/question_partials/answer_wrap.html', {'answer_text': state.answer, 'answer_visible': state.answer_visible})
         self.send(text_data=html)
 
     def push_timer(self, count):
         """Sends the timer count to the client."""
         html = render_to_string('game/question_partials/timer_wrap.html', {'timer': count})
         self.send(text_data=html)
+
+    def push_running_timer(self):
+        """Sends the timer count to a client that just logged in, if a timer runs."""
+        count = get_timer_count(self.game_id)
+        if count is not None:
+            self.push_timer(count)
+
+    def push_image(self):
+        """Sends the current question image frame to the client. The frames are pre-rendered, so this is only a URL."""
+        state = self.live_state()
+        frame_urls = get_frame_urls(state.question_id)
+        if not frame_urls:
+            return
+        image_url = frame_urls[min(state.image_step, len(frame_urls) - 1)] if state.question_visible else None
+        self.send(text_data=render_to_string('game/question_partials/image_wrap.html', {'image_url': image_url}))
     #endregion
 
     #region game group triggers
@@ -182,10 +376,11 @@ class GameConsumer(WebsocketConsumer):
         }
         self.send_game_event(event)
 
-    def trigger_score_update_event(self):
-        """Triggers an event to update the scores."""
+    def trigger_score_update_event(self, scores=()):
+        """Triggers an event to update the scores. scores holds the changed (participant_id, score) pairs."""
         event = {
             'type': 'score_update',
+            'scores': [[participant_id, score] for participant_id, score in scores],
         }
         self.send_game_event(event)
 
@@ -204,25 +399,116 @@ class GameConsumer(WebsocketConsumer):
         }
         self.send_game_event(event)
 
+    def trigger_guess_update_event(self):
+        """Triggers an event to update the guess statistics."""
+        event = {
+            'type': 'guess_update',
+        }
+        self.send_game_event(event)
+
+    def trigger_image_update_event(self):
+        """Triggers an event to update the question image."""
+        event = {
+            'type': 'image_update',
+        }
+        self.send_game_event(event)
+
     def send_game_event(self, event):
-        """Sends a game event to the game group."""
+        """
+        Sends a game event to the game group. Events following a mutation carry the bumped game version.
+        While a client message is handled the event is held back and sent with the others it raises.
+        """
+        if self.pending_events is not None:
+            self.pending_events.setdefault(self.game_group_name, []).append(event)
+            return
+        if event['type'] in VERSIONED_EVENTS:
+            event['version'] = bump_game_version(self.game_id)
         async_to_sync(self.channel_layer.group_send)(
             self.game_group_name,
             event
         )
+
+    @contextmanager
+    def batched_game_events(self):
+        """
+        Collects the game events raised inside and sends them as one group message at the end, so every
+        client gets one channel layer message and one websocket frame per command instead of one per event.
+        The versions of all its events are taken with a single bump.
+        """
+        self.pending_events = {}
+        try:
+            yield
+        finally:
+            pending, self.pending_events = self.pending_events, None
+            for group_name, events in pending.items():
+                versioned = [event for event in events if event['type'] in VERSIONED_EVENTS]
+                if versioned:
+                    last_version = bump_game_version(self.game_id, len(versioned))
+                    for version, event in enumerate(versioned, last_version - len(versioned) + 1):
+                        event['version'] = version
+                events = coalesce_game_events(events)
+                event = events[0] if len(events) == 1 else {'type': 'game_batch', 'events': events}
+                async_to_sync(self.channel_layer.group_send)(group_name, event)
+    #endregion
+
+    #region versioning
+    def is_stale_event(self, event, kind: str, version: int | None = None) -> bool:
+        """
+        Whether the client already shows the state of a game event, so rendering it again can be skipped.
+        Otherwise the version of the event is recorded for the part of the view about to be rendered. The event
+        is sent after its mutation, so the render shows at least that version, and no query is needed.
+        """
+        event_version = event.get('version') if event else None
+        if event_version is None:
+            return False
+        if event_version <= self.rendered_versions.get(kind, -1):
+            return True
+        self.rendered_versions[kind] = event_version if version is None else version
+        self.rendering_version = event_version
+        return False
+
+    def live_state(self) -> LiveState:
+        """
+        The live state of the game, at least at the version of the event being rendered. The connections of
+        a game rendering the same event share one read of it, so the fan-out needs no queries per connection.
+        """
+        state = get_live_state(self.game_id, self.rendering_version)
+        self.rendering_version = state.version
+        return state
     #endregion
 
     #region game group event handlers
+    def game_batch(self, event):
+        """Handles the game events raised by one command, in order. Their renders reach the client in one frame."""
+        self.outgoing = []
+        try:
+            for game_event in event['events']:
+                handler = getattr(self, get_handler_name(game_event), None)
+                if handler is not None:
+                    handler(game_event)
+        finally:
+            html, self.outgoing = ''.join(self.outgoing), None
+            if html:
+                self.send(text_data=html)
+
     def question_view_update(self, event):
         """Handles the question view update event."""
+        if self.is_stale_event(event, 'question'):
+            return
         self.push_question_text()
 
     def score_update(self, event):
-        """Handles the score update event."""
+        """Handles the score update event. The scores are always applied, only the render may be skipped."""
+        leaderboard = get_leaderboard(self.game_id)
+        leaderboard.set_scores(event.get('scores', []), event.get('version'))
+        if self.is_stale_event(event, 'score', leaderboard.version):
+            return
         self.send_player_scores()
 
     def answer_text_update(self, event):
         """Handles the answer text update event."""
+        if self.is_stale_event(event, 'answer'):
+            return
         self.push_answer_text()
 
     def timer_update(self, event):
@@ -241,9 +527,41 @@ class GameConsumer(WebsocketConsumer):
         """Handles the user left event."""
         pass
 
+    def heartbeat(self, event):
+        """Handles the heartbeat check of this connection. Pings the client or reaps the connection if it went silent."""
+        if server_time() - self.last_seen > HEARTBEAT_TIMEOUT * 1000:
+            self.reap()
+            return
+        self.push_clock_ping()
+        self.schedule_heartbeat()
+
+    def clock_ping(self, event):
+        """Handles a scheduled clock ping."""
+        self.push_clock_ping()
+
+    def drain(self, event):
+        """
+        Handles the drain of this worker. A logged in client gets its connection element back with its login key,
+        so it reconnects and logs in again on its own. The replacement worker serves it from the handed over state.
+        """
+        if self.login_key is not None:
+            html = render_to_string(self.htmx_wrap_template, {'ws_url': self.scope['path'], 'login_key': self.login_key})
+            self.send(text_data=html)
+        self.close(code=DRAIN_CLOSE_CODE)
+
     def buzz_update(self, event):
         """Handles the buzz update event."""
         pass
+
+    def guess_update(self, event):
+        """Handles the guess update event."""
+        pass
+
+    def image_update(self, event):
+        """Handles the image update event."""
+        if self.is_stale_event(event, 'image'):
+            return
+        self.push_image()
     #endregion
 
 
@@ -251,6 +569,9 @@ class PlayerConsumer(GameConsumer):
     #region Properties
     game_participant_id: None | int = None
     """The ID of the game participant."""
+    game_id: None | int = None
+    """The ID of the participant's game, set at login."""
+    htmx_wrap_template = 'player/htmx_wrap.html'
     @property
     def game_participant(self) -> None | GameParticipant:
         """The game participant instance."""
@@ -270,39 +591,31 @@ class PlayerConsumer(GameConsumer):
     #endregion
 
     #region websocket connection
-    def connect(self):
-        """Initializes the connection of the WebSocket."""
-        self.accept()
-        self.push_login()
-    
     def disconnect(self, close_code):
         """Handles the disconnection of the WebSocket."""
         super().disconnect(close_code)
     
     def receive(self, text_data):
-        """Handles the reception of data from the WebSocket."""
-        json_data = json.loads(text_data)
-        match json_data.get('type'):
-            case 'login':
-                self.login(json_data.get('gameCode'))
-            case 'question-click':
-                return
-            case 'buzzer-click':
-                self.buzz()
+        """Handles the reception of data from the WebSocket, see PLAYER_MESSAGES."""
+        PLAYER_MESSAGES.dispatch(self, text_data)
     #endregion
 
     #region html updates
     def push_view(self):
         """Pushes the current view to the client."""
-        if self.game_participant is None:
+        if self.game_participant_id is None:
             self.push_login()
             return
-        if self.game_participant.game.current_view.page == 'JepardyTable':
+        page = self.live_state().page
+        if page == 'JepardyTable':
             self.push_jepardy_table_view()
             return
-        if self.game_participant.game.current_view.page == 'TextQuestion':
+        if page == 'TextQuestion':
             self.push_question()
             return
+        if page == 'InputQuestion':
+            self.push_input_question()
+            return
 
     def push_login(self):
         """Pushes the login view to the client."""
@@ -311,10 +624,10 @@ class PlayerConsumer(GameConsumer):
 
     def push_jepardy_table_view(self):
         """Pushes the jepardy table view to the client."""
-        if self.game_participant is None:
+        if self.game_participant_id is None:
             self.push_login()
             return
-        html = render_to_string('game/quiztable_partial.html', {'table': self.game.current_view.jepardy_table})
+        html = render_to_string('game/quiztable_partial.html', self.live_state().table or {'table': None})
         self.send(text_data=html)
         
     def push_question(self):
@@ -322,19 +635,52 @@ class PlayerConsumer(GameConsumer):
         html = render_to_string('player/question_partial.html')
         self.send(text_data=html)
         self.push_question_text()
+        self.push_image()
         self.update_buzzer()
         self.push_answer_text()
 
-    def push_question_text(self):
-        """Pushes the question text to the client."""
-        if self.game.current_view.question_visible:
-            html = render_to_string('player/question_text_partial.html', {'question_text': self.game_participant.game.current_view.question_id.question})
-            self.send(text_data=html)
+    def push_input_question(self):
+        """Pushes the input question view to the client."""
+        html = render_to_string('player/input_question_partial.html')
+        self.send(text_data=html)
+        self.push_question_text()
+        self.push_answer_text()
+        self.push_guess()
+
+    def push_guess(self):
+        """Pushes the guess form and the player's current guess to the client."""
+        aggregator = get_aggregator(self.game_id)
+        if aggregator is None:
+            return
+        context = {
+            'is_open': aggregator.is_open,
+            'is_numeric': aggregator.is_numeric,
+            'is_map': isinstance(aggregator, MapGuessAggregator),
+            'guess': aggregator.guess_of(self.game_participant_id),
+            'max_length': GUESS_MAX_LENGTH,
+        }
+        self.send(text_data=render_to_string('player/guess_partial.html', context=context))
 
     def update_buzzer(self):
         """Updates the buzzer status."""
-        html = render_to_string('player/buzzer_partial.html', {'disabled': self.game_participant.round_lock or self.game_participant.game.buzzers_locked})
+        state = self.live_state()
+        html = render_to_string('player/buzzer_partial.html', {'disabled': self.game_participant_id in state.round_locks or state.buzzers_locked})
         self.send(text_data=html)
+
+    def send_player_scores(self):
+        """Sends the scoreboard page and the player's own rank to the client."""
+        super().send_player_scores()
+        self.push_rank()
+
+    def push_rank(self):
+        """Pushes the player's rank to the client."""
+        leaderboard = get_leaderboard(self.game_id)
+        context = {
+            'rank': leaderboard.rank_of(self.game_participant_id),
+            'score': leaderboard.score_of(self.game_participant_id),
+            'total': len(leaderboard),
+        }
+        self.send(text_data=render_to_string('player/rank_partial.html', context=context))
     #endregion
 
     #region websocket actions
@@ -342,44 +688,75 @@ class PlayerConsumer(GameConsumer):
         """Handles the login action."""
         try:
             participant = GameParticipant.objects.get(private_key=game_code)
+            if self.move_to_game_worker(participant.game_id, game_code):
+                return
             self.game_participant_id = participant.id
+            self.game_id = participant.game_id
+            self.login_key = game_code
             self.push_view()
+            self.push_running_timer()
             self.enter_game_group()
-            print('Login Success, setting up scores next')
-            self.send_player_score_setup()
+            logger.debug('Login of %s to game %s', self.channel_name, self.game_id)
+            self.send_player_scores()
+            self.push_clock_ping()
         except GameParticipant.DoesNotExist:
             self.push_login()
 
-    def buzz(self):
-        """Handles the buzzer action."""
+    def buzz(self, client_time):
+        """Handles the buzzer action. The buzz arbiter decides the race by the time the buzzer was pressed."""
         participant = self.game_participant
         if participant is None:
             return
         if participant.round_lock or participant.game.buzzers_locked:
             return
-        participant.game.buzzers_locked = True
-        participant.game.save()
-        participant.round_lock = True
-        participant.save()
-        participant.game.buzz_player_id = participant.id
-        participant.game.save()
-        self.trigger_buzz_update_event()
+        pressed = self.clock.to_server_time(client_time, self.last_seen)
+        get_buzz_arbiter(self.game_id, self.loop).submit(participant.id, pressed)
+
+    def receive_guess(self, guess: str | None, latitude: float | None, longitude: float | None):
+        """
+        Handles the guess form: the coordinates of a map question, the text guess of any other input question.
+        A form missing the fields of the open question is dropped.
+        """
+        if isinstance(get_aggregator(self.game_id), MapGuessAggregator):
+            if latitude is not None and longitude is not None:
+                self.submit_guess((latitude, longitude))
+        elif guess is not None:
+            self.submit_guess(guess)
+
+    def submit_guess(self, guess):
+        """Handles the guess submission of an input question. Only touches the in-memory guess collection."""
+        aggregator = get_aggregator(self.game_id)
+        if aggregator is None or not aggregator.submit(self.game_participant_id, guess):
+            return
+        self.push_guess()
+        aggregator.throttle.request()
     #endregion
 
     #region game group event handlers
     def buzz_update(self, event):
         """Handles the buzz update event."""
+        if self.is_stale_event(event, 'buzz'):
+            return
         self.update_buzzer()
 
     def view_update(self, event):
         """Handles the view update event."""
+        if self.is_stale_event(event, 'view'):
+            return
         self.push_view()
+
+    def guess_update(self, event):
+        """Handles the guess update event. Players only need it once the guessing is closed."""
+        aggregator = get_aggregator(self.game_id)
+        if aggregator is not None and not aggregator.is_open:
+            self.push_guess()
     #endregion
 
 class ModeratorConsumer(GameConsumer):
     #region Properties
     game_id = None
     """The ID of the game."""
+    htmx_wrap_template = 'moderator/htmx_wrap.html'
     @property
     def game(self):
         """The current game instance."""
@@ -387,51 +764,26 @@ class ModeratorConsumer(GameConsumer):
     #endregion
 
     #region websocket connection
-    def connect(self):
-        """Initializes the connection of the WebSocket."""
-        self.accept()
-        self.push_login()
-    
     def disconnect(self, close_code):
         """Handles the disconnection of the WebSocket."""
         super().disconnect(close_code)
     
     def receive(self, text_data):
-        """Handles the reception of data from the WebSocket."""
-        json_data = json.loads(text_data)
-        match json_data.get('type'):
-            case 'login':
-                self.login(json_data.get('gameCode'))
-            case 'question-click':
-                switch_to_question_view(self.game, json_data.get('question_id'))
-                self.trigger_view_update_event()
-            case 'show-question-click':
-                game = self.game
-                game.current_view.question_visible = not game.current_view.question_visible
-                game.current_view.save()
-                self.trigger_view_update_event()
-            case 'show-answer-click':
-                game = self.game
-                game.current_view.answer_visible = not game.current_view.answer_visible
-                game.current_view.save()
-                self.trigger_push_answer_event()
-            case 'player-buzzer-lock':
-                player_id = json_data.get('player_id')
-                player = GameParticipant.objects.get(id=player_id)
-                player.round_lock = not player.round_lock
-                player.save()
-                self.trigger_buzz_update_event()
-            case 'toggle-all-buzzers':
-                game = self.game
-                game.buzzers_locked = not game.buzzers_locked
-                game.save()
-                self.trigger_buzz_update_event()
-            case 'rate-answer':
-                self.rate_answer(json_data)
-            case 'exit-question':
-                self.exit_question()
-            case 'timer-update':
-                self.handle_timer_update(json_data.get('count'))
+        """Handles the reception of data from the WebSocket, see MODERATOR_MESSAGES."""
+        MODERATOR_MESSAGES.dispatch(self, text_data)
+    #endregion
+
+    #region gamegroup
+    def enter_game_group(self):
+        """Adds the WebSocket to the game group and to the moderator group of the game."""
+        async_to_sync(self.channel_layer.group_add)(moderator_group_name(self.game_id), self.channel_name)
+        super().enter_game_group()
+
+    def leave_game_group(self):
+        """Removes the WebSocket from the game group and from the moderator group of the game."""
+        if self.game_id is not None:
+            async_to_sync(self.channel_layer.group_discard)(moderator_group_name(self.game_id), self.channel_name)
+        return super().leave_game_group()
     #endregion
 
     #region html updates    
@@ -440,12 +792,16 @@ class ModeratorConsumer(GameConsumer):
         if self.game_id is None:
             self.push_login()
             return
-        if self.game.current_view.page == 'JepardyTable':
+        page = self.live_state().page
+        if page == 'JepardyTable':
             self.push_quiz_table_view()
             return
-        if self.game.current_view.page == 'TextQuestion':
+        if page == 'TextQuestion':
             self.push_question()
             return
+        if page == 'InputQuestion':
+            self.push_input_question()
+            return
 
     def push_login(self):
         """Pushes the login view to the client."""
@@ -457,7 +813,7 @@ class ModeratorConsumer(GameConsumer):
         if self.game_id is None:
             self.push_login()
             return
-        html = render_to_string('game/quiztable_partial.html', {'table': self.game.current_view.jepardy_table})
+        html = render_to_string('game/quiztable_partial.html', self.live_state().table or {'table': None})
         self.send(text_data=html)
 
     #region question
@@ -466,34 +822,86 @@ class ModeratorConsumer(GameConsumer):
         html = render_to_string('moderator/question_partial.html')
         self.send(text_data=html)
         self.push_question_text()
+        self.push_image()
         self.push_answer_text()
-        self.send_player_score_setup()
+        self.send_player_scores()
         self.push_buzz_update()
 
     def push_question_text(self):
         """Pushes the question text to the client."""
-        html = render_to_string('moderator/question_wrap.html', {'question_text': self.game.current_view.question_id.question, 'question_visible': self.game.current_view.question_visible})
+        state = self.live_state()
+        html = render_to_string('moderator/question_wrap.html', {'question_text': state.question, 'question_visible': state.question_visible})
         self.send(text_data=html)
 
     def push_buzz_update(self, event=None):
         """Updates the buzzer status."""
-        game = self.game
+        state = self.live_state()
         context = {
-            'buzzers_locked': game.buzzers_locked,
-            'buzz_player_id': game.buzz_player_id,
-            'participants': [participant.to_json() for participant in game.participants.all()]
+            'buzzers_locked': state.buzzers_locked,
+            'buzz_player_id': state.buzz_player_id,
+            'participants': [participant.to_json() for participant in GameParticipant.objects.filter(game_id=self.game_id)]
         }
         html = render_to_string('moderator/buzzer_partial.html', context=context)
         self.send(text_data=html)
-        if game.buzz_player_id is not None:
-            self.send(text_data=render_to_string('moderator/rate_answer_partial.html'))
+        if state.buzz_player_id is not None:
+            self.send(text_data=render_to_string('moderator/rate_answer_partial.html', {'buzz_player_id': state.buzz_player_id}))
         else:
             self.send(text_data='<div id="rate_answer_wrap" hx-swap="innerHTML"></div>')
 
     def push_answer_text(self, event=None):
         """Pushes the answer text to the client."""
-        html = render_to_string('moderator/answer_wrap.html', {'answer_text': self.game.current_view.question_id.answer, 'answer_visible': self.game.current_view.answer_visible})
+        state = self.live_state()
+        html = render_to_string('moderator/answer_wrap.html', {'answer_text': state.answer, 'answer_visible': state.answer_visible})
         self.send(text_data=html)
+
+    def push_image(self):
+        """Pushes the current question image frame and the reveal controls to the client."""
+        state = self.live_state()
+        frame_urls = get_frame_urls(state.question_id)
+        if not frame_urls:
+            return
+        step = min(state.image_step, len(frame_urls) - 1)
+        context = {
+            'image_url': frame_urls[step],
+            'step': step,
+            'step_count': len(frame_urls),
+        }
+        self.send(text_data=render_to_string('moderator/image_wrap.html', context=context))
+    #endregion
+
+    #region input question
+    def push_input_question(self):
+        """Pushes the input question view to the client."""
+        html = render_to_string('moderator/input_question_partial.html')
+        self.send(text_data=html)
+        self.push_question_text()
+        self.push_answer_text()
+        self.send_player_scores()
+        self.push_guess_stats()
+
+    def push_presence(self):
+        """Pushes the live connection counts of the game to the client."""
+        context = get_presence(self.game_id)
+        context['player_count'] = len(get_leaderboard(self.game_id))
+        self.send(text_data=render_to_string('moderator/presence_partial.html', context=context))
+
+    def push_guess_stats(self):
+        """Pushes the live guess statistics to the client."""
+        aggregator = get_aggregator(self.game_id)
+        if aggregator is None:
+            return
+        leaderboard = get_leaderboard(self.game_id)
+        closest = aggregator.closest(GUESS_CLOSEST_COUNT)
+        for guess in closest:
+            guess['name'] = leaderboard.name_of(guess['participant_id'])
+        context = {
+            'guess_count': len(aggregator),
+            'is_open': aggregator.is_open,
+            'scored': aggregator.scored,
+            'histogram': aggregator.histogram(GUESS_HISTOGRAM_SIZE),
+            'closest': closest,
+        }
+        self.send(text_data=render_to_string('moderator/guess_stats_partial.html', context=context))
     #endregion
     #endregion
 
@@ -502,82 +910,225 @@ class ModeratorConsumer(GameConsumer):
         """Handles the login action."""
         try:
             game = Game.objects.get(moderator_key=game_code)
+            if self.move_to_game_worker(game.id, game_code):
+                return
             self.game_id = game.id
+            self.login_key = game_code
+            get_question_index(game.id)
             self.push_view()
+            self.push_running_timer()
             self.enter_game_group()
-            print('Login Success, setting up scores next')
-            self.send_player_score_setup()
+            logger.debug('Login of %s to game %s', self.channel_name, self.game_id)
+            self.send_player_scores()
+            self.push_presence()
         except Game.DoesNotExist:
             self.push_login()
 
     
-    def rate_answer(self, json_data):
-        """Handles the rating of an answer."""
-        game = self.game
-        if game.current_view.question_id is None:
-            return
-        question = game.current_view.question_id
-        
-        jepardy_question = JepardyQuestion.objects.get(question=question)
+    def open_question(self, question_id: int):
+        """Handles the click on a question of the quiz table."""
+        if switch_to_question_view(self.game_id, question_id):
+            self.trigger_view_update_event()
+
+    # The live state commands carry the state the moderator asks for instead of a toggle. They are conditional
+    # updates on the old state, so a double click or a co-moderator asking for the same state changes nothing
+    # and raises no event, without reading or locking the row first.
+    def set_question_visible(self, visible: bool):
+        """Shows or hides the question text to the players."""
+        if CurrentView.objects.filter(game=self.game_id, question_visible=not visible).update(question_visible=visible):
+            self.trigger_view_update_event()
+
+    def set_answer_visible(self, visible: bool):
+        """Shows or hides the answer text to the players."""
+        if CurrentView.objects.filter(game=self.game_id, answer_visible=not visible).update(answer_visible=visible):
+            self.trigger_push_answer_event()
 
-        if game.buzz_player_id is None:
+    def set_player_buzzer_locked(self, player_id: int, locked: bool):
+        """Locks or unlocks the buzzer of one player of the game."""
+        if GameParticipant.objects.filter(id=player_id, game_id=self.game_id, round_lock=not locked).update(round_lock=locked):
+            self.trigger_buzz_update_event()
+
+    def set_buzzers_locked(self, locked: bool):
+        """Locks or unlocks the buzzers of all players."""
+        if Game.objects.filter(id=self.game_id, buzzers_locked=not locked).update(buzzers_locked=locked):
+            self.trigger_buzz_update_event()
+
+    def rate_answer(self, value: str, player_id: int):
+        """
+        Handles the rating of the answer of the player who buzzed. The buzz is taken back first, only if it is
+        still the one the moderator rated, so the same buzz is never scored twice.
+        """
+        jepardy_question_id = CurrentView.objects.filter(game=self.game_id).values_list('jepardy_question_id', flat=True).first()
+        jepardy_question = get_question_index(self.game_id).get(jepardy_question_id)
+        if jepardy_question is None:
             return
-        
-        buzz_player = GameParticipant.objects.get(id=game.buzz_player_id)
-        
-        match json_data.get('value'):
+        if not Game.objects.filter(id=self.game_id, buzz_player_id=player_id).update(buzz_player_id=None):
+            return
+
+        match value:
             case 'true':
-                buzz_player.score += jepardy_question.points
-                buzz_player.save()
-                jepardy_question.is_played = True
-                jepardy_question.save()
-                self.trigger_score_update_event()
+                scores = apply_score_deltas({player_id: jepardy_question.points})
+                set_play_state(self.game_id, jepardy_question.id, is_played=True)
+                self.trigger_score_update_event(scores)
             case 'false':
-                buzz_player.score -= jepardy_question.points * JEPARDY_LOOSE_FACTOR
-                buzz_player.save()
-                self.trigger_score_update_event()
+                scores = apply_score_deltas({player_id: -int(jepardy_question.points * JEPARDY_LOOSE_FACTOR)})
+                self.trigger_score_update_event(scores)
             case 'skip':
                 pass
-        game.buzz_player_id = None
-        game.save()
         self.trigger_buzz_update_event()
 
+    def reveal_image_step(self, step: int):
+        """Shows the given pre-rendered frame of the current image question, if it is the next one."""
+        current_view = self.game.current_view
+        if step >= len(get_frame_urls(current_view.question_id_id)):
+            return
+        if CurrentView.objects.filter(id=current_view.id, image_step=step - 1).update(image_step=step):
+            self.trigger_image_update_event()
+
+    def score_guesses(self):
+        """Closes the guessing of the current input question and scores all guesses in one batched write."""
+        aggregator = get_aggregator(self.game_id)
+        if aggregator is None or aggregator.scored:
+            return
+        jepardy_question = get_question_index(self.game_id).get(aggregator.jepardy_question_id)
+        if jepardy_question is None:
+            return
+        aggregator.is_open = False
+        aggregator.scored = True
+        scores = apply_score_deltas(aggregator.awards(jepardy_question.points))
+        set_play_state(self.game_id, aggregator.jepardy_question_id, is_played=True)
+        self.trigger_score_update_event(scores)
+        self.trigger_guess_update_event()
+
     def exit_question(self):
         """Handles the exit question action."""
         game = self.game
-        question = game.current_view.question_id
-        jep_question = JepardyQuestion.objects.get(question=question)
-        jep_question.is_active = False
-        jep_question.is_played = True
-        jep_question.save()
-        game.current_view.question_visible = False
-        game.current_view.question_id = None
-        game.current_view.page = 'JepardyTable'
-        game.current_view.save()
-        game.buzz_player_id = None
-        game.buzzers_locked = False
-        game.save()
-        for participant in game.participants.all():
-            participant.round_lock = False
-            participant.save()
+        current_view = game.current_view
+        if current_view.jepardy_question_id is not None:
+            set_play_state(game.id, current_view.jepardy_question_id, is_active=False, is_played=True)
+        current_view.question_visible = False
+        current_view.question_id = None
+        current_view.jepardy_question = None
+        current_view.page = 'JepardyTable'
+        current_view.save(update_fields=['question_visible', 'question_id', 'jepardy_question', 'page'])
+        Game.objects.filter(id=game.id).update(buzz_player_id=None, buzzers_locked=False)
+        game.participants.filter(round_lock=True).update(round_lock=False)
+        discard_guessing(game.id)
+        discard_buzz_arbiter(game.id)
+        set_timer_count(game.id, None)
         self.trigger_view_update_event()
 
-    def handle_timer_update(self, count):
+    def handle_timer_update(self, count: int):
         """Handles the timer update action."""
+        set_timer_count(self.game_id, count)
         self.trigger_timer_update_event(count)
-        if count == 0 or count == '0':
-            game = self.game
-            game.buzzers_locked = True
-            game.save()
-            self.trigger_buzz_update_event()
+        if count == 0:
+            if Game.objects.filter(id=self.game_id, buzzers_locked=False).update(buzzers_locked=True):
+                self.trigger_buzz_update_event()
+            if get_aggregator(self.game_id) is not None:
+                stop_guessing(self.game_id)
+                self.trigger_guess_update_event()
     #endregion
 
     #region game group event handlers
     def view_update(self, event):
         """Handles the view update event."""
+        if self.is_stale_event(event, 'view'):
+            return
         self.push_view()
 
     def buzz_update(self, event=None):
         """Handles the buzz update event."""
+        if self.is_stale_event(event, 'buzz'):
+            return
         self.push_buzz_update()
+
+    def guess_update(self, event):
+        """Handles the guess update event."""
+        self.push_guess_stats()
+
+    def user_entered(self, event):
+        """Handles the user entered event."""
+        self.push_presence()
+
+    def user_left(self, event):
+        """Handles the user left event."""
+        self.push_presence()
+    #endregion
+
+class TournamentConsumer(WebsocketConsumer):
+    """
+    The standings display of a tournament. Score changes of all its games arrive as events, the
+    display is rendered at most once per TOURNAMENT_PUSH_INTERVAL however many points are awarded.
+    """
+    #region Properties
+    tournament_id: None | int = None
+    """The ID of the tournament, set at login."""
+    throttle: None | Throttle = None
+    """Limits the standings pushes of the connection."""
+    #endregion
+
+    #region websocket connection
+    def connect(self):
+        """Initializes the connection of the WebSocket."""
+        self.accept()
+        self.push_login()
+
+    def disconnect(self, close_code):
+        """Handles the disconnection of the WebSocket."""
+        if self.tournament_id is None:
+            return
+        self.throttle.cancel()
+        async_to_sync(self.channel_layer.group_discard)(tournament_group_name(self.tournament_id), self.channel_name)
+        unwatch_tournament(self.tournament_id)
+
+    def receive(self, text_data):
+        """Handles the reception of data from the WebSocket, see TOURNAMENT_MESSAGES."""
+        TOURNAMENT_MESSAGES.dispatch(self, text_data)
+    #endregion
+
+    #region html updates
+    def push_login(self):
+        """Pushes the login form to the client."""
+        self.send(text_data=render_to_string('tournament/login_partial.html'))
+
+    def push_standings(self):
+        """Pushes the top of the tournament standings to the client."""
+        context = {
+            'participants': get_tournament_leaderboard(self.tournament_id).top(TOURNAMENT_STANDINGS_SIZE),
+        }
+        self.send(text_data=render_to_string('tournament/standings_partial.html', context=context))
+
+    async def request_standings_push(self):
+        """Throttle callback, the push itself runs in the sync consumer."""
+        await self.channel_layer.send(self.channel_name, {'type': 'standings_push'})
+    #endregion
+
+    #region websocket actions
+    def login(self, display_key: str):
+        """Handles the login action."""
+        if self.tournament_id is not None:
+            return
+        try:
+            tournament = Tournament.objects.get(display_key=display_key)
+        except Tournament.DoesNotExist:
+            self.push_login()
+            return
+        self.tournament_id = tournament.id
+        self.throttle = Throttle(TOURNAMENT_PUSH_INTERVAL, self.request_standings_push, get_event_loop())
+        watch_tournament(tournament.id)
+        async_to_sync(self.channel_layer.group_add)(tournament_group_name(tournament.id), self.channel_name)
+        self.send(text_data=render_to_string('tournament/display_partial.html', context={'tournament': tournament}))
+        self.push_standings()
+    #endregion
+
+    #region tournament group event handlers
+    def tournament_scores(self, event):
+        """Handles changed standings, the display follows with the next throttled push."""
+        if apply_standings(self.tournament_id, event['entries']):
+            self.throttle.request()
+
+    def standings_push(self, event):
+        """Handles the throttled standings push."""
+        self.push_standings()
     #endregion
@@ -0,0 +1,209 @@
+import heapq
+import math
+import threading
+from collections import Counter
+from channels.layers import get_channel_layer
+from .settings import GUESS_MAX_LENGTH, GUESS_PUBLISH_INTERVAL
+from .throttle import Throttle, get_event_loop
+
+
+def parse_number(text) -> float | None:
+    """Parses a numeric guess, accepting a decimal comma. Returns None for anything else."""
+    try:
+        number = float(str(text).strip().replace(',', '.'))
+    except ValueError:
+        return None
+    if not math.isfinite(number):
+        return None
+    return number
+
+
+def normalize_text(text) -> str:
+    """Normalizes a free text guess so that equal answers are counted together."""
+    return ' '.join(str(text).casefold().split())
+
+
+def format_number(number: float) -> str:
+    """Formats a number without a trailing .0."""
+    return f'{number:g}'
+
+
+class GuessAggregator:
+    """
+    Collects the guesses of all participants for one input question and keeps live statistics.
+    A numeric answer makes it a numeric question, otherwise guesses are compared as normalized text.
+    A participant may change the guess while the question is open, only the latest one counts.
+    """
+
+    def __init__(self, jepardy_question_id: int, answer: str):
+        self.jepardy_question_id = jepardy_question_id
+        self.answer = answer
+        self.target = parse_number(answer)
+        self.expected = normalize_text(answer)
+        self.is_open = True
+        self.scored = False
+        self._guesses: dict[int, str | float] = {}
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self.throttle: Throttle | None = None
+
+    @property
+    def is_numeric(self) -> bool:
+        """Whether guesses are numbers."""
+        return self.target is not None
+
+    def __len__(self):
+        return len(self._guesses)
+
+    def submit(self, participant_id: int, raw_guess) -> bool:
+        """Records a guess. Returns False if the guess was rejected."""
+        if not self.is_open or raw_guess is None:
+            return False
+        raw_guess = str(raw_guess)[:GUESS_MAX_LENGTH]
+        guess = parse_number(raw_guess) if self.is_numeric else normalize_text(raw_guess)
+        if guess is None or guess == '':
+            return False
+        with self._lock:
+            old_guess = self._guesses.get(participant_id)
+            if old_guess is not None:
+                self._counts[old_guess] -= 1
+                if self._counts[old_guess] <= 0:
+                    del self._counts[old_guess]
+            self._guesses[participant_id] = guess
+            self._counts[guess] += 1
+        return True
+
+    def guess_of(self, participant_id: int) -> str | None:
+        """The current guess of a participant, formatted for display."""
+        guess = self._guesses.get(participant_id)
+        if guess is None:
+            return None
+        return format_number(guess) if self.is_numeric else guess
+
+    def histogram(self, size: int) -> list[dict]:
+        """
+        Returns up to size bars with label, count and percent.
+        Text guesses are the most common answers, numeric guesses are grouped into equal width bins.
+        """
+        with self._lock:
+            counts = list(self._counts.items())
+            total = len(self._guesses)
+        if not counts:
+            return []
+        if not self.is_numeric:
+            bars = [(label, count) for label, count in heapq.nlargest(size, counts, key=lambda item: item[1])]
+        else:
+            low = min(value for value, _ in counts)
+            high = max(value for value, _ in counts)
+            if low == high:
+                bars = [(format_number(low), total)]
+            else:
+                width = (high - low) / size
+                bins = [0] * size
+                for value, count in counts:
+                    bins[min(int((value - low) / width), size - 1)] += count
+                bars = [
+                    (f'{format_number(low + i * width)} - {format_number(low + (i + 1) * width)}', count)
+                    for i, count in enumerate(bins)
+                ]
+        return [{'label': label, 'count': count, 'percent': round(100 * count / total)} for label, count in bars]
+
+    def closest(self, count: int) -> list[dict]:
+        """Returns the count numeric guesses closest to the answer, best first."""
+        if not self.is_numeric:
+            return []
+        with self._lock:
+            guesses = list(self._guesses.items())
+        best = heapq.nsmallest(count, guesses, key=lambda item: abs(item[1] - self.target))
+        return [
+            {'participant_id': participant_id, 'guess': format_number(guess), 'distance': format_number(abs(guess - self.target))}
+            for participant_id, guess in best
+        ]
+
+    def awards(self, points: int) -> dict[int, int]:
+        """
+        Returns the points per participant.
+        Text questions award every exact answer, numeric questions award all guesses that are closest.
+        """
+        with self._lock:
+            guesses = list(self._guesses.items())
+        if not guesses:
+            return {}
+        if not self.is_numeric:
+            return {participant_id: points for participant_id, guess in guesses if guess == self.expected}
+        best_distance = min(abs(guess - self.target) for _, guess in guesses)
+        return {participant_id: points for participant_id, guess in guesses if abs(guess - self.target) == best_distance}
+
+    def to_state(self) -> dict:
+        """The guesses and status of the collection as JSON compatible data, see restore_state."""
+        with self._lock:
+            guesses = list(self._guesses.items())
+        return {'is_open': self.is_open, 'scored': self.scored, 'guesses': guesses}
+
+    def restore_state(self, state: dict):
+        """Takes over guesses and status from to_state of another collection of the same question."""
+        with self._lock:
+            self._guesses = {int(participant_id): tuple(guess) if isinstance(guess, list) else guess for participant_id, guess in state['guesses']}
+            self._counts = Counter(self._guesses.values())
+        self.is_open = state['is_open']
+        self.scored = state['scored']
+
+
+_aggregators: dict[int, GuessAggregator] = {}
+
+
+def moderator_group_name(game_id: int) -> str:
+    """The channel group of the moderator connections of a game, only they get the live guess statistics."""
+    return f'moderators_{game_id}'
+
+
+def start_guessing(game_id: int, jepardy_question_id: int, answer: str, aggregator_class=GuessAggregator) -> GuessAggregator:
+    """Opens a new guess collection for a game. Must be called from a sync consumer handler."""
+    discard_guessing(game_id)
+    aggregator = aggregator_class(jepardy_question_id, answer)
+
+    async def publish():
+        await get_channel_layer().group_send(moderator_group_name(game_id), {'type': 'guess_update'})
+
+    aggregator.throttle = Throttle(GUESS_PUBLISH_INTERVAL, publish, get_event_loop())
+    _aggregators[game_id] = aggregator
+    return aggregator
+
+
+def get_aggregator(game_id: int) -> GuessAggregator | None:
+    """The guess collection of a game, if any."""
+    return _aggregators.get(game_id)
+
+
+def stop_guessing(game_id: int):
+    """Closes the guess collection of a game. Closed collections keep their guesses for scoring."""
+    aggregator = _aggregators.get(game_id)
+    if aggregator is not None:
+        aggregator.is_open = False
+
+
+def snapshot_guessing(game_id: int) -> dict | None:
+    """The guess collection of a game as JSON compatible data, None if there is none."""
+    aggregator = _aggregators.get(game_id)
+    if aggregator is None:
+        return None
+    return {
+        'class': aggregator.__class__.__name__,
+        'jepardy_question_id': aggregator.jepardy_question_id,
+        'answer': aggregator.answer,
+        **aggregator.to_state(),
+    }
+
+
+def restore_guessing(game_id: int, snapshot: dict, aggregator_classes: dict[str, type[GuessAggregator]]):
+    """Reopens a guess collection from snapshot_guessing. Must be called from a sync consumer handler."""
+    aggregator_class = aggregator_classes[snapshot['class']]
+    aggregator = start_guessing(game_id, snapshot['jepardy_question_id'], snapshot['answer'], aggregator_class)
+    aggregator.restore_state(snapshot)
+
+
+def discard_guessing(game_id: int):
+    """Drops the guess collection of a game."""
+    aggregator = _aggregators.pop(game_id, None)
+    if aggregator is not None and aggregator.throttle is not None:
+        aggregator.throttle.cancel()
@@ -0,0 +1,177 @@
+import asyncio
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import re
+import signal
+import time
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from .affinity import is_local_game
+from .guessing import GuessAggregator, get_aggregator, restore_guessing, snapshot_guessing
+from .map_scoring import MapGuessAggregator
+from .models import Game
+from .presence import get_live_game_ids
+from .settings import DRAIN_GRACE_SECONDS, SNAPSHOT_CHECK_INTERVAL, SNAPSHOT_MAX_AGE
+from .timers import get_timer_count, set_timer_count
+
+AGGREGATOR_CLASSES = {aggregator_class.__name__: aggregator_class for aggregator_class in (GuessAggregator, MapGuessAggregator)}
+"""Guess collection classes by name, to restore them from a snapshot."""
+
+SNAPSHOT_NAME_PATTERN = re.compile(r'^drain-(\d+)-(\d+)\.json$')
+"""Name of a game state snapshot file, with the pid of the drained worker and the game id."""
+
+logger = logging.getLogger(__name__)
+
+_loop: asyncio.AbstractEventLoop | None = None
+_draining = False
+_next_check = 0.0
+
+
+def worker_group_name() -> str:
+    """The channel group of all connections of this worker process."""
+    return f'worker_{os.getpid()}'
+
+
+def snapshot_path(pid: int, game_id: int) -> str:
+    return os.path.join(settings.SNAPSHOT_ROOT, f'drain-{pid}-{game_id}.json')
+
+
+#region snapshot
+def snapshot_games() -> dict[int, dict]:
+    """
+    The in-memory state of all games with connections: guess collection and timer.
+    Scores, buzzer locks and the current view live in the database, the game version tells whether they changed since.
+    """
+    game_ids = get_live_game_ids()
+    versions = dict(Game.objects.filter(id__in=game_ids).values_list('id', 'version'))
+    return {
+        game_id: {'version': versions.get(game_id), 'guessing': snapshot_guessing(game_id), 'timer': get_timer_count(game_id)}
+        for game_id in game_ids
+    }
+
+
+def write_snapshots(games: dict[int, dict]):
+    """Writes every game to a snapshot file of its own in SNAPSHOT_ROOT, atomically."""
+    os.makedirs(settings.SNAPSHOT_ROOT, exist_ok=True)
+    for game_id, game in games.items():
+        path = snapshot_path(os.getpid(), game_id)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(game, f)
+        os.replace(path + '.tmp', path)
+
+
+def claim_snapshot(path: str) -> dict | None:
+    """
+    Takes a snapshot file out of SNAPSHOT_ROOT and returns its game. Every snapshot is restored once:
+    None if another worker took it first.
+    """
+    claimed = f'{path}.{os.getpid()}'
+    try:
+        os.rename(path, claimed)
+    except FileNotFoundError:
+        return None
+    try:
+        with open(claimed) as f:
+            return json.load(f)
+    finally:
+        os.unlink(claimed)
+
+
+def restore_snapshots() -> int:
+    """
+    Restores the snapshots of games served by this worker that drained workers left. Games whose version moved on
+    since the snapshot are skipped, state that is live in this worker already is kept. Snapshot files are deleted once
+    read, outdated ones are deleted unread. Looks at most every SNAPSHOT_CHECK_INTERVAL seconds.
+    Must be called from a sync consumer handler. Returns the number of restored games.
+    """
+    global _next_check
+    now = time.monotonic()
+    if now < _next_check:
+        return 0
+    _next_check = now + SNAPSHOT_CHECK_INTERVAL
+    try:
+        entries = list(os.scandir(settings.SNAPSHOT_ROOT))
+    except FileNotFoundError:
+        return 0
+    start = time.perf_counter()
+    games = {}
+    for entry in entries:
+        name_match = SNAPSHOT_NAME_PATTERN.match(entry.name)
+        if name_match is None or int(name_match[1]) == os.getpid():
+            continue
+        if entry.stat().st_mtime < time.time() - SNAPSHOT_MAX_AGE:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(entry.path)
+            continue
+        game_id = int(name_match[2])
+        if is_local_game(game_id):
+            game = claim_snapshot(entry.path)
+            if game is not None:
+                games[game_id] = game
+    if not games:
+        return 0
+    versions = dict(Game.objects.filter(id__in=games).values_list('id', 'version'))
+    count = 0
+    for game_id, game in games.items():
+        if versions.get(game_id) != game['version']:
+            continue
+        if game['guessing'] is not None and get_aggregator(game_id) is None:
+            restore_guessing(game_id, game['guessing'], AGGREGATOR_CLASSES)
+        if game['timer'] is not None and get_timer_count(game_id) is None:
+            set_timer_count(game_id, game['timer'])
+        count += 1
+    logger.info('Restored %d of %d games in %.1f ms', count, len(games), (time.perf_counter() - start) * 1000)
+    return count
+#endregion
+
+
+#region drain
+def register_loop(loop: asyncio.AbstractEventLoop):
+    """Remembers the server's event loop, the drain runs on it."""
+    global _loop
+    _loop = loop
+
+
+def is_draining() -> bool:
+    """Whether the worker is draining and refuses new connections."""
+    return _draining
+
+
+def start_drain():
+    """Switches the worker into drain mode. May be called from any thread and from signal handlers."""
+    global _draining
+    if _loop is None:
+        # No connection was ever accepted, there is nothing to hand over
+        _draining = True
+        logger.info('Drained: no connections')
+        return
+    # A fresh context keeps a caller's sync_to_async state out of the database calls of the drain
+    _loop.call_soon_threadsafe(lambda: _loop.create_task(drain()), context=contextvars.Context())
+
+
+async def drain():
+    """
+    Refuses new connections, snapshots the live games to SNAPSHOT_ROOT and sends every client
+    off to reconnect. Clients land on the replacement worker, which restores the snapshot.
+    """
+    global _draining
+    if _draining:
+        return
+    _draining = True
+    start = time.perf_counter()
+    # Lets buzz races decided in the last moment reach the database
+    await asyncio.sleep(DRAIN_GRACE_SECONDS)
+    games = await database_sync_to_async(snapshot_games)()
+    write_snapshots(games)
+    await get_channel_layer().group_send(worker_group_name(), {'type': 'drain'})
+    logger.info('Drained %d games to %s in %.0f ms, safe to stop', len(games), settings.SNAPSHOT_ROOT, (time.perf_counter() - start) * 1000)
+
+
+def install_drain_signal():
+    """Drains the worker on SIGUSR1."""
+    signal.signal(signal.SIGUSR1, lambda signum, frame: start_drain())
+#endregion
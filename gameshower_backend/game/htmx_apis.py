@@ -1,40 +1,114 @@
 from django.shortcuts import render
 from .models import GameQuestion, JepardyQuestion, JepardyColumn, JepardyTable, Game, GameParticipant
 import json
-from django.http import HttpRequest
+import logging
+import re
+import secrets
+from channels.db import database_sync_to_async
+from django.http import HttpRequest, HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.views.decorators.http import require_POST, require_safe
+from .authoring import patch_quiz_tables
+from .question_bank import parse_cursor, questions, quiz_tables, split_page
+from .settings import QUESTION_PAGE_SIZE, QUIZ_TABLE_PAGE_SIZE
+from .views import admin_required
 
-def add_quiz_table(request):
-    quiz_tables = JepardyTable.objects.all()
+logger = logging.getLogger(__name__)
+
+SELECT_ID_PATTERN = re.compile(r'^quiz-table-select(-[0-9a-f]+)?$')
+
+async def add_quiz_table(request):
+    rows = [table async for table in quiz_tables(None, QUIZ_TABLE_PAGE_SIZE)]
+    page, next_after = split_page(rows, QUIZ_TABLE_PAGE_SIZE)
     context = {
-        'quiz_tables': [{
-            'id':table.id,
-            'name':table.name,
-        } for table in quiz_tables]
+        'quiz_tables': page,
+        'next_after': next_after,
+        # Every added picker needs its own id, the next pages are appended to it
+        'select_id': f'quiz-table-select-{secrets.token_hex(4)}',
     }
     return render(request, 'creation/add_quiz_table_partial.html', context=context)
 
-def create_game(request: HttpRequest):
+@require_safe
+async def quiz_table_options(request: HttpRequest):
+    """The next page of a quiz table picker: its options, appended out of band, and the button for the page after."""
+    select_id = request.GET.get('select', '')
+    if not SELECT_ID_PATTERN.match(select_id):
+        return HttpResponseBadRequest('Unknown quiz table picker')
+    try:
+        after = parse_cursor(request.GET.get('after'))
+    except ValueError:
+        return HttpResponseBadRequest('after must be a quiz table id')
+    rows = [table async for table in quiz_tables(after, QUIZ_TABLE_PAGE_SIZE)]
+    page, next_after = split_page(rows, QUIZ_TABLE_PAGE_SIZE)
+    context = {'quiz_tables': page, 'next_after': next_after, 'select_id': select_id, 'oob': True}
+    return render(request, 'creation/quiz_table_page_more.html', context=context)
+
+@admin_required
+@require_safe
+async def search_questions(request: HttpRequest):
+    """A page of the question bank matching ?q=, all questions for an empty query, starting after ?after=."""
+    try:
+        after = parse_cursor(request.GET.get('after'))
+    except ValueError:
+        return HttpResponseBadRequest('after must be a question id')
+    rows = [question async for question in questions(request.GET.get('q', ''), after, QUESTION_PAGE_SIZE)]
+    page, next_after = split_page(rows, QUESTION_PAGE_SIZE)
+    return render(request, 'creation/question_search_results.html', context={'questions': page, 'next_after': next_after, 'after': after})
+
+async def create_game(request: HttpRequest):
+    """
+    Creates a game playing the selected quiz tables. A selected table 'create' is created with the name at
+    the same position of new-quiz-table-name. Table ids and names are checked before anything is written.
+    """
     p = request.POST
-    game_name = p['game-name']
+    game_name = p.get('game-name')
     selected_quiz_tables = p.getlist('selected-quiz-table')
     new_quiz_table_names = p.getlist('new-quiz-table-name')
-    for i in range(len(selected_quiz_tables)):
-        if selected_quiz_tables[i] == 'create':
-          new_quiz_table_name = new_quiz_table_names[i]
-          new_quiz_table = JepardyTable.objects.create(name=new_quiz_table_name)
-          new_quiz_table.save()
-          selected_quiz_tables[i] = new_quiz_table.id
-    quiz_tables = [JepardyTable.objects.get(id=table_id) for table_id in selected_quiz_tables]
-    game = Game.objects.create(name=game_name)
-    game.jepardytables.set(quiz_tables)
-    game.save()
+    if not game_name:
+        return HttpResponseBadRequest('game-name is missing')
+    table_ids = []
+    for i, selected in enumerate(selected_quiz_tables):
+        if selected == 'create':
+            if i >= len(new_quiz_table_names) or not new_quiz_table_names[i]:
+                return HttpResponseBadRequest('New quiz table without name')
+            continue
+        try:
+            table_ids.append(int(selected))
+        except ValueError:
+            return HttpResponseBadRequest('Quiz tables must be given by id')
+    quiz_tables = await JepardyTable.objects.ain_bulk(table_ids)
+    if len(quiz_tables) != len(set(table_ids)):
+        return HttpResponseBadRequest('Unknown quiz table')
+    for i, selected in enumerate(selected_quiz_tables):
+        if selected == 'create':
+            new_quiz_table = await JepardyTable.objects.acreate(name=new_quiz_table_names[i])
+            quiz_tables[new_quiz_table.id] = new_quiz_table
+    game = await Game.objects.acreate(name=game_name)
+    await game.jepardytables.aset(quiz_tables.values())
     return render(request, 'creation/game_page.html', context={'game_id': game.id, 'game_name': game_name})
 
-def laod_quiz_table(request: HttpRequest):
+async def laod_quiz_table(request: HttpRequest):
     p = request.POST
-    print(f'p: {p}')
+    logger.debug('Loading quiz table: %s', p)
     quiz_table_id = p.get('quiz-table')
-    quiz_table = JepardyTable.objects.get(id=quiz_table_id)
+    quiz_table = await JepardyTable.objects.prefetch_related('columns__questions__question').aget(id=quiz_table_id)
     
     return render(request, 'creation/quiz_table_partial.html', context={'quiz_table': quiz_table})
-    
+
+@admin_required
+@require_POST
+async def patch_quiz_table(request: HttpRequest):
+    """
+    Applies {"operations": [...]} edits to quiz tables (see authoring.OPERATIONS) as one transaction and
+    answers with out of band fragments of what changed. The ids created for refs come in the HX-Trigger header.
+    """
+    try:
+        operations = json.loads(request.body)['operations']
+    except (ValueError, TypeError, KeyError):
+        return JsonResponse({'error': 'Expected {"operations": [...]}'}, status=400)
+    try:
+        # The edits run in one transaction, which the async ORM cannot do, in a thread of their own
+        fragments, created = await database_sync_to_async(patch_quiz_tables, thread_sensitive=False)(operations)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return HttpResponse(fragments, headers={'HX-Trigger': json.dumps({'quizTablePatched': {'created': created}})})
+
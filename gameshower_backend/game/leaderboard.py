@@ -0,0 +1,229 @@
+import random
+import threading
+from .models import Game, GameParticipant
+
+_MAX_LEVEL = 32
+
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, level: int):
+        self.key = key
+        self.next: list['_Node | None'] = [None] * level
+        self.width: list[int] = [1] * level
+
+
+class RankedKeys:
+    """
+    Indexable skip list holding sorted, unique keys.
+    Insert, remove, count_less and positional access are O(log n) on average.
+    """
+
+    def __init__(self):
+        self._head = _Node(None, _MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < _MAX_LEVEL and random.random() < 0.5:
+            level += 1
+        return level
+
+    def _find_predecessors(self, key):
+        """Returns the rightmost node before key and its position for every level."""
+        update = [self._head] * _MAX_LEVEL
+        positions = [0] * _MAX_LEVEL
+        node = self._head
+        position = 0
+        for level in range(self._level - 1, -1, -1):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+            update[level] = node
+            positions[level] = position
+        return update, positions
+
+    def insert(self, key):
+        """Inserts key. The key must not be present yet."""
+        update, positions = self._find_predecessors(key)
+        level = self._random_level()
+        if level > self._level:
+            for i in range(self._level, level):
+                update[i] = self._head
+                positions[i] = 0
+                self._head.width[i] = self._size + 1
+            self._level = level
+        node = _Node(key, level)
+        position = positions[0] + 1
+        for i in range(level):
+            predecessor = update[i]
+            node.next[i] = predecessor.next[i]
+            predecessor.next[i] = node
+            node.width[i] = predecessor.width[i] - (position - positions[i]) + 1
+            predecessor.width[i] = position - positions[i]
+        for i in range(level, self._level):
+            update[i].width[i] += 1
+        self._size += 1
+
+    def remove(self, key):
+        """Removes key. The key must be present."""
+        update, _ = self._find_predecessors(key)
+        node = update[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        for i in range(self._level):
+            if update[i].next[i] is node:
+                update[i].width[i] += node.width[i] - 1
+                update[i].next[i] = node.next[i]
+            else:
+                update[i].width[i] -= 1
+        self._size -= 1
+
+    def count_less(self, key) -> int:
+        """Number of keys strictly smaller than key."""
+        node = self._head
+        position = 0
+        for level in range(self._level - 1, -1, -1):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        return position
+
+    def slice(self, start: int, count: int) -> list:
+        """Returns up to count keys beginning at position start."""
+        if start < 0 or start >= self._size or count <= 0:
+            return []
+        node = self._head
+        remaining = start + 1
+        for level in range(self._level - 1, -1, -1):
+            while node.next[level] is not None and node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        keys = []
+        while node is not None and len(keys) < count:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+
+class Leaderboard:
+    """
+    Incrementally maintained ranking of the participants of one game.
+    Players with equal scores share a rank (1, 2, 2, 4).
+    """
+
+    def __init__(self, entries=()):
+        """entries: iterable of (participant_id, name, score)."""
+        self._keys = RankedKeys()
+        self._scores: dict[int, int] = {}
+        self._names: dict[int, str] = {}
+        self._lock = threading.Lock()
+        self.version = 0
+        """The highest game version whose score changes were applied."""
+        for participant_id, name, score in entries:
+            self.add(participant_id, name, score)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, participant_id: int):
+        return participant_id in self._scores
+
+    def add(self, participant_id: int, name: str, score: int):
+        """Adds a participant or replaces its name and score."""
+        with self._lock:
+            if participant_id in self._scores:
+                self._keys.remove((-self._scores[participant_id], participant_id))
+            self._scores[participant_id] = score
+            self._names[participant_id] = name
+            self._keys.insert((-score, participant_id))
+
+    def remove(self, participant_id: int):
+        """Removes a participant from the leaderboard."""
+        with self._lock:
+            score = self._scores.pop(participant_id)
+            self._names.pop(participant_id)
+            self._keys.remove((-score, participant_id))
+
+    def set_score(self, participant_id: int, score: int) -> bool:
+        """Sets the score of a known participant. Returns whether the ranking changed."""
+        with self._lock:
+            old_score = self._scores.get(participant_id)
+            if old_score is None or old_score == score:
+                return False
+            self._keys.remove((-old_score, participant_id))
+            self._keys.insert((-score, participant_id))
+            self._scores[participant_id] = score
+            return True
+
+    def set_scores(self, scores, version: int | None = None) -> bool:
+        """
+        Applies an iterable of (participant_id, score) pairs, optionally from the game event of the given version.
+        Returns whether anything changed.
+        """
+        changed = False
+        for participant_id, score in scores:
+            changed = self.set_score(int(participant_id), int(score)) or changed
+        if version is not None:
+            self.version = max(self.version, version)
+        return changed
+
+    def score_of(self, participant_id: int) -> int | None:
+        """The score of a participant."""
+        return self._scores.get(participant_id)
+
+    def name_of(self, participant_id: int) -> str | None:
+        """The name of a participant."""
+        return self._names.get(participant_id)
+
+    def rank_of(self, participant_id: int) -> int | None:
+        """The 1-based rank of a participant, None if it is unknown."""
+        with self._lock:
+            score = self._scores.get(participant_id)
+            if score is None:
+                return None
+            return self._keys.count_less((-score, float('-inf'))) + 1
+
+    def top(self, count: int, offset: int = 0) -> list[dict]:
+        """Returns count ranked entries starting at offset, best first."""
+        with self._lock:
+            keys = self._keys.slice(offset, count)
+            entries = []
+            for negative_score, participant_id in keys:
+                entries.append({
+                    'id': participant_id,
+                    'name': self._names[participant_id],
+                    'score': -negative_score,
+                    'rank': self._keys.count_less((negative_score, float('-inf'))) + 1,
+                })
+            return entries
+
+
+_leaderboards: dict[int, Leaderboard] = {}
+_leaderboards_lock = threading.Lock()
+
+
+def get_leaderboard(game: Game | int) -> Leaderboard:
+    """Returns the leaderboard of a game, loading it from the database on first use."""
+    game_id = game if isinstance(game, int) else game.id
+    leaderboard = _leaderboards.get(game_id)
+    if leaderboard is not None:
+        return leaderboard
+    with _leaderboards_lock:
+        leaderboard = _leaderboards.get(game_id)
+        if leaderboard is None:
+            entries = GameParticipant.objects.filter(game_id=game_id).values_list('id', 'name', 'score')
+            leaderboard = Leaderboard(entries)
+            _leaderboards[game_id] = leaderboard
+    return leaderboard
+
+
+def discard_leaderboard(game_id: int):
+    """Drops the cached leaderboard of a game so it gets reloaded on next use."""
+    with _leaderboards_lock:
+        _leaderboards.pop(game_id, None)
@@ -0,0 +1,60 @@
+import threading
+from typing import NamedTuple
+from .models import Game, GameParticipant
+from .play_state import table_context
+
+
+class LiveState(NamedTuple):
+    version: int
+    """The game version the state was read at, it shows at least the mutations up to this version."""
+    page: str
+    question_visible: bool
+    answer_visible: bool
+    image_step: int
+    question_id: int | None
+    question: str | None
+    answer: str | None
+    buzzers_locked: bool
+    buzz_player_id: int | None
+    round_locks: frozenset[int]
+    """The participants whose buzzer is locked, only read while a question is shown."""
+    table: dict | None
+    """The context of game/quiztable_partial.html, only read while the quiz table is shown."""
+
+
+_live_states: dict[int, LiveState] = {}
+_live_states_lock = threading.Lock()
+
+
+def get_live_state(game_id: int, version: int | None = None) -> LiveState:
+    """
+    What the clients of a game are shown, at least at the given version. The first connection rendering a game
+    event reads it, the other connections of the game rendering the same event share it. Without a version,
+    e.g. at login, it is always read.
+    """
+    state = _live_states.get(game_id)
+    if state is not None and version is not None and state.version >= version:
+        return state
+    row = Game.objects.filter(id=game_id).values_list(
+        'version', 'current_view__page', 'current_view__question_visible', 'current_view__answer_visible',
+        'current_view__image_step', 'current_view__question_id', 'current_view__question_id__question',
+        'current_view__question_id__answer', 'buzzers_locked', 'buzz_player_id', 'current_view__jepardy_table_id',
+    ).get()
+    *fields, table_id = row
+    page = fields[1]
+    if page == 'JepardyTable':
+        round_locks, table = frozenset(), table_context(table_id, game_id)
+    else:
+        round_locks, table = frozenset(GameParticipant.objects.filter(game_id=game_id, round_lock=True).values_list('id', flat=True)), None
+    state = LiveState(*fields, round_locks, table)
+    with _live_states_lock:
+        current = _live_states.get(game_id)
+        if current is None or current.version <= state.version:
+            _live_states[game_id] = state
+    return state
+
+
+def discard_live_state(game_id: int):
+    """Drops the live state of a game without connections in this process."""
+    with _live_states_lock:
+        _live_states.pop(game_id, None)
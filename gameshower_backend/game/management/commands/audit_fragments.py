@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+from game.settings import PUSHED_FRAGMENT_BYTE_BUDGET, LEADERBOARD_PAGE_SIZE, GUESS_MAX_LENGTH, GUESS_HISTOGRAM_SIZE, GUESS_CLOSEST_COUNT
+
+SAMPLE_TEXT = 'x' * 100
+"""Sample text filling a GameQuestion CharField to its max_length."""
+SAMPLE_IMAGE_URL = f'/media/question-images/{"0" * 64}.jpg'
+
+
+def sample_participants(count: int):
+    return [
+        {'id': i, 'name': f'Player {i}', 'score': 1000, 'round_lock': i % 2 == 0}
+        for i in range(count)
+    ]
+
+
+def sample_table(columns: int, questions: int):
+    return {
+        'name': 'Quiz Table',
+        'columns': [
+            {'name': f'Column {i}', 'questions': [{'id': i * questions + j, 'points': (j + 1) * 100} for j in range(questions)]}
+            for i in range(columns)
+        ],
+    }
+
+
+def pushed_fragments(players: int, columns: int, questions: int):
+    """Yields (template, context) pairs for every fragment the consumers push."""
+    participants = sample_participants(players)
+    ranked = [dict(participant, rank=participant['id'] + 1) for participant in participants]
+    yield 'player/login_partial.html', {}
+    yield 'moderator/login_partial.html', {}
+    yield 'player/htmx_wrap.html', {'ws_url': 'ws://localhost:8001/ws/player/', 'login_key': SAMPLE_TEXT}
+    yield 'moderator/htmx_wrap.html', {'ws_url': 'ws://localhost:8001/ws/moderator/', 'login_key': SAMPLE_TEXT}
+    yield 'game/quiztable_partial.html', {'table': sample_table(columns, questions), 'played': set(range(columns * questions)), 'active': {0}}
+    yield 'game/score_setup_partial.html', {'participants': ranked[:LEADERBOARD_PAGE_SIZE], 'page': 1, 'page_count': 3}
+    yield 'player/rank_partial.html', {'rank': 1, 'score': 1000, 'total': players}
+    yield 'game/question_partials/answer_wrap.html', {'answer_text': SAMPLE_TEXT, 'answer_visible': True}
+    yield 'game/question_partials/timer_wrap.html', {'timer': 30}
+    yield 'player/question_partial.html', {}
+    yield 'player/question_text_partial.html', {'question_text': SAMPLE_TEXT}
+    yield 'player/buzzer_partial.html', {'disabled': False}
+    yield 'moderator/question_partial.html', {}
+    yield 'moderator/question_wrap.html', {'question_text': SAMPLE_TEXT, 'question_visible': True}
+    yield 'moderator/answer_wrap.html', {'answer_text': SAMPLE_TEXT, 'answer_visible': True}
+    yield 'moderator/buzzer_partial.html', {'buzzers_locked': False, 'buzz_player_id': 1, 'participants': participants}
+    yield 'moderator/rate_answer_partial.html', {'buzz_player_id': 1}
+    yield 'moderator/presence_partial.html', {'players_online': players, 'player_count': players, 'moderator_connections': 2}
+    yield 'game/question_partials/image_wrap.html', {'image_url': SAMPLE_IMAGE_URL}
+    yield 'moderator/image_wrap.html', {'image_url': SAMPLE_IMAGE_URL, 'step': 0, 'step_count': 5}
+    yield 'player/input_question_partial.html', {}
+    yield 'player/guess_partial.html', {'is_open': True, 'is_numeric': False, 'guess': SAMPLE_TEXT, 'max_length': GUESS_MAX_LENGTH}
+    yield 'moderator/input_question_partial.html', {}
+    yield 'moderator/guess_stats_partial.html', {
+        'guess_count': players,
+        'is_open': True,
+        'histogram': [{'label': SAMPLE_TEXT, 'count': players, 'percent': 100}] * GUESS_HISTOGRAM_SIZE,
+        'closest': [{'name': 'Player', 'guess': '1000', 'distance': '1'}] * GUESS_CLOSEST_COUNT,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Renders every websocket fragment with sample data and fails if one exceeds the byte budget.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--budget', type=int, default=PUSHED_FRAGMENT_BYTE_BUDGET, help='Byte budget per fragment.')
+        parser.add_argument('--players', type=int, default=8, help='Number of sample participants.')
+        parser.add_argument('--columns', type=int, default=6, help='Number of sample quiz table columns.')
+        parser.add_argument('--questions', type=int, default=5, help='Number of sample questions per column.')
+
+    def handle(self, *args, **options):
+        budget = options['budget']
+        over_budget = []
+        for template, context in pushed_fragments(options['players'], options['columns'], options['questions']):
+            size = len(render_to_string(template, context).encode('utf-8'))
+            line = f'{size:>7} B  {template}'
+            if size > budget:
+                over_budget.append(template)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        if over_budget:
+            raise CommandError(f'{len(over_budget)} fragment(s) exceed the budget of {budget} bytes: {", ".join(over_budget)}')
+        self.stdout.write(self.style.SUCCESS(f'All fragments are within the budget of {budget} bytes.'))
@@ -0,0 +1,111 @@
+import asyncio
+import multiprocessing
+import tempfile
+import time
+from django.core.management.base import BaseCommand
+from channels.layers import InMemoryChannelLayer
+from game.channel_layers import UnixSocketChannelLayer
+
+GROUP = 'bench'
+
+
+async def receive_all(layer, channels: list[str], messages: int, timeout: float) -> tuple[int, float]:
+    """
+    Receives messages on every channel until all arrived or nothing arrived for timeout seconds.
+    Returns the number of received messages and the wall clock time of the last one.
+    """
+    last_received = 0.0
+
+    async def receive_channel(channel):
+        nonlocal last_received
+        received = 0
+        while received < messages:
+            try:
+                await asyncio.wait_for(layer.receive(channel), timeout)
+            except asyncio.TimeoutError:
+                break
+            received += 1
+            last_received = max(last_received, time.time())
+        return received
+    counts = await asyncio.gather(*(receive_channel(channel) for channel in channels))
+    return sum(counts), last_received
+
+
+async def join_group(layer, members: int) -> list[str]:
+    channels = [await layer.new_channel() for _ in range(members)]
+    for channel in channels:
+        await layer.group_add(GROUP, channel)
+    return channels
+
+
+def run_worker(socket_dir: str, members: int, messages: int, ready, results):
+    """A worker process holding members group channels of the unix socket layer."""
+    async def main():
+        layer = UnixSocketChannelLayer(socket_dir, capacity=messages)
+        channels = await join_group(layer, members)
+        ready.set()
+        results.put(await receive_all(layer, channels, messages, 2.0))
+        await layer.close()
+    asyncio.run(main())
+
+
+class Command(BaseCommand):
+    help = 'Measures group_send throughput of the in-memory and the unix socket channel layer.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Number of worker processes for the unix socket layer.')
+        parser.add_argument('--members', type=int, default=25, help='Group members per worker.')
+        parser.add_argument('--messages', type=int, default=2000, help='Number of group_send calls.')
+
+    def report(self, name: str, sends: int, delivered: int, expected: int, seconds: float):
+        self.stdout.write(
+            f'{name:<12} {sends / seconds:>10,.0f} group_send/s  {delivered / seconds:>10,.0f} deliveries/s  '
+            f'({delivered}/{expected} delivered in {seconds:.2f} s)'
+        )
+
+    def bench_in_memory(self, workers: int, members: int, messages: int):
+        async def main():
+            layer = InMemoryChannelLayer(capacity=messages)
+            channels = await join_group(layer, workers * members)
+            receiving = asyncio.ensure_future(receive_all(layer, channels, messages, 2.0))
+            start = time.time()
+            for i in range(messages):
+                await layer.group_send(GROUP, {'type': 'game_event', 'number': i})
+            delivered, last_received = await receiving
+            return delivered, last_received - start
+        delivered, seconds = asyncio.run(main())
+        self.report('in-memory', messages, delivered, workers * members * messages, seconds)
+
+    def bench_unix_socket(self, workers: int, members: int, messages: int):
+        with tempfile.TemporaryDirectory() as socket_dir:
+            context = multiprocessing.get_context('spawn')
+            results = context.Queue()
+            processes = []
+            for _ in range(workers):
+                ready = context.Event()
+                process = context.Process(target=run_worker, args=(socket_dir, members, messages, ready, results))
+                process.start()
+                ready.wait()
+                processes.append(process)
+
+            async def main():
+                layer = UnixSocketChannelLayer(socket_dir)
+                await layer.new_channel()
+                start = time.time()
+                for i in range(messages):
+                    await layer.group_send(GROUP, {'type': 'game_event', 'number': i})
+                await layer.close()
+                return start
+            start = asyncio.run(main())
+            worker_results = [results.get() for _ in processes]
+            delivered = sum(count for count, _ in worker_results)
+            seconds = max(last_received for _, last_received in worker_results) - start
+            for process in processes:
+                process.join()
+        self.report('unix socket', messages, delivered, workers * members * messages, seconds)
+
+    def handle(self, *args, **options):
+        workers, members, messages = options['workers'], options['members'], options['messages']
+        self.stdout.write(f'{workers} x {members} group members, {messages} group_send calls')
+        self.bench_in_memory(workers, members, messages)
+        self.bench_unix_socket(workers, members, messages)
@@ -0,0 +1,76 @@
+import json
+import time
+from django.core.management.base import BaseCommand
+from game.messages import PLAYER_MESSAGES, MessageError
+from game.settings import MESSAGE_MAX_BYTES
+
+HTMX_HEADERS = {
+    'HX-Request': 'true',
+    'HX-Trigger': 'buzzer_button',
+    'HX-Trigger-Name': None,
+    'HX-Target': 'buzzer_button',
+    'HX-Current-URL': 'https://gameshower.example/player',
+}
+"""The headers htmx adds to every ws-send message."""
+
+
+def buzz_frames(count: int) -> list[str]:
+    """Buzzer clicks of count players pressed within a second, as the htmx websocket extension sends them."""
+    start = time.time() * 1000
+    return [json.dumps({'type': 'buzzer-click', 'clientTime': start + number / count * 1000, 'HEADERS': HTMX_HEADERS}) for number in range(count)]
+
+
+def bad_frames(count: int) -> list[str]:
+    """Malformed and oversized frames in equal parts."""
+    kinds = [
+        '{"type": "buzzer-click", "clientTime": ',
+        '["buzzer-click"]',
+        '{"type": "buzzer-click", "clientTime": "soon"}',
+        '{"type": "drop-tables"}',
+        '{"type": "buzzer-click", "clientTime": 1, "padding": "' + 'x' * MESSAGE_MAX_BYTES + '"}',
+    ]
+    return [kinds[number % len(kinds)] for number in range(count)]
+
+
+def decode_untyped(text_data: str):
+    """The decoding before the message tables: parse, then read the fields of the matched type."""
+    json_data = json.loads(text_data)
+    match json_data.get('type'):
+        case 'buzzer-click':
+            return json_data.get('clientTime')
+
+
+def decode_typed(text_data: str):
+    try:
+        return PLAYER_MESSAGES.decode(text_data)
+    except MessageError:
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Measures the decoding of player messages during a buzz storm, and the rejection of bad frames.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=1000, help='Number of buzzer clicks per storm.')
+        parser.add_argument('--rounds', type=int, default=50, help='Number of storms measured.')
+
+    def measure(self, decode, frames: list[str], rounds: int) -> float:
+        """Microseconds per frame, the best of all rounds."""
+        best = float('inf')
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for frame in frames:
+                decode(frame)
+            best = min(best, time.perf_counter() - start)
+        return best / len(frames) * 1_000_000
+
+    def report(self, name: str, microseconds: float):
+        self.stdout.write(f'{name:<28} {microseconds:>8.2f} µs/frame  {1_000_000 / microseconds:>12,.0f} frames/s')
+
+    def handle(self, *args, **options):
+        players, rounds = options['players'], options['rounds']
+        frames = buzz_frames(players)
+        self.stdout.write(f'{players} buzzer clicks per storm, best of {rounds} storms')
+        self.report('untyped json + match', self.measure(decode_untyped, frames, rounds))
+        self.report('typed message table', self.measure(decode_typed, frames, rounds))
+        self.report('rejected bad frames', self.measure(decode_typed, bad_frames(players), rounds))
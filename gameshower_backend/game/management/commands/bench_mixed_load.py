@@ -0,0 +1,147 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient
+from django.test.utils import override_settings
+from game.consumers import ModeratorConsumer, PlayerConsumer
+from game.models import Game, JepardyQuestion
+from game.plain_db_apis import create_game_from_json
+
+GAME_JSON = {
+    'name': 'Bench',
+    'tables': [{'name': 'Table', 'columns': [
+        {'name': f'Column {column}', 'questions': [{'question': f'Q{points}', 'answer': 'A', 'points': points} for points in (100, 200, 300)]}
+        for column in range(4)
+    ]}],
+    'participants': [],
+}
+"""A small quiz, posted by the HTTP clients and played by the websocket clients."""
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    return sorted(values)[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = 'Measures websocket action latency while HTTP clients load the creation APIs, on a throwaway test database.'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=20, help='Players logged into the played game.')
+        parser.add_argument('--http-clients', type=int, default=8, help='Concurrent HTTP clients.')
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds per measurement.')
+
+    def handle(self, *args, **options):
+        # A file database like in production, the in-memory test database locks whole tables across threads
+        temp_dir = tempfile.TemporaryDirectory()
+        connection.settings_dict['TEST']['NAME'] = os.path.join(temp_dir.name, 'bench.sqlite3')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+            }):
+                self.run_benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            temp_dir.cleanup()
+
+    def run_benchmark(self, options):
+        admin = User.objects.create_superuser('bench', 'bench@localhost', 'bench')
+        created = create_game_from_json(json.dumps({**GAME_JSON, 'participants': [{'name': f'P{number}'} for number in range(options['players'])]}))
+        game = Game.objects.get(id=created.game_id)
+        table = game.jepardytables.get()
+        game.current_view.page = 'JepardyTable'
+        game.current_view.jepardy_table = table
+        game.current_view.save()
+        values = {
+            'admin': admin,
+            'game_id': game.id,
+            'moderator_key': game.moderator_key,
+            'player_keys': list(game.participants.values_list('private_key', flat=True)),
+            'question_id': JepardyQuestion.objects.filter(columns__in=table.columns.all()).values_list('id', flat=True).first(),
+        }
+        idle, loaded, http = asyncio.run(self.measure(values, options))
+        self.stdout.write(f'{options["players"]} players, {options["http_clients"]} HTTP clients, {options["duration"]:g} s per run')
+        self.stdout.write(f'  websocket actions idle:   {len(idle)} actions, p50 {percentile(idle, 0.5):.1f} ms, p95 {percentile(idle, 0.95):.1f} ms')
+        self.stdout.write(f'  websocket actions loaded: {len(loaded)} actions, p50 {percentile(loaded, 0.5):.1f} ms, p95 {percentile(loaded, 0.95):.1f} ms')
+        self.stdout.write(
+            f'  HTTP: {len(http)} requests, {len(http) / options["duration"]:.0f} req/s, '
+            f'p50 {percentile(http, 0.5):.1f} ms, p95 {percentile(http, 0.95):.1f} ms'
+        )
+
+    async def measure(self, values: dict, options: dict) -> tuple[list[float], list[float], list[float]]:
+        moderator = WebsocketCommunicator(ModeratorConsumer.as_asgi(), '/ws/moderator/')
+        await moderator.connect()
+        await moderator.send_to(text_data=json.dumps({'type': 'login', 'gameCode': values['moderator_key']}))
+        players = []
+        for key in values['player_keys']:
+            player = WebsocketCommunicator(PlayerConsumer.as_asgi(), '/ws/player/')
+            await player.connect()
+            await player.send_to(text_data=json.dumps({'type': 'login', 'gameCode': key}))
+            players.append(player)
+        await self.settle([moderator, *players])
+
+        idle = await self.play(moderator, players, values, options['duration'])
+        clients = []
+        for _ in range(options['http_clients']):
+            client = AsyncClient()
+            # Logs in without hashing the password, the hashing would land in the measured window
+            await client.aforce_login(values['admin'])
+            clients.append(client)
+        stop = time.perf_counter() + options['duration']
+        http_clients = [asyncio.create_task(self.load_http(client, values, stop)) for client in clients]
+        loaded = await self.play(moderator, players, values, options['duration'])
+        http = [latency for latencies in await asyncio.gather(*http_clients) for latency in latencies]
+
+        for communicator in [moderator, *players]:
+            await communicator.disconnect()
+        return idle, loaded, http
+
+    async def settle(self, communicators: list[WebsocketCommunicator]):
+        """Receives until no connection gets anything for 50 ms."""
+        async def drain(communicator):
+            while not await communicator.receive_nothing(timeout=0.05):
+                await communicator.receive_output()
+        await asyncio.gather(*(drain(communicator) for communicator in communicators))
+
+    async def play(self, moderator, players, values: dict, duration: float) -> list[float]:
+        """Opens and closes a question for duration seconds. Returns the ms until every player got each update."""
+        latencies = []
+        messages = [{'type': 'question-click', 'question_id': str(values['question_id'])}, {'type': 'exit-question'}]
+        stop = time.perf_counter() + duration
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            await moderator.send_to(text_data=json.dumps(messages[len(latencies) % 2]))
+            for player in players:
+                await player.receive_output(timeout=10)
+            latencies.append((time.perf_counter() - start) * 1000)
+            await self.settle([moderator, *players])
+        return latencies
+
+    async def load_http(self, client: AsyncClient, values: dict, stop: float) -> list[float]:
+        """Alternates the key page, the JSON import and the quiz table page until stop. Returns the request latencies in ms."""
+        body = json.dumps({**GAME_JSON, 'participants': [{'name': 'P'}]})
+        latencies = []
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            match len(latencies) % 3:
+                case 0:
+                    response = await client.get(f'/game_keys/{values["game_id"]}/')
+                case 1:
+                    response = await client.post('/api/create-full-game/', body, content_type='application/json')
+                case _:
+                    response = await client.get('/quiz-tables')
+            if response.status_code != 200:
+                raise RuntimeError(f'HTTP {response.status_code} from {response.request["path"]}')
+            latencies.append((time.perf_counter() - start) * 1000)
+        return latencies
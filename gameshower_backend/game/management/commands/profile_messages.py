@@ -0,0 +1,37 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from game.profiling import read_config, remove_config, write_config
+from game.settings import PROFILE_DEFAULT_MINUTES, PROFILE_CONFIG_CHECK_INTERVAL
+
+
+class Command(BaseCommand):
+    help = 'Switches profiling of websocket messages on or off in all running workers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--type', action='append', default=[], help='Message type to profile, e.g. exit-question. May be repeated, all types if omitted.')
+        parser.add_argument('--game', type=int, action='append', default=[], help='Id of a game to profile. May be repeated, all games if omitted.')
+        parser.add_argument('--minutes', type=float, default=PROFILE_DEFAULT_MINUTES, help='Minutes until profiling switches itself off.')
+        parser.add_argument('--off', action='store_true', help='Switches profiling off.')
+        parser.add_argument('--status', action='store_true', help='Shows whether profiling is on.')
+
+    def handle(self, *args, **options):
+        if options['status']:
+            config = read_config()
+            if config is None:
+                self.stdout.write('Profiling is off')
+            else:
+                self.stdout.write(
+                    f'Profiling types {config["types"] or "all"} of games {config["games"] or "all"} '
+                    f'for {(config["until"] - time.time()) / 60:.1f} more minutes into {settings.PROFILE_ROOT}'
+                )
+            return
+        if options['off']:
+            remove_config()
+            self.stdout.write('Profiling switched off')
+            return
+        write_config(options['type'], options['game'], time.time() + options['minutes'] * 60)
+        self.stdout.write(
+            f'Profiling switched on for {options["minutes"]:g} minutes, workers pick it up within '
+            f'{PROFILE_CONFIG_CHECK_INTERVAL} s. Profiles are written to {settings.PROFILE_ROOT}'
+        )
@@ -0,0 +1,45 @@
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from game.models import JepardyTable
+from game.provisioning import KEY_EXPORT_FORMATS, iter_game_keys, provision_games
+
+
+class Command(BaseCommand):
+    help = 'Creates many games with generated players in bulk and optionally exports their keys.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type=int, default=1, help='Number of games to create.')
+        parser.add_argument('--players', type=int, default=0, help='Number of players per game.')
+        parser.add_argument('--prefix', default='Game', help='Game names are "<prefix> <number>".')
+        parser.add_argument('--table', type=int, action='append', default=[], help='Id of a quiz table every game plays, may be repeated.')
+        parser.add_argument('--export', help='Writes the keys of the new games to this file, - for stdout.')
+        parser.add_argument('--format', choices=list(KEY_EXPORT_FORMATS), default='csv', help='Format of the key export.')
+
+    def handle(self, *args, **options):
+        if options['games'] < 1 or options['players'] < 0:
+            raise CommandError('--games must be at least 1 and --players must not be negative')
+        missing_tables = set(options['table']) - set(JepardyTable.objects.filter(id__in=options['table']).values_list('id', flat=True))
+        if missing_tables:
+            raise CommandError(f'Unknown quiz tables: {", ".join(map(str, sorted(missing_tables)))}')
+
+        start = time.perf_counter()
+        game_ids = provision_games(options['games'], options['players'], options['prefix'], options['table'])
+        # Progress goes to stderr so an export to stdout stays clean
+        self.stderr.write(
+            f'Created {len(game_ids)} games with {len(game_ids) * options["players"]} players '
+            f'in {time.perf_counter() - start:.2f} s (game ids {game_ids[0]}-{game_ids[-1]})'
+        )
+
+        if options['export'] is None:
+            return
+        start = time.perf_counter()
+        formatter, _ = KEY_EXPORT_FORMATS[options['format']]
+        output = sys.stdout if options['export'] == '-' else open(options['export'], 'w', newline='')
+        try:
+            for line in formatter(iter_game_keys(game_ids)):
+                output.write(line)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        self.stderr.write(f'Exported keys in {time.perf_counter() - start:.2f} s')
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from game.models import Game, Tournament
+from game.tournaments import add_games
+
+
+class Command(BaseCommand):
+    help = 'Creates a tournament or adds games to one, and prints the key of its standings display.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--name', help='Creates a new tournament with this name.')
+        parser.add_argument('--tournament', type=int, help='Id of an existing tournament to add the games to.')
+        parser.add_argument('--game', type=int, action='append', default=[], help='Id of a game playing in the tournament, may be repeated.')
+
+    def handle(self, *args, **options):
+        if (options['name'] is None) == (options['tournament'] is None):
+            raise CommandError('Give either --name or --tournament')
+        missing_games = set(options['game']) - set(Game.objects.filter(id__in=options['game']).values_list('id', flat=True))
+        if missing_games:
+            raise CommandError(f'Unknown games: {", ".join(map(str, sorted(missing_games)))}')
+
+        if options['name'] is not None:
+            tournament = Tournament.objects.create(name=options['name'])
+        else:
+            try:
+                tournament = Tournament.objects.get(id=options['tournament'])
+            except Tournament.DoesNotExist:
+                raise CommandError(f'Unknown tournament {options["tournament"]}')
+        try:
+            linked = add_games(tournament.id, options['game'])
+        except ValueError as error:
+            raise CommandError(str(error))
+        self.stdout.write(f'Tournament {tournament.id} "{tournament.name}": {len(options["game"])} games added, {linked} players linked')
+        self.stdout.write(f'Display key: {tournament.display_key}')
@@ -0,0 +1,145 @@
+import numpy as np
+from .guessing import GuessAggregator, parse_number
+from .settings import MAP_SCORING, MAP_DECAY_HALF_DISTANCE_KM
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def parse_coordinates(value) -> tuple[float, float] | None:
+    """
+    Parses a coordinate guess given as 'lat, lon' text or a (lat, lon) pair.
+    Returns None for anything that is not a valid position.
+    """
+    if isinstance(value, str):
+        value = value.replace(';', ',').split(',')
+    try:
+        latitude, longitude = value
+    except (TypeError, ValueError):
+        return None
+    latitude, longitude = parse_number(latitude), parse_number(longitude)
+    if latitude is None or longitude is None or not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+        return None
+    return latitude, longitude
+
+
+def great_circle_distances(latitudes: np.ndarray, longitudes: np.ndarray, target: tuple[float, float]) -> np.ndarray:
+    """Haversine distances in km from every (latitude, longitude) pair to the target, computed in one pass."""
+    latitudes = np.radians(latitudes)
+    longitudes = np.radians(longitudes)
+    target_latitude, target_longitude = np.radians(target)
+    a = (np.sin((latitudes - target_latitude) / 2) ** 2
+         + np.cos(latitudes) * np.cos(target_latitude) * np.sin((longitudes - target_longitude) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def rank_points(distances: np.ndarray, points: int) -> np.ndarray:
+    """
+    Points falling linearly with the rank: the closest guess gets all points, the last one almost none.
+    Equal distances share the better rank.
+    """
+    count = len(distances)
+    ranks = np.searchsorted(np.sort(distances), distances, side='left')
+    return np.rint(points * (count - ranks) / count).astype(np.int64)
+
+
+def decay_points(distances: np.ndarray, points: int, half_distance_km: float) -> np.ndarray:
+    """Points halving every half_distance_km away from the target."""
+    return np.rint(points * np.exp2(-distances / half_distance_km)).astype(np.int64)
+
+
+def score_map_guesses(participant_ids: np.ndarray, latitudes: np.ndarray, longitudes: np.ndarray,
+                      target: tuple[float, float], points: int, mode: str = MAP_SCORING,
+                      half_distance_km: float = MAP_DECAY_HALF_DISTANCE_KM) -> dict[int, int]:
+    """Scores all coordinate guesses against the target. mode is 'rank' or 'decay'."""
+    if len(participant_ids) == 0:
+        return {}
+    distances = great_circle_distances(latitudes, longitudes, target)
+    match mode:
+        case 'rank':
+            awarded = rank_points(distances, points)
+        case 'decay':
+            awarded = decay_points(distances, points, half_distance_km)
+        case _:
+            raise ValueError(f'Unknown map scoring mode: {mode}')
+    scoring = awarded > 0
+    return dict(zip(participant_ids[scoring].tolist(), awarded[scoring].tolist()))
+
+
+def format_km(distance: float) -> str:
+    """Formats a distance for display."""
+    return f'{distance:,.0f} km' if distance >= 10 else f'{distance:.1f} km'
+
+
+class MapGuessAggregator(GuessAggregator):
+    """
+    Collects the coordinate guesses of a map question.
+    The answer of a map question holds the target as 'lat, lon'.
+    """
+
+    def __init__(self, jepardy_question_id: int, answer: str):
+        super().__init__(jepardy_question_id, answer)
+        self.target = None
+        self.target_coordinates = parse_coordinates(answer)
+        if self.target_coordinates is None:
+            raise ValueError(f'Invalid map answer: {answer}')
+
+    def submit(self, participant_id: int, raw_guess) -> bool:
+        """Records a coordinate guess. Returns False if the guess was rejected."""
+        if not self.is_open:
+            return False
+        guess = parse_coordinates(raw_guess)
+        if guess is None:
+            return False
+        with self._lock:
+            self._guesses[participant_id] = guess
+        return True
+
+    def guess_of(self, participant_id: int) -> str | None:
+        """The current guess of a participant, formatted for display."""
+        guess = self._guesses.get(participant_id)
+        if guess is None:
+            return None
+        return f'{guess[0]:.4f}, {guess[1]:.4f}'
+
+    def _coordinates(self) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the participant ids and their guesses as an (n, 2) array of latitude and longitude."""
+        with self._lock:
+            guesses = list(self._guesses.items())
+        participant_ids = np.fromiter((participant_id for participant_id, _ in guesses), dtype=np.int64, count=len(guesses))
+        coordinates = np.array([guess for _, guess in guesses], dtype=np.float64).reshape(-1, 2)
+        return participant_ids, coordinates
+
+    def _arrays(self) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the participant ids and the distances of their guesses to the target."""
+        participant_ids, coordinates = self._coordinates()
+        return participant_ids, great_circle_distances(coordinates[:, 0], coordinates[:, 1], self.target_coordinates)
+
+    def histogram(self, size: int) -> list[dict]:
+        """Returns size bars of equal width over the distance to the target."""
+        participant_ids, distances = self._arrays()
+        if len(participant_ids) == 0:
+            return []
+        counts, edges = np.histogram(distances, bins=size)
+        total = len(participant_ids)
+        return [
+            {'label': f'{format_km(edges[i])} - {format_km(edges[i + 1])}', 'count': int(count), 'percent': round(100 * int(count) / total)}
+            for i, count in enumerate(counts)
+        ]
+
+    def closest(self, count: int) -> list[dict]:
+        """Returns the count guesses closest to the target, best first."""
+        participant_ids, distances = self._arrays()
+        if len(participant_ids) == 0:
+            return []
+        count = min(count, len(participant_ids))
+        best = np.argpartition(distances, count - 1)[:count]
+        best = best[np.argsort(distances[best])]
+        return [
+            {'participant_id': int(participant_ids[i]), 'guess': self.guess_of(int(participant_ids[i])), 'distance': format_km(distances[i])}
+            for i in best
+        ]
+
+    def awards(self, points: int) -> dict[int, int]:
+        """Returns the points per participant, see MAP_SCORING."""
+        participant_ids, coordinates = self._coordinates()
+        return score_map_guesses(participant_ids, coordinates[:, 0], coordinates[:, 1], self.target_coordinates, points)
@@ -0,0 +1,118 @@
+import base64
+import binascii
+import hashlib
+import io
+import os
+import re
+from functools import lru_cache
+from typing import AsyncIterator
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.urls import reverse
+from PIL import Image, ImageFilter, UnidentifiedImageError
+from .models import QuestionImageFrame
+from .settings import IMAGE_MAX_SIZE, IMAGE_BLUR_RADII, IMAGE_ZOOM_FRACTIONS, IMAGE_STREAM_CHUNK_SIZE
+
+IMAGE_QUESTION_TYPES = ('Image', 'ImageBlur', 'ImageScale')
+FRAME_DIRECTORY = 'question_images'
+FRAME_NAME_PATTERN = re.compile(r'^[0-9a-f]{64}\.jpg$')
+
+
+def frame_directory() -> str:
+    """The directory holding all question image frames."""
+    return os.path.join(settings.MEDIA_ROOT, FRAME_DIRECTORY)
+
+
+def frame_path(file_name: str) -> str:
+    """The path of a stored frame."""
+    return os.path.join(frame_directory(), file_name)
+
+
+async def aiter_frame(path: str, start: int, length: int) -> AsyncIterator[bytes]:
+    """Streams length bytes of a stored frame from start to an async response. Every file access runs in a worker thread."""
+    frame = await sync_to_async(open, thread_sensitive=False)(path, 'rb')
+    try:
+        await sync_to_async(frame.seek, thread_sensitive=False)(start)
+        while length > 0:
+            chunk = await sync_to_async(frame.read, thread_sensitive=False)(min(length, IMAGE_STREAM_CHUNK_SIZE))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        await sync_to_async(frame.close, thread_sensitive=False)()
+
+
+def decode_image(data: str) -> Image.Image:
+    """Decodes a base64 image, optionally given as data URL. Raises ValueError for anything that is not an image."""
+    if data.startswith('data:'):
+        data = data.partition(',')[2]
+    try:
+        image = Image.open(io.BytesIO(base64.b64decode(data, validate=True)))
+        image.load()
+    except (binascii.Error, UnidentifiedImageError, OSError) as e:
+        raise ValueError(f'Invalid image: {e}')
+    image = image.convert('RGB')
+    image.thumbnail((IMAGE_MAX_SIZE, IMAGE_MAX_SIZE))
+    return image
+
+
+def store_frame(image: Image.Image) -> str:
+    """Encodes a frame and stores it under its content hash. Returns the file name."""
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=85, optimize=True, progressive=True)
+    data = buffer.getvalue()
+    file_name = f'{hashlib.sha256(data).hexdigest()}.jpg'
+    path = frame_path(file_name)
+    if not os.path.exists(path):
+        os.makedirs(frame_directory(), exist_ok=True)
+        temporary_path = f'{path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'wb') as f:
+            f.write(data)
+        os.replace(temporary_path, path)
+    return file_name
+
+
+def blur_frames(image: Image.Image) -> list[Image.Image]:
+    """Frames going from strongly blurred to sharp."""
+    return [image.filter(ImageFilter.GaussianBlur(radius)) if radius else image for radius in IMAGE_BLUR_RADII]
+
+
+def zoom_frames(image: Image.Image) -> list[Image.Image]:
+    """Frames going from a close-up of the image center to the full image."""
+    width, height = image.size
+    frames = []
+    for fraction in IMAGE_ZOOM_FRACTIONS:
+        crop_width, crop_height = max(1, round(width * fraction)), max(1, round(height * fraction))
+        left, top = (width - crop_width) // 2, (height - crop_height) // 2
+        frames.append(image.crop((left, top, left + crop_width, top + crop_height)).resize((width, height), Image.Resampling.LANCZOS))
+    return frames
+
+
+def generate_image_frames(question_type: str, image_data: str) -> list[str]:
+    """Generates and stores all reveal steps of an image question. Returns the frame file names in order."""
+    image = decode_image(image_data)
+    match question_type:
+        case 'ImageBlur':
+            frames = blur_frames(image)
+        case 'ImageScale':
+            frames = zoom_frames(image)
+        case _:
+            frames = [image]
+    return [store_frame(frame) for frame in frames]
+
+
+def create_image_frames(question, image_data: str):
+    """Generates the frames of a saved GameQuestion and links them to it."""
+    file_names = generate_image_frames(question.question_type, image_data)
+    QuestionImageFrame.objects.bulk_create([
+        QuestionImageFrame(question=question, step=step, file_name=file_name)
+        for step, file_name in enumerate(file_names)
+    ])
+
+
+@lru_cache(maxsize=4096)
+def get_frame_urls(question_id: int) -> tuple[str, ...]:
+    """The frame URLs of a question in reveal order. Frames never change once created, so they are cached."""
+    file_names = QuestionImageFrame.objects.filter(question_id=question_id).values_list('file_name', flat=True)
+    return tuple(reverse('question_image', args=[file_name]) for file_name in file_names)
@@ -0,0 +1,199 @@
+import json
+import logging
+import math
+from typing import Any, Callable
+from .settings import MESSAGE_MAX_BYTES, GUESS_MAX_LENGTH
+
+Converter = Callable[[Any], Any]
+"""Turns the raw JSON value of a message field into its typed value. Raises ValueError for invalid values."""
+
+KEY_MAX_LENGTH = 100
+"""Longest login key accepted, the max_length of the key fields."""
+NAME_MAX_LENGTH = 100
+"""Longest game or player name accepted from the admin socket."""
+NAME_LIST_MAX_LENGTH = 10000
+"""Most player names accepted in one create-game message."""
+TIMER_MAX_COUNT = 60 * 60
+"""Longest countdown in seconds a moderator can start."""
+MISSING = object()
+
+logger = logging.getLogger(__name__)
+
+
+class MessageError(ValueError):
+    """A client message that is malformed, too large or of a type the consumer does not handle."""
+
+
+#region field converters
+def integer(minimum: int | None = None, maximum: int | None = None) -> Converter:
+    """An int, also given as a string of digits as htmx sends form values."""
+    def convert(value):
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise ValueError(f'{value!r} is not an integer')
+        value = int(value)
+        if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+            raise ValueError(f'{value} is out of range')
+        return value
+    return convert
+
+
+def number(value) -> float:
+    """A finite float, also given as a string."""
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f'{value!r} is not a number')
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError(f'{value} is not finite')
+    return value
+
+
+def boolean(value) -> bool:
+    """A JSON boolean, also given as "true" or "false"."""
+    if isinstance(value, bool):
+        return value
+    if value in ('true', 'false'):
+        return value == 'true'
+    raise ValueError(f'{value!r} is not a boolean')
+
+
+def text(max_length: int) -> Converter:
+    """A string of at most max_length characters."""
+    def convert(value):
+        if not isinstance(value, str) or len(value) > max_length:
+            raise ValueError(f'{value!r} is not a string of at most {max_length} characters')
+        return value
+    return convert
+
+
+def choice(*choices: str) -> Converter:
+    """One of the given strings."""
+    def convert(value):
+        if value not in choices:
+            raise ValueError(f'{value!r} is not one of {choices}')
+        return value
+    return convert
+
+
+def text_list(max_items: int, max_length: int) -> Converter:
+    """A list of at most max_items strings."""
+    item = text(max_length)
+    def convert(value):
+        if not isinstance(value, list) or len(value) > max_items:
+            raise ValueError(f'Not a list of at most {max_items} items')
+        return [item(entry) for entry in value]
+    return convert
+
+
+def optional(converter: Converter, default=None) -> Converter:
+    """The field may be missing or null, the handler then gets default."""
+    def convert(value):
+        if value is MISSING or value is None:
+            return default
+        return converter(value)
+    convert.optional = True
+    return convert
+#endregion
+
+
+#region dispatch
+class MessageTable:
+    """
+    The client messages one consumer role handles: for every message type the name of its handler method and the
+    converters of its fields, whose values are passed to the handler in that order. A frame is size checked, parsed
+    and every field converted before the handler runs, so bad input never reaches the database. Fields not in the
+    schema, like the HEADERS htmx adds, are ignored.
+    With login_attribute, the consumer attribute that stays None until the login, only the before_login messages
+    are handled before the login, all others are dropped without reaching their handler.
+    """
+
+    def __init__(self, messages: dict[str, tuple[str | None, dict[str, Converter]]], login_attribute: str | None = None, before_login: tuple[str, ...] = ()):
+        # Precompiled for the hot path: the field tuples are walked without any lookups but the JSON dict
+        self._messages = {
+            message_type: (handler, tuple((name, converter, getattr(converter, 'optional', False)) for name, converter in fields.items()))
+            for message_type, (handler, fields) in messages.items()
+        }
+        self.login_attribute = login_attribute
+        self._login_handlers = frozenset(
+            handler for message_type, (handler, _) in messages.items()
+            if handler is not None and login_attribute is not None and message_type not in before_login
+        )
+
+    def decode(self, text_data: str | None) -> tuple[str | None, list]:
+        """Returns the handler name and typed field values of a frame, in schema order. A None handler means the message is ignored on purpose."""
+        # A character takes up to 4 bytes in UTF-8, only frames that may be too large get encoded to count them
+        if text_data is None or len(text_data) > MESSAGE_MAX_BYTES or (
+            len(text_data) * 4 > MESSAGE_MAX_BYTES and len(text_data.encode()) > MESSAGE_MAX_BYTES
+        ):
+            raise MessageError('Message missing or too large')
+        try:
+            data = json.loads(text_data)
+        except ValueError:
+            raise MessageError('Message is no JSON')
+        if not isinstance(data, dict):
+            raise MessageError('Message is no JSON object')
+        message_type = data.get('type')
+        message = self._messages.get(message_type) if isinstance(message_type, str) else None
+        if message is None:
+            raise MessageError(f'Unknown message type {message_type!r}')
+        handler, fields = message
+        values = []
+        for name, converter, is_optional in fields:
+            value = data.get(name, MISSING)
+            if value is MISSING and not is_optional:
+                raise MessageError(f'{message_type}: {name} missing')
+            try:
+                values.append(converter(value))
+            except (TypeError, ValueError) as error:
+                raise MessageError(f'{message_type}: {name}: {error}')
+        return handler, values
+
+    def dispatch(self, consumer, text_data: str | None) -> bool:
+        """Decodes a frame and calls the consumer's handler with the typed field values. Rejected frames are dropped. Returns whether it was handled."""
+        try:
+            handler, values = self.decode(text_data)
+        except MessageError as error:
+            logger.debug('Rejected message: %s', error)
+            return False
+        if handler in self._login_handlers and getattr(consumer, self.login_attribute) is None:
+            logger.debug('Rejected message: %s before login', handler)
+            return False
+        if handler is not None:
+            getattr(consumer, handler)(*values)
+        return True
+#endregion
+
+
+#region consumer roles
+ADMIN_MESSAGES = MessageTable({
+    'create-game': ('create_game', {'game_name': optional(text(NAME_MAX_LENGTH), 'New Game'), 'player_names': optional(text_list(NAME_LIST_MAX_LENGTH, NAME_MAX_LENGTH), [])}),
+})
+
+PLAYER_MESSAGES = MessageTable({
+    'login': ('login', {'gameCode': text(KEY_MAX_LENGTH)}),
+    'question-click': (None, {}),
+    'buzzer-click': ('buzz', {'clientTime': optional(number)}),
+    'clock-pong': ('handle_clock_pong', {'serverTime': number, 'clientTime': number}),
+    'scoreboard-page': ('change_scoreboard_page', {'page': integer(0)}),
+    'guess-submit': ('receive_guess', {'guess': optional(text(GUESS_MAX_LENGTH)), 'latitude': optional(number), 'longitude': optional(number)}),
+}, login_attribute='game_id', before_login=('login', 'clock-pong'))
+
+MODERATOR_MESSAGES = MessageTable({
+    'login': ('login', {'gameCode': text(KEY_MAX_LENGTH)}),
+    'clock-pong': ('handle_clock_pong', {'serverTime': number, 'clientTime': number}),
+    'question-click': ('open_question', {'question_id': integer(1)}),
+    'show-question': ('set_question_visible', {'visible': boolean}),
+    'show-answer': ('set_answer_visible', {'visible': boolean}),
+    'lock-player-buzzer': ('set_player_buzzer_locked', {'player_id': integer(1), 'locked': boolean}),
+    'lock-all-buzzers': ('set_buzzers_locked', {'locked': boolean}),
+    'rate-answer': ('rate_answer', {'value': choice('true', 'false', 'skip'), 'player_id': integer(1)}),
+    'exit-question': ('exit_question', {}),
+    'timer-update': ('handle_timer_update', {'count': integer(0, TIMER_MAX_COUNT)}),
+    'scoreboard-page': ('change_scoreboard_page', {'page': integer(0)}),
+    'score-guesses': ('score_guesses', {}),
+    'reveal-image-step': ('reveal_image_step', {'step': integer(1)}),
+}, login_attribute='game_id', before_login=('login', 'clock-pong'))
+
+TOURNAMENT_MESSAGES = MessageTable({
+    'login': ('login', {'gameCode': text(KEY_MAX_LENGTH)}),
+})
+#endregion
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-19 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0012_remove_currentview_timer_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamequestion',
+            name='question_type',
+            field=models.CharField(default='Text', max_length=20),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.15 on 2026-10-19 17:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0013_gamequestion_question_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='currentview',
+            name='image_step',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='QuestionImageFrame',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('step', models.IntegerField()),
+                ('file_name', models.CharField(max_length=100)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_frames', to='game.gamequestion')),
+            ],
+            options={
+                'ordering': ['step'],
+            },
+        ),
+    ]
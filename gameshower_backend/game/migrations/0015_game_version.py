@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-19 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0014_currentview_image_step_questionimageframe'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
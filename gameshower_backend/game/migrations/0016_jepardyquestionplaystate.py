@@ -0,0 +1,51 @@
+# Generated by Django 5.1.15 on 2026-10-19 18:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_play_state(apps, schema_editor):
+    """Moves the play state of the questions into every game using their quiz table."""
+    JepardyQuestion = apps.get_model('game', 'JepardyQuestion')
+    JepardyQuestionPlayState = apps.get_model('game', 'JepardyQuestionPlayState')
+    Game = apps.get_model('game', 'Game')
+    states = []
+    for jepardy_question in JepardyQuestion.objects.filter(models.Q(is_played=True) | models.Q(is_active=True)):
+        games = Game.objects.filter(jepardytables__columns__questions=jepardy_question).distinct()
+        states.extend(
+            JepardyQuestionPlayState(game=game, jepardy_question=jepardy_question, is_played=jepardy_question.is_played, is_active=jepardy_question.is_active)
+            for game in games
+        )
+    JepardyQuestionPlayState.objects.bulk_create(states)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0015_game_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JepardyQuestionPlayState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_played', models.BooleanField(default=False)),
+                ('is_active', models.BooleanField(default=False)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_states', to='game.game')),
+                ('jepardy_question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='play_states', to='game.jepardyquestion')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('game', 'jepardy_question'), name='unique_question_state_per_game')],
+            },
+        ),
+        migrations.RunPython(copy_play_state, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='jepardyquestion',
+            name='is_active',
+        ),
+        migrations.RemoveField(
+            model_name='jepardyquestion',
+            name='is_played',
+        ),
+    ]
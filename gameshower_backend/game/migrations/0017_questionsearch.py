@@ -0,0 +1,48 @@
+# Generated by Django 5.1.15 on 2026-10-19 19:20
+
+from django.db import migrations
+
+# External content FTS5 index over GameQuestion, the triggers keep it in sync with every write to game_gamequestion
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE game_questionsearch USING fts5(
+        question, answer, content='game_gamequestion', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER game_questionsearch_insert AFTER INSERT ON game_gamequestion BEGIN
+        INSERT INTO game_questionsearch(rowid, question, answer) VALUES (new.id, new.question, new.answer);
+    END
+    """,
+    """
+    CREATE TRIGGER game_questionsearch_delete AFTER DELETE ON game_gamequestion BEGIN
+        INSERT INTO game_questionsearch(game_questionsearch, rowid, question, answer) VALUES ('delete', old.id, old.question, old.answer);
+    END
+    """,
+    """
+    CREATE TRIGGER game_questionsearch_update AFTER UPDATE OF question, answer ON game_gamequestion BEGIN
+        INSERT INTO game_questionsearch(game_questionsearch, rowid, question, answer) VALUES ('delete', old.id, old.question, old.answer);
+        INSERT INTO game_questionsearch(rowid, question, answer) VALUES (new.id, new.question, new.answer);
+    END
+    """,
+    "INSERT INTO game_questionsearch(game_questionsearch) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    'DROP TRIGGER game_questionsearch_update',
+    'DROP TRIGGER game_questionsearch_delete',
+    'DROP TRIGGER game_questionsearch_insert',
+    'DROP TABLE game_questionsearch',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0016_jepardyquestionplaystate'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_SQL, DROP_SQL),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.15 on 2026-10-19 20:05
+
+import django.db.models.deletion
+import game.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0017_questionsearch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tournament',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('display_key', models.CharField(default=game.models.generate_private_key, max_length=100, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='tournament',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='games', to='game.tournament'),
+        ),
+        migrations.CreateModel(
+            name='TournamentEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('score', models.IntegerField(default=0)),
+                ('tournament', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='game.tournament')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='gameparticipant',
+            name='tournament_entry',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='participants', to='game.tournamententry'),
+        ),
+        migrations.AddConstraint(
+            model_name='tournamententry',
+            constraint=models.UniqueConstraint(fields=('tournament', 'name'), name='unique_entry_name_per_tournament'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.15 on 2026-10-19 21:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_open_question(apps, schema_editor):
+    """Sets the open jepardy question of every view showing a question, from the active play state of its game."""
+    Game = apps.get_model('game', 'Game')
+    JepardyQuestionPlayState = apps.get_model('game', 'JepardyQuestionPlayState')
+    for game in Game.objects.filter(current_view__question_id__isnull=False).select_related('current_view'):
+        state = JepardyQuestionPlayState.objects.filter(
+            game=game, is_active=True, jepardy_question__question=game.current_view.question_id_id,
+        ).first()
+        if state is not None:
+            game.current_view.jepardy_question_id = state.jepardy_question_id
+            game.current_view.save(update_fields=['jepardy_question'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0018_tournament'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='currentview',
+            name='jepardy_question',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='game.jepardyquestion'),
+        ),
+        migrations.RunPython(copy_open_question, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.15 on 2026-10-19 22:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0019_currentview_jepardy_question'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.15 on 2026-10-19 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0020_quizrevision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jepardytable',
+            name='revision',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.DeleteModel(
+            name='QuizRevision',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-19 23:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0021_jepardytable_revision_delete_quizrevision'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='gamequestion',
+            name='question_type',
+            field=models.CharField(choices=[('Text', 'Text'), ('Input', 'Input'), ('Map', 'Map'), ('Image', 'Image'), ('ImageBlur', 'ImageBlur'), ('ImageScale', 'ImageScale')], default='Text', max_length=20),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from typing import Literal
+from typing import Literal, get_args
 from django.db import models
 import string
 import random
@@ -6,31 +6,61 @@ import random
 def generate_private_key():
     return ''.join(random.choices(string.ascii_letters + string.digits, k=100))
 
+AVAILABLE_QUESTION_TYPES = Literal['Text', 'Input', 'Map', 'Image', 'ImageBlur', 'ImageScale']
+QUESTION_TYPES = get_args(AVAILABLE_QUESTION_TYPES)
+
 class GameQuestion(models.Model):
     question = models.CharField(max_length=100)
     answer = models.CharField(max_length=100)
+    question_type = models.CharField(max_length=20, default='Text', choices=[(question_type, question_type) for question_type in QUESTION_TYPES])
+
+class QuestionImageFrame(models.Model):
+    question = models.ForeignKey(GameQuestion, on_delete=models.CASCADE, related_name='image_frames')
+    step = models.IntegerField()
+    file_name = models.CharField(max_length=100)
+
+    class Meta:
+        ordering = ['step']
 
 class JepardyQuestion(models.Model):
     question = models.ForeignKey(GameQuestion, on_delete=models.CASCADE)
     points = models.IntegerField()
-    is_played = models.BooleanField(default=False)
-    is_active = models.BooleanField(default=False)
 
 class JepardyColumn(models.Model):
     name = models.CharField(max_length=100)
     questions = models.ManyToManyField(JepardyQuestion, related_name='columns')
 
+# revision counts the edits of the table, its columns and questions. Every worker process compares it with the revision
+# its cached layout and question indexes of the table were loaded at, so an edit handled by one process reaches all of them
 class JepardyTable(models.Model):
     name = models.CharField(max_length=100)
     columns = models.ManyToManyField(JepardyColumn)
+    revision = models.IntegerField(default=0)
+
+class Tournament(models.Model):
+    name = models.CharField(max_length=100)
+    display_key = models.CharField(max_length=100, default=generate_private_key, unique=True)
+
+# The overall standing of one player or team across the games of a tournament, kept up to date with every score change
+class TournamentEntry(models.Model):
+    tournament = models.ForeignKey(Tournament, on_delete=models.CASCADE, related_name='entries')
+    name = models.CharField(max_length=100)
+    score = models.IntegerField(default=0)
 
-AVAILABLE_VIEW_PAGES = Literal['JepardyTable', 'TextQuestion']
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tournament', 'name'], name='unique_entry_name_per_tournament'),
+        ]
+
+AVAILABLE_VIEW_PAGES = Literal['JepardyTable', 'TextQuestion', 'InputQuestion']
 
 class CurrentView(models.Model):
     page = models.CharField(max_length=100)
     question_visible = models.BooleanField(default=False)
     answer_visible = models.BooleanField(default=False)
+    image_step = models.IntegerField(default=0)
     question_id = models.ForeignKey(GameQuestion, on_delete=models.CASCADE, null=True, blank=True)
+    jepardy_question = models.ForeignKey(JepardyQuestion, on_delete=models.SET_NULL, null=True, blank=True) # The open question, question_id may be on several tables
     jepardy_table = models.ForeignKey(JepardyTable, on_delete=models.CASCADE, null=True, blank=True)
 
 class Game(models.Model):
@@ -41,6 +71,8 @@ class Game(models.Model):
     spectator_key = models.CharField(max_length=100, default=generate_private_key, null=True) # TODO: Should be unique
     buzzers_locked = models.BooleanField(default=True)
     buzz_player_id = models.IntegerField(null=True, blank=True)
+    version = models.PositiveBigIntegerField(default=0) # Bumped with every game event, see versioning.py
+    tournament = models.ForeignKey(Tournament, on_delete=models.SET_NULL, null=True, blank=True, related_name='games')
 
 
 class GameParticipant(models.Model):
@@ -49,6 +81,7 @@ class GameParticipant(models.Model):
     round_lock = models.BooleanField(default=False)
     private_key = models.CharField(max_length=100, default=generate_private_key, unique=True)
     game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='participants')
+    tournament_entry = models.ForeignKey(TournamentEntry, on_delete=models.SET_NULL, null=True, blank=True, related_name='participants')
 
     def to_json(self):
         return {
@@ -56,4 +89,17 @@ class GameParticipant(models.Model):
             'name': self.name,
             'score': self.score,
             'round_lock': self.round_lock
-        }
\ No newline at end of file
+        }
+
+
+# Quiz tables are shared between games and never changed by playing them, the play state of a question lives here
+class JepardyQuestionPlayState(models.Model):
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='question_states')
+    jepardy_question = models.ForeignKey(JepardyQuestion, on_delete=models.CASCADE, related_name='play_states')
+    is_played = models.BooleanField(default=False)
+    is_active = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['game', 'jepardy_question'], name='unique_question_state_per_game'),
+        ]
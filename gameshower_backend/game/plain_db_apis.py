@@ -1,13 +1,24 @@
+from channels.db import database_sync_to_async
 from django.http import JsonResponse
-from game.models import GameQuestion, JepardyQuestion, JepardyColumn, JepardyTable, Game, GameParticipant
+from game.models import GameQuestion, JepardyQuestion, JepardyColumn, JepardyTable, Game, QUESTION_TYPES
 import json
+import logging
 from dataclasses import dataclass
+from django.db import transaction
+from game.map_scoring import parse_coordinates
+from game.media import IMAGE_QUESTION_TYPES, create_image_frames
+from game.messages import integer
+from game.provisioning import add_participants
+
+logger = logging.getLogger(__name__)
 
 @dataclass
 class QuestionDTO:
   question: str
   answer: str
   points: int
+  question_type: str = 'Text'
+  image: str | None = None
 
 @dataclass
 class TableColumnDTO:
@@ -32,16 +43,22 @@ class ParticipantDTO:
 class GameCreatedDTO:
   game_id: int
 
-def create_game_api(request):
+async def create_game_api(request):
   try:
-    game_created_dto = create_game_from_json(request.body.decode('utf-8'))
+    game_dto, participants = parse_game_json(request.body.decode('utf-8'))
   except ValueError as e:
     return JsonResponse({'error': str(e)}, status=400)
+  # The async ORM has no transactions, so the import runs as one atomic block in a worker thread of its own
+  game_created_dto = await database_sync_to_async(create_full_game, thread_sensitive=False)(game_dto, participants)
   return JsonResponse({'game_id': game_created_dto.game_id})
 
 def create_game_from_json(json_str: str):
+  return create_full_game(*parse_game_json(json_str))
+
+def parse_game_json(json_str: str) -> tuple[GameDTO, list[ParticipantDTO]]:
+  """Parses and validates a game import without touching the database."""
   data = json.loads(json_str)
-  print(data)
+  logger.debug('Importing game: %s', data)
   try:           
     game_dto = GameDTO(
       name=data['name'],
@@ -55,7 +72,9 @@ def create_game_from_json(json_str: str):
                           QuestionDTO(
                               question=question['question'],
                               answer=question['answer'],
-                              points=question['points']
+                              points=question['points'],
+                              question_type=question.get('type', 'Text'),
+                              image=question.get('image')
                           ) for question in column['questions']
                       ]
                   ) for column in table['columns']
@@ -78,7 +97,9 @@ def create_game_from_json(json_str: str):
                             QuestionDTO(
                                 question=question['question'],
                                 answer=question['answer'],
-                                points=question['points']
+                                points=question['points'],
+                                question_type=question.get('type', 'Text'),
+                                image=question.get('image')
                             ) for question in [column['questions'][key] for key in column['questions'].keys()]
                         ]
                     ) for column in [table['columns'][key] for key in table['columns'].keys()]
@@ -89,9 +110,25 @@ def create_game_from_json(json_str: str):
       participants = [ParticipantDTO(name=participant['name']) for participant in [data['participants'][key] for key in data['participants'].keys()]]
     except Exception as e:
       raise ValueError(f"Invalid JSON format: {e}")
-    
-  return create_full_game(game_dto, participants)
 
+  for table in game_dto.tables:
+    for column in table.columns:
+      for question in column.questions:
+        # The import form sends points as text, booleans are no points even though they are ints
+        try:
+          question.points = integer()(question.points)
+        except ValueError as e:
+          raise ValueError(f"Question '{question.question}': points {e}")
+        if question.question_type not in QUESTION_TYPES:
+          raise ValueError(f"Question '{question.question}' has the unknown type {question.question_type!r}, use one of {', '.join(QUESTION_TYPES)}")
+        if question.question_type == 'Map' and parse_coordinates(question.answer) is None:
+          raise ValueError(f"Map question '{question.question}' needs 'lat, lon' as answer")
+        if question.question_type in IMAGE_QUESTION_TYPES and not question.image:
+          raise ValueError(f"Image question '{question.question}' needs a base64 encoded image")
+
+  return game_dto, participants
+
+@transaction.atomic
 def create_full_game(game: GameDTO, participants: list[ParticipantDTO]):
   game_model = Game.objects.create(name=game.name)
   for table in game.tables:
@@ -99,7 +136,9 @@ def create_full_game(game: GameDTO, participants: list[ParticipantDTO]):
     for column in table.columns:
       column_model = JepardyColumn.objects.create(name=column.name)
       for question in column.questions:
-        question_model = GameQuestion.objects.create(question=question.question, answer=question.answer)
+        question_model = GameQuestion.objects.create(question=question.question, answer=question.answer, question_type=question.question_type)
+        if question.question_type in IMAGE_QUESTION_TYPES:
+          create_image_frames(question_model, question.image)
         jepardy_question = JepardyQuestion.objects.create(question=question_model, points=question.points)
         column_model.questions.add(jepardy_question)
       column_model.save()
@@ -107,7 +146,5 @@ def create_full_game(game: GameDTO, participants: list[ParticipantDTO]):
     table_model.save()
     game_model.jepardytables.add(table_model)
   game_model.save()
-  for participant in participants:
-    participant_model = GameParticipant.objects.create(name=participant.name, game=game_model)
-    participant_model.save()
+  add_participants(game_model.id, (participant.name for participant in participants))
   return GameCreatedDTO(game_id=game_model.id)
\ No newline at end of file
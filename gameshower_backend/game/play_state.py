@@ -0,0 +1,230 @@
+import threading
+import time
+from typing import NamedTuple
+from django.db.models import F, Q
+from django.db.models.signals import m2m_changed, post_save, pre_delete
+from django.dispatch import receiver
+from .models import Game, GameQuestion, JepardyColumn, JepardyQuestion, JepardyQuestionPlayState, JepardyTable
+from .settings import QUIZ_REVISION_CHECK_INTERVAL
+
+TABLE_LAYOUT_CACHE_SIZE = 256
+"""Most quiz table layouts a process keeps, the oldest one is dropped first."""
+
+
+class IndexedQuestion(NamedTuple):
+    id: int
+    """The id of the jepardy question, the question on a quiz table."""
+    question_id: int
+    """The id of the game question, shared by every table using the question."""
+    question: str
+    answer: str
+    question_type: str
+    points: int
+
+
+_table_layouts: dict[int, tuple[int, dict]] = {}
+"""The cached layouts by quiz table id, with the table revision they were loaded at."""
+_question_indexes: dict[int, tuple[dict[int, int], dict[int, IndexedQuestion]]] = {}
+"""The cached question indexes by game id, with the revisions of the game's tables they were loaded at."""
+_cache_lock = threading.Lock()
+_cache_generation = 0
+_next_revision_check = 0.0
+
+
+#region quiz table revisions
+def tables_of(model, ids) -> Q:
+    """Filters the quiz tables holding any of the given tables, columns, quiz table questions or game questions."""
+    if model is JepardyTable:
+        return Q(id__in=ids)
+    if model is JepardyColumn:
+        return Q(columns__in=ids)
+    if model is JepardyQuestion:
+        return Q(columns__questions__in=ids)
+    return Q(columns__questions__question__in=ids)
+
+
+def bump_table_revisions(tables: Q):
+    """Counts an edit of the given quiz tables, in the transaction of the edit, and drops what this process cached of them."""
+    table_ids = set(JepardyTable.objects.filter(tables).values_list('id', flat=True))
+    if table_ids:
+        JepardyTable.objects.filter(id__in=table_ids).update(revision=F('revision') + 1)
+        discard_cached_tables(table_ids)
+
+
+def check_table_revisions():
+    """
+    Drops the cached layouts and question indexes of the quiz tables edited in any process since they were loaded.
+    The revisions are only read every QUIZ_REVISION_CHECK_INTERVAL seconds, with one query for all cached tables.
+    """
+    global _next_revision_check
+    now = time.monotonic()
+    if now < _next_revision_check:
+        return
+    _next_revision_check = now + QUIZ_REVISION_CHECK_INTERVAL
+    with _cache_lock:
+        loaded = [(table_id, revision) for table_id, (revision, _) in _table_layouts.items()]
+        loaded += [item for revisions, _ in _question_indexes.values() for item in revisions.items()]
+    if not loaded:
+        return
+    revisions = dict(JepardyTable.objects.filter(id__in={table_id for table_id, _ in loaded}).values_list('id', 'revision'))
+    changed = {table_id for table_id, revision in loaded if revisions.get(table_id) != revision}
+    if changed:
+        discard_cached_tables(changed)
+
+
+def discard_cached_tables(table_ids: set[int]):
+    """Drops the cached layouts of the given quiz tables and the question indexes of the games playing them."""
+    global _cache_generation
+    with _cache_lock:
+        _cache_generation += 1
+        for table_id in table_ids:
+            _table_layouts.pop(table_id, None)
+        for game_id in [game_id for game_id, (revisions, _) in _question_indexes.items() if not table_ids.isdisjoint(revisions)]:
+            del _question_indexes[game_id]
+
+
+@receiver(post_save, sender=JepardyTable)
+@receiver(post_save, sender=JepardyColumn)
+@receiver(post_save, sender=JepardyQuestion)
+@receiver(post_save, sender=GameQuestion)
+def bump_saved_tables(sender, instance, created, **kwargs):
+    """Counts the edit of a table, column or question. A new one is on no table yet, a reused table id only needs to be dropped here."""
+    if not created:
+        bump_table_revisions(tables_of(sender, [instance.pk]))
+    elif sender is JepardyTable:
+        discard_cached_tables({instance.pk})
+
+
+@receiver(pre_delete, sender=JepardyQuestion)
+@receiver(pre_delete, sender=GameQuestion)
+def bump_deleting_tables(sender, instance, **kwargs):
+    """Counts the removal of a question, before the delete takes it off its tables."""
+    bump_table_revisions(tables_of(sender, [instance.pk]))
+
+
+@receiver(m2m_changed, sender=JepardyTable.columns.through)
+@receiver(m2m_changed, sender=JepardyColumn.questions.through)
+def bump_linked_tables(sender, instance, action, model, pk_set, **kwargs):
+    """Counts adding or removing columns of a table or questions of a column."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    tables = tables_of(type(instance), [instance.pk])
+    if pk_set:
+        tables |= tables_of(model, pk_set)
+    bump_table_revisions(tables)
+#endregion
+
+
+#region table layout
+def get_table_layout(table_id: int) -> dict:
+    """
+    The immutable layout of a quiz table: its name and per column the question ids and points.
+    Loaded with one query per level and shared by all games playing the table.
+    """
+    cached = _table_layouts.get(table_id)
+    if cached is not None:
+        return cached[1]
+    generation = _cache_generation
+    table = JepardyTable.objects.get(id=table_id)
+    columns = list(table.columns.prefetch_related('questions'))
+    layout = {
+        'id': table.id,
+        'name': table.name,
+        'columns': [
+            {
+                'name': column.name,
+                'questions': [{'id': question.id, 'points': question.points} for question in column.questions.all()],
+            }
+            for column in columns
+        ],
+    }
+    with _cache_lock:
+        # A layout loaded while the table was edited is used once but not kept
+        if generation == _cache_generation:
+            if len(_table_layouts) >= TABLE_LAYOUT_CACHE_SIZE:
+                del _table_layouts[next(iter(_table_layouts))]
+            _table_layouts[table_id] = (table.revision, layout)
+    return layout
+#endregion
+
+
+#region question index
+def get_question_index(game_id: int) -> dict[int, IndexedQuestion]:
+    """
+    Every question on the quiz tables of a game by jepardy question id, loaded with one query on first use.
+    The moderator loads it at login, so opening, rating and leaving a question only look it up.
+    """
+    check_table_revisions()
+    cached = _question_indexes.get(game_id)
+    if cached is not None:
+        return cached[1]
+    generation = _cache_generation
+    rows = JepardyTable.objects.filter(game=game_id).values_list(
+        'id', 'revision', 'columns__questions', 'columns__questions__question', 'columns__questions__question__question',
+        'columns__questions__question__answer', 'columns__questions__question__question_type', 'columns__questions__points',
+    )
+    revisions, index = {}, {}
+    for table_id, revision, *question in rows:
+        revisions[table_id] = revision
+        if question[0] is not None:
+            index[question[0]] = IndexedQuestion(*question)
+    with _cache_lock:
+        if generation != _cache_generation:
+            return index
+        return _question_indexes.setdefault(game_id, (revisions, index))[1]
+
+
+def discard_question_index(game_id: int):
+    """Drops the cached question index of a game."""
+    global _cache_generation
+    with _cache_lock:
+        _cache_generation += 1
+        _question_indexes.pop(game_id, None)
+
+
+@receiver(post_save, sender=Game)
+def discard_new_game_index(sender, instance, created, **kwargs):
+    """A new game may reuse the id of a deleted one."""
+    if created:
+        discard_question_index(instance.pk)
+
+
+@receiver(m2m_changed, sender=Game.jepardytables.through)
+def discard_changed_game_index(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Drops the question index of a game whose quiz tables change. The tables of a game are set when it is created,
+    before any process loads its index, so this is not counted in a revision.
+    """
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        discard_question_index(instance.pk)
+        return
+    for game_id in pk_set or list(_question_indexes):
+        discard_question_index(game_id)
+#endregion
+
+
+def get_play_state(game_id: int) -> tuple[set[int], set[int]]:
+    """The ids of the played and of the active jepardy questions of a game."""
+    played, active = set(), set()
+    for jepardy_question_id, is_played, is_active in JepardyQuestionPlayState.objects.filter(game_id=game_id).values_list('jepardy_question_id', 'is_played', 'is_active'):
+        if is_played:
+            played.add(jepardy_question_id)
+        if is_active:
+            active.add(jepardy_question_id)
+    return played, active
+
+
+def set_play_state(game_id: int, jepardy_question_id: int, **state):
+    """Sets is_played and/or is_active of a question within a game, creating the state row on first use."""
+    JepardyQuestionPlayState.objects.update_or_create(game_id=game_id, jepardy_question_id=jepardy_question_id, defaults=state)
+
+
+def table_context(table_id: int | None, game_id: int) -> dict:
+    """The context of game/quiztable_partial.html for a game."""
+    if table_id is None:
+        return {'table': None}
+    check_table_revisions()
+    played, active = get_play_state(game_id)
+    return {'table': get_table_layout(table_id), 'played': played, 'active': active}
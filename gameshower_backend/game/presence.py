@@ -0,0 +1,42 @@
+import threading
+
+_connections: dict[int, dict[str, int | None]] = {}
+"""Per game the channel names of all connections in the game group and their participant id, None for moderators."""
+_lock = threading.Lock()
+
+
+def join_game(game_id: int, channel_name: str, participant_id: int | None):
+    """Records a connection entering the game group."""
+    with _lock:
+        _connections.setdefault(game_id, {})[channel_name] = participant_id
+
+
+def leave_game(game_id: int, channel_name: str) -> bool:
+    """Records a connection leaving the game group. Returns whether it was the last connection of the game."""
+    with _lock:
+        connections = _connections.get(game_id)
+        if connections is None:
+            return True
+        connections.pop(channel_name, None)
+        if not connections:
+            del _connections[game_id]
+            return True
+        return False
+
+
+def get_presence(game_id: int) -> dict:
+    """Live connection counts of a game: online players, player connections and moderator connections."""
+    with _lock:
+        participant_ids = list(_connections.get(game_id, {}).values())
+    players = [participant_id for participant_id in participant_ids if participant_id is not None]
+    return {
+        'players_online': len(set(players)),
+        'player_connections': len(players),
+        'moderator_connections': len(participant_ids) - len(players),
+    }
+
+
+def get_live_game_ids() -> list[int]:
+    """The ids of all games with connections in this process."""
+    with _lock:
+        return list(_connections)
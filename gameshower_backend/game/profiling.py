@@ -0,0 +1,137 @@
+import cProfile
+import itertools
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import connection
+from .settings import PROFILE_CONFIG_CHECK_INTERVAL
+
+CONFIG_FILE_NAME = 'profiling.json'
+"""Switch file in PROFILE_ROOT. Profiling is on while it exists and its 'until' lies in the future."""
+
+_config: dict | None = None
+_config_mtime: float | None = None
+_next_check = 0.0
+_profile_numbers = itertools.count(1)
+
+logger = logging.getLogger(__name__)
+
+
+def config_path() -> str:
+    return os.path.join(settings.PROFILE_ROOT, CONFIG_FILE_NAME)
+
+
+def write_config(types: list[str], game_ids: list[int], until: float):
+    """Switches profiling on for the given message types and games, all if empty, until the given unix time."""
+    os.makedirs(settings.PROFILE_ROOT, exist_ok=True)
+    temporary_path = config_path() + '.tmp'
+    with open(temporary_path, 'w') as f:
+        json.dump({'types': types, 'games': game_ids, 'until': until}, f)
+    os.replace(temporary_path, config_path())
+
+
+def remove_config():
+    """Switches profiling off."""
+    try:
+        os.remove(config_path())
+    except FileNotFoundError:
+        pass
+
+
+def read_config() -> dict | None:
+    """The current profiling switch, None if profiling is off."""
+    try:
+        with open(config_path()) as f:
+            config = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if config.get('until', 0) < time.time():
+        return None
+    return config
+
+
+def get_config() -> dict | None:
+    """
+    The profiling switch as seen by this process. The switch file is only checked every
+    PROFILE_CONFIG_CHECK_INTERVAL seconds, so a message costs one clock read while profiling is off.
+    """
+    global _config, _config_mtime, _next_check
+    now = time.monotonic()
+    if now < _next_check:
+        return _config
+    _next_check = now + PROFILE_CONFIG_CHECK_INTERVAL
+    try:
+        mtime = os.stat(config_path()).st_mtime
+    except OSError:
+        _config = _config_mtime = None
+        return None
+    if mtime != _config_mtime:
+        _config_mtime = mtime
+        _config = read_config()
+    if _config is not None and _config['until'] < time.time():
+        _config = None
+    return _config
+
+
+def should_profile(config: dict, message_type: str | None, game_id: int | None) -> bool:
+    """Whether a message matches the type and game filters of the profiling switch."""
+    if config['types'] and message_type not in config['types']:
+        return False
+    if config['games'] and game_id not in config['games']:
+        return False
+    return True
+
+
+@contextmanager
+def profile_message(text_data: str | None, game_id: int | None):
+    """
+    Profiles the handling of a client message with cProfile and records its SQL queries if it matches the
+    profiling switch. Writes <name>.prof, loadable with pstats or snakeviz, and <name>.sql to PROFILE_ROOT.
+    """
+    config = get_config()
+    if config is None:
+        yield
+        return
+    try:
+        message_type = json.loads(text_data).get('type')
+    except (TypeError, ValueError, AttributeError):
+        message_type = None
+    if not should_profile(config, message_type, game_id):
+        yield
+        return
+
+    queries = []
+
+    def trace_query(execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            queries.append(((time.perf_counter() - start) * 1000, sql, params))
+
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    with connection.execute_wrapper(trace_query):
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            duration = (time.perf_counter() - start) * 1000
+            write_profile(profiler, queries, message_type, game_id, duration)
+
+
+def write_profile(profiler: cProfile.Profile, queries: list[tuple[float, str, tuple]], message_type: str | None, game_id: int | None, duration: float):
+    """Writes the profile and the SQL trace of one message."""
+    os.makedirs(settings.PROFILE_ROOT, exist_ok=True)
+    name = f'{time.strftime("%Y%m%d-%H%M%S")}-{message_type}-game{game_id}-{os.getpid()}-{next(_profile_numbers)}'
+    path = os.path.join(settings.PROFILE_ROOT, name)
+    profiler.dump_stats(path + '.prof')
+    with open(path + '.sql', 'w') as f:
+        f.write(f'-- {message_type} of game {game_id}: {duration:.2f} ms, {len(queries)} queries, {sum(query[0] for query in queries):.2f} ms in SQL\n')
+        for query_duration, sql, params in queries:
+            f.write(f'{query_duration:8.2f} ms  {sql}  {params!r}\n')
+    logger.info('Profiled %s of game %s: %.2f ms, %d queries -> %s.prof', message_type, game_id, duration, len(queries), path)
@@ -0,0 +1,104 @@
+import csv
+import json
+from itertools import islice
+from typing import AsyncIterator, Iterable, Iterator
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from .models import CurrentView, Game, GameParticipant
+from .settings import PROVISION_BATCH_SIZE, KEY_EXPORT_CHUNK_SIZE
+
+KEY_EXPORT_FIELDS = ['game_id', 'game_name', 'role', 'name', 'key']
+"""Columns of a key export row. role is 'moderator', 'spectator' or 'player'."""
+
+
+def add_participants(game_id: int, names: Iterable[str]) -> int:
+    """Inserts the participants of a game in batches of PROVISION_BATCH_SIZE. Returns the number of participants."""
+    participants = GameParticipant.objects.bulk_create(
+        (GameParticipant(name=name, game_id=game_id) for name in names),
+        batch_size=PROVISION_BATCH_SIZE,
+    )
+    return len(participants)
+
+
+@transaction.atomic
+def provision_games(game_count: int, player_count: int, name_prefix: str = 'Game', table_ids: list[int] = ()) -> list[int]:
+    """
+    Creates game_count games with player_count generated players each, all inserted in batches.
+    Every game gets its own current view and plays the given quiz tables. Returns the ids of the new games.
+    """
+    views = CurrentView.objects.bulk_create(
+        [CurrentView(page='JepardyTable') for _ in range(game_count)],
+        batch_size=PROVISION_BATCH_SIZE,
+    )
+    games = Game.objects.bulk_create(
+        [Game(name=f'{name_prefix} {number}', current_view=view) for number, view in enumerate(views, start=1)],
+        batch_size=PROVISION_BATCH_SIZE,
+    )
+    game_ids = [game.id for game in games]
+    GameParticipant.objects.bulk_create(
+        (GameParticipant(name=f'Player {number}', game_id=game_id) for game_id in game_ids for number in range(1, player_count + 1)),
+        batch_size=PROVISION_BATCH_SIZE,
+    )
+    Game.jepardytables.through.objects.bulk_create(
+        (Game.jepardytables.through(game_id=game_id, jepardytable_id=table_id) for game_id in game_ids for table_id in table_ids),
+        batch_size=PROVISION_BATCH_SIZE,
+    )
+    return game_ids
+
+
+def iter_game_keys(game_ids: list[int] | None = None) -> Iterator[dict]:
+    """
+    Yields the moderator, spectator and player keys of the given games, of all games if None, as KEY_EXPORT_FIELDS dicts.
+    Rows are streamed from the database in chunks of KEY_EXPORT_CHUNK_SIZE, so memory stays constant.
+    """
+    games = Game.objects.order_by('id')
+    participants = GameParticipant.objects.order_by('game_id', 'id')
+    if game_ids is not None:
+        games = games.filter(id__in=game_ids)
+        participants = participants.filter(game_id__in=game_ids)
+    game_rows = games.values_list('id', 'name', 'moderator_key', 'spectator_key').iterator(chunk_size=KEY_EXPORT_CHUNK_SIZE)
+    participant_rows = participants.values_list('game_id', 'name', 'private_key').iterator(chunk_size=KEY_EXPORT_CHUNK_SIZE)
+
+    # Both querysets are ordered by game id, so the players of every game are merged in right after its keys
+    participant_row = next(participant_rows, None)
+    for game_id, game_name, moderator_key, spectator_key in game_rows:
+        yield {'game_id': game_id, 'game_name': game_name, 'role': 'moderator', 'name': '', 'key': moderator_key}
+        yield {'game_id': game_id, 'game_name': game_name, 'role': 'spectator', 'name': '', 'key': spectator_key}
+        while participant_row is not None and participant_row[0] <= game_id:
+            if participant_row[0] == game_id:
+                yield {'game_id': game_id, 'game_name': game_name, 'role': 'player', 'name': participant_row[1], 'key': participant_row[2]}
+            participant_row = next(participant_rows, None)
+
+
+class _Echo:
+    """File-like object handing back what csv.writer writes, so rows can be streamed."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows: Iterable[dict]) -> Iterator[str]:
+    """Formats key export rows as CSV lines with a header."""
+    writer = csv.DictWriter(_Echo(), fieldnames=KEY_EXPORT_FIELDS)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_ndjson(rows: Iterable[dict]) -> Iterator[str]:
+    """Formats key export rows as newline delimited JSON."""
+    for row in rows:
+        yield json.dumps(row) + '\n'
+
+
+async def aiter_chunks(lines: Iterator[str], size: int = KEY_EXPORT_CHUNK_SIZE) -> AsyncIterator[str]:
+    """Hands a sync export iterator to an async streaming response, joining size lines per thread hop."""
+    while chunk := await sync_to_async(lambda: ''.join(islice(lines, size)))():
+        yield chunk
+
+
+KEY_EXPORT_FORMATS = {
+    'csv': (iter_csv, 'text/csv'),
+    'ndjson': (iter_ndjson, 'application/x-ndjson'),
+}
+"""Key export formats mapped to their row formatter and content type."""
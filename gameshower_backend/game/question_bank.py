@@ -0,0 +1,60 @@
+import re
+from django.db.models import QuerySet
+from django.db.models.expressions import RawSQL
+from .models import GameQuestion, JepardyTable
+
+SEARCH_TABLE = 'game_questionsearch'
+"""The FTS5 index over question and answer text, see migration 0017."""
+SEARCH_TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def parse_cursor(value: str | None) -> int | None:
+    """The id a page starts after, from an ?after= parameter. Raises ValueError for anything but an id."""
+    if not value:
+        return None
+    cursor = int(value)
+    if cursor < 0:
+        raise ValueError(f'Invalid cursor {value}')
+    return cursor
+
+
+def keyset_page(queryset: QuerySet, after: int | None, limit: int) -> QuerySet:
+    """
+    The rows after the cursor, ordered by id, plus one row telling whether there is a next page.
+    Unlike OFFSET every page costs the same, however deep the author has scrolled.
+    """
+    if after is not None:
+        queryset = queryset.filter(id__gt=after)
+    return queryset.order_by('id')[:limit + 1]
+
+
+def split_page(rows: list[dict], limit: int) -> tuple[list[dict], int | None]:
+    """Splits a fetched keyset page into its rows and the cursor of the next page, None on the last page."""
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1]['id']
+    return rows, None
+
+
+def search_expression(text: str) -> str | None:
+    """
+    Turns typed text into an FTS5 query: every word must appear, the last one may be a prefix of a word.
+    Words are quoted, so FTS5 operators in the text are matched literally. None if there are no words.
+    """
+    words = SEARCH_TOKEN_PATTERN.findall(text)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"' for word in words) + '*'
+
+
+def quiz_tables(after: int | None, limit: int) -> QuerySet:
+    """A keyset page of quiz table ids and names."""
+    return keyset_page(JepardyTable.objects.values('id', 'name'), after, limit)
+
+
+def questions(text: str, after: int | None, limit: int) -> QuerySet:
+    """A keyset page of the questions whose question or answer text matches, of all questions for empty text."""
+    queryset = GameQuestion.objects.values('id', 'question', 'answer', 'question_type')
+    expression = search_expression(text)
+    if expression is not None:
+        queryset = queryset.filter(id__in=RawSQL(f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', [expression]))
+    return keyset_page(queryset, after, limit)
@@ -6,4 +6,5 @@ websocket_urlpatterns = [
     path('ws/moderator/', consumers.ModeratorConsumer.as_asgi()),
     path('ws/player/', consumers.PlayerConsumer.as_asgi()),
     path('ws/admin/', consumers.AdminConsumer.as_asgi()),
+    path('ws/tournament/', consumers.TournamentConsumer.as_asgi()),
 ]
@@ -0,0 +1,46 @@
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from .models import GameParticipant, TournamentEntry
+from . import tournaments
+
+SCORE_UPDATE_CHUNK_SIZE = 500
+"""Number of participants updated per UPDATE statement, keeps SQLite below its parameter limit."""
+
+
+def add_to_scores(model, deltas: dict[int, int]):
+    """Adds the given points to the score field of the model's rows, by id, in chunked UPDATE statements."""
+    ids = list(deltas)
+    for start in range(0, len(ids), SCORE_UPDATE_CHUNK_SIZE):
+        chunk = ids[start:start + SCORE_UPDATE_CHUNK_SIZE]
+        model.objects.filter(id__in=chunk).update(score=F('score') + Case(
+            *[When(id=row_id, then=Value(deltas[row_id])) for row_id in chunk],
+            default=Value(0),
+            output_field=IntegerField(),
+        ))
+
+
+def apply_score_deltas(deltas: dict[int, int]) -> list[tuple[int, int]]:
+    """
+    Adds the given points to the participants' scores in one transaction, and to the tournament
+    standings of participants playing in a tournament. Returns the new (participant_id, score) pairs.
+    """
+    deltas = {participant_id: delta for participant_id, delta in deltas.items() if delta}
+    if not deltas:
+        return []
+    participant_ids = list(deltas)
+    with transaction.atomic():
+        add_to_scores(GameParticipant, deltas)
+        scores = []
+        entry_deltas: dict[int, int] = {}
+        for start in range(0, len(participant_ids), SCORE_UPDATE_CHUNK_SIZE):
+            chunk = participant_ids[start:start + SCORE_UPDATE_CHUNK_SIZE]
+            for participant_id, score, entry_id in GameParticipant.objects.filter(id__in=chunk).values_list('id', 'score', 'tournament_entry_id'):
+                scores.append((participant_id, score))
+                if entry_id is not None:
+                    entry_deltas[entry_id] = entry_deltas.get(entry_id, 0) + deltas[participant_id]
+        if entry_deltas:
+            # The standings follow the score change incrementally, the participants of the tournament are never summed up
+            add_to_scores(TournamentEntry, entry_deltas)
+            standings = list(TournamentEntry.objects.filter(id__in=entry_deltas).values_list('tournament_id', 'id', 'name', 'score'))
+            transaction.on_commit(lambda: tournaments.publish_standings(standings))
+    return scores
@@ -1 +1,73 @@
-JEPARDY_LOOSE_FACTOR = 0.5
\ No newline at end of file
+JEPARDY_LOOSE_FACTOR = 0.5
+PUSHED_FRAGMENT_BYTE_BUDGET = 8 * 1024
+"""Maximum size in bytes of a single HTML fragment pushed over a websocket."""
+LEADERBOARD_PAGE_SIZE = 10
+"""Number of participants shown per scoreboard page."""
+GUESS_PUBLISH_INTERVAL = 0.5
+"""Minimum seconds between two live guess statistic pushes to the moderator."""
+GUESS_HISTOGRAM_SIZE = 10
+"""Number of histogram bars shown to the moderator."""
+GUESS_MAX_LENGTH = 100
+"""Maximum length of a submitted guess."""
+GUESS_CLOSEST_COUNT = 5
+"""Number of closest numeric guesses shown to the moderator."""
+MAP_SCORING = 'decay'
+"""How map guesses are scored: 'decay' by distance or 'rank' by placement."""
+MAP_DECAY_HALF_DISTANCE_KM = 500
+"""Distance in km at which a map guess gets half of the points when MAP_SCORING is 'decay'."""
+IMAGE_MAX_SIZE = 1280
+"""Longest edge in pixels of generated question image frames."""
+IMAGE_BLUR_RADII = [48, 24, 12, 6, 0]
+"""Gaussian blur radius of every reveal step of an ImageBlur question."""
+IMAGE_ZOOM_FRACTIONS = [0.1, 0.2, 0.4, 0.7, 1.0]
+"""Visible fraction of the image around its center for every reveal step of an ImageScale question."""
+IMAGE_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+"""Seconds clients may cache a question image frame. Frames are content-hashed and never change."""
+IMAGE_STREAM_CHUNK_SIZE = 64 * 1024
+"""Bytes of a question image frame read from disk at a time while it is streamed to a client."""
+WORKER_RING_REPLICAS = 100
+"""Points every worker process gets on the consistent hash ring that routes games to workers."""
+CLOCK_SAMPLE_COUNT = 8
+"""Number of recent ping samples a player's clock offset is estimated from."""
+CLOCK_PING_BURST = 5
+"""Number of pings sent right after login to get a first clock offset estimate."""
+BUZZ_ARBITRATION_WINDOW = 0.005
+"""Seconds after the first buzz arrives in which an earlier pressed buzz can still win."""
+BUZZ_MAX_COMPENSATION_MS = 250
+"""Maximum milliseconds a buzz may be dated back from its arrival by the clock offset compensation."""
+HEARTBEAT_INTERVAL = 15
+"""Seconds between two heartbeat pings of a connection. Every ping also refreshes the clock offset estimate."""
+HEARTBEAT_TIMEOUT = 45
+"""Seconds without any message from a client after which its connection is reaped from the game group."""
+WARMUP_GAME_LIMIT = 100
+"""Number of latest games whose state is preloaded when a worker starts."""
+PROVISION_BATCH_SIZE = 500
+"""Rows per INSERT statement when games and players are provisioned in bulk."""
+KEY_EXPORT_CHUNK_SIZE = 2000
+"""Rows fetched from the database at a time while streaming a key export."""
+PROFILE_CONFIG_CHECK_INTERVAL = 2
+"""Seconds between two checks of the profiling switch file, see profiling.py."""
+PROFILE_DEFAULT_MINUTES = 10
+"""Minutes profiling stays switched on unless a duration is given."""
+DRAIN_GRACE_SECONDS = 0.1
+"""Seconds a draining worker waits for running buzz arbitrations before it snapshots its games."""
+DRAIN_CLOSE_CODE = 1012
+"""Websocket close code sent to clients of a draining worker (service restart), htmx reconnects on it."""
+SNAPSHOT_CHECK_INTERVAL = 1
+"""Seconds between two looks for new game state snapshots of drained workers."""
+SNAPSHOT_MAX_AGE = 10 * 60
+"""Seconds after which a game state snapshot is considered outdated, it is deleted without being restored."""
+SHELL_CACHE_CONTROL = 'no-cache'
+"""Cache-Control of the cached page shells: browsers keep them but revalidate with ETag / Last-Modified every time."""
+QUIZ_TABLE_PAGE_SIZE = 50
+"""Quiz tables listed per page in the creation pickers."""
+QUESTION_PAGE_SIZE = 25
+"""Questions listed per page of the question bank search."""
+TOURNAMENT_PUSH_INTERVAL = 1
+"""Minimum seconds between two standings pushes to a tournament display."""
+TOURNAMENT_STANDINGS_SIZE = 20
+"""Number of best entries shown on a tournament display."""
+MESSAGE_MAX_BYTES = 64 * 1024
+"""Largest websocket frame accepted from a client, larger frames are dropped before they are parsed."""
+QUIZ_REVISION_CHECK_INTERVAL = 1
+"""Seconds between two checks of the revisions of the cached quiz tables, see play_state.py."""
@@ -0,0 +1,63 @@
+import hashlib
+import json
+import os
+import time
+from typing import NamedTuple
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from .settings import SHELL_CACHE_CONTROL
+
+
+class Shell(NamedTuple):
+    content: str
+    etag: str
+    last_modified: float
+
+
+_shells: dict[tuple[str, str], Shell] = {}
+_catalog: tuple[float, list] | None = None
+CATALOG_PATH = os.path.join(os.path.dirname(__file__), 'quiztables.json')
+
+
+#region shells
+def get_shell(template_name: str, context: dict | None = None) -> Shell:
+    """
+    Renders a page that is the same for every visitor once per process. Must not be used for
+    templates depending on the request, e.g. with a csrf token. Rendered anew on every call with DEBUG on.
+    """
+    key = (template_name, json.dumps(context, sort_keys=True))
+    shell = _shells.get(key)
+    if shell is None or settings.DEBUG:
+        content = render_to_string(template_name, context)
+        shell = Shell(content, f'"{hashlib.sha256(content.encode()).hexdigest()[:32]}"', time.time())
+        _shells[key] = shell
+    return shell
+
+
+def shell_response(request: HttpRequest, template_name: str, context: dict | None = None) -> HttpResponse:
+    """Serves a cached shell, or 304 Not Modified if the client's copy is still current."""
+    shell = get_shell(template_name, context)
+    last_modified = int(shell.last_modified)
+    response = get_conditional_response(request, etag=shell.etag, last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(shell.content)
+    response.headers['ETag'] = shell.etag
+    response.headers['Last-Modified'] = http_date(last_modified)
+    response.headers['Cache-Control'] = SHELL_CACHE_CONTROL
+    return response
+#endregion
+
+
+#region catalog
+def get_quiztables() -> list:
+    """The quiz table catalog from quiztables.json, parsed again only after the file changed."""
+    global _catalog
+    mtime = os.stat(CATALOG_PATH).st_mtime
+    if _catalog is None or _catalog[0] != mtime:
+        with open(CATALOG_PATH) as f:
+            _catalog = (mtime, json.load(f))
+    return _catalog[1]
+#endregion
@@ -1,3 +1,1482 @@
-from django.test import TestCase
+import asyncio
+import base64
+import bisect
+import csv
+import io
+import json
+import math
+import multiprocessing
+import os
+import pstats
+import random
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import tomllib
+from dataclasses import dataclass
+from unittest import mock
+from asgiref.sync import SyncToAsync, sync_to_async
+from channels.exceptions import ChannelFull
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.signals import template_rendered
+from django.urls import reverse
+import numpy as np
+from PIL import Image
+from . import affinity, handoff, leaderboard, play_state, presence, profiling, shells
+from .affinity import HashRing
+from .authoring import apply_patch
+from .buzzing import BuzzArbiter, discard_buzz_arbiter, get_buzz_arbiter
+from .channel_layers import MAX_PACKET_BYTES, PacketTooLarge, UnixSocketChannelLayer
+from .clock import ClockEstimator, server_time
+from .consumers import AdminConsumer, ModeratorConsumer, PlayerConsumer, switch_to_question_view
+from .guessing import GuessAggregator, discard_guessing, start_guessing
+from .handoff import restore_snapshots, snapshot_path
+from .leaderboard import Leaderboard, RankedKeys
+from .live_state import discard_live_state, get_live_state
+from .management.commands.bench_channel_layer import GROUP, run_worker
+from .models import CurrentView, Game, GameParticipant, GameQuestion, JepardyColumn, JepardyQuestion, JepardyTable, Tournament, TournamentEntry
+from .plain_db_apis import create_game_from_json
+from .play_state import get_question_index
+from .presence import get_presence
+from .map_scoring import EARTH_RADIUS_KM, MapGuessAggregator, decay_points, great_circle_distances, score_map_guesses
+from .media import frame_path, store_frame
+from .messages import MODERATOR_MESSAGES, PLAYER_MESSAGES, MessageError
+from .question_bank import questions, split_page
+from .scoring import apply_score_deltas
+from .settings import BUZZ_MAX_COMPENSATION_MS, GUESS_PUBLISH_INTERVAL, HEARTBEAT_TIMEOUT, MESSAGE_MAX_BYTES, QUIZ_REVISION_CHECK_INTERVAL, SNAPSHOT_MAX_AGE
+from .timers import get_timer_count, set_timer_count
+from .tournaments import add_games
+from .versioning import bump_game_version
+from .warmup import TEMPLATE_DIRECTORY, compile_templates, open_connections, preload_games
 
-# Create your tests here.
+GROUP_SIZES = (1, 4, 8)
+"""Numbers of logged in players every action is measured with."""
+QUIET_SECONDS = 0.15
+"""A game counts as settled once none of its connections received anything for this long."""
+LATENCY_BUDGET_MS = 1000
+"""Default time from sending an action until the last connection got its update. Generous, it only catches hangs and sleeps."""
+
+
+@dataclass
+class Budget:
+    """
+    Maximum SQL queries and template renders of an action: a fixed part plus a part per logged in player.
+    Every client renders its own HTML, but the state it shows is read once per game, so queries_per_player is 0.
+    """
+    queries: int
+    queries_per_player: int
+    renders: int
+    renders_per_player: int
+    latency_ms: float = LATENCY_BUDGET_MS
+
+    def max_queries(self, players: int) -> int:
+        return self.queries + self.queries_per_player * players
+
+    def max_renders(self, players: int) -> int:
+        return self.renders + self.renders_per_player * players
+
+
+@dataclass
+class Action:
+    """A client message to measure, sent by the moderator, the first player or all players after the prepare steps."""
+    sender: str
+    message: dict
+    budget: Budget
+    prepare: tuple[tuple[str, dict], ...] = ()
+    quiet: float = QUIET_SECONDS
+
+
+def open_text_question():
+    return ('moderator', {'type': 'question-click', 'question_id': '{text_question}'})
+
+
+def open_input_question():
+    return ('moderator', {'type': 'question-click', 'question_id': '{input_question}'})
+
+
+def unlock_buzzers():
+    return ('moderator', {'type': 'lock-all-buzzers', 'locked': False})
+
+
+def player_buzz():
+    return ('player', {'type': 'buzzer-click'})
+
+
+def all_players_guess():
+    return ('players', {'type': 'guess-submit', 'guess': '41'})
+
+
+ACTIONS = {
+    'moderator login': Action('moderator', {'type': 'login', 'gameCode': '{moderator_key}'}, Budget(6, 0, 4, 0)),
+    'player login': Action('player', {'type': 'login', 'gameCode': '{player_key}'}, Budget(4, 0, 4, 0)),
+    'moderator clock-pong': Action('moderator', {'type': 'clock-pong', 'serverTime': 0, 'clientTime': 0}, Budget(0, 0, 0, 0)),
+    'player clock-pong': Action('player', {'type': 'clock-pong', 'serverTime': 0, 'clientTime': 0}, Budget(0, 0, 0, 0)),
+    'player question-click': Action('player', {'type': 'question-click'}, Budget(0, 0, 0, 0)),
+    'question-click': Action('moderator', {'type': 'question-click', 'question_id': '{text_question}'}, Budget(14, 0, 6, 3)),
+    'show-question': Action('moderator', {'type': 'show-question', 'visible': True}, Budget(7, 0, 6, 4), prepare=(open_text_question(),)),
+    'show-answer': Action('moderator', {'type': 'show-answer', 'visible': True}, Budget(6, 0, 1, 1), prepare=(open_text_question(),)),
+    'lock-all-buzzers': Action('moderator', {'type': 'lock-all-buzzers', 'locked': False}, Budget(7, 0, 1, 1), prepare=(open_text_question(),)),
+    'lock-player-buzzer': Action('moderator', {'type': 'lock-player-buzzer', 'player_id': '{player_id}', 'locked': True}, Budget(7, 0, 1, 1), prepare=(open_text_question(),)),
+    'buzzer-click': Action('player', {'type': 'buzzer-click', 'clientTime': 0}, Budget(10, 0, 2, 1), prepare=(open_text_question(), unlock_buzzers())),
+    'rate-answer': Action('moderator', {'type': 'rate-answer', 'value': 'true', 'player_id': '{player_id}'}, Budget(15, 0, 2, 3), prepare=(open_text_question(), unlock_buzzers(), player_buzz())),
+    'exit-question': Action('moderator', {'type': 'exit-question'}, Budget(14, 0, 1, 1), prepare=(open_text_question(),)),
+    'timer-update': Action('moderator', {'type': 'timer-update', 'count': '3'}, Budget(0, 0, 1, 1), prepare=(open_text_question(),)),
+    'moderator scoreboard-page': Action('moderator', {'type': 'scoreboard-page', 'page': '0'}, Budget(0, 0, 1, 0)),
+    'player scoreboard-page': Action('player', {'type': 'scoreboard-page', 'page': '0'}, Budget(0, 0, 2, 0)),
+    'guess-submit': Action('player', {'type': 'guess-submit', 'guess': '40'}, Budget(0, 0, 2, 0), prepare=(open_input_question(),), quiet=GUESS_PUBLISH_INTERVAL + QUIET_SECONDS),
+    'score-guesses': Action('moderator', {'type': 'score-guesses'}, Budget(10, 0, 2, 3), prepare=(open_input_question(), all_players_guess()), quiet=GUESS_PUBLISH_INTERVAL + QUIET_SECONDS),
+    'reveal-image-step': Action('moderator', {'type': 'reveal-image-step', 'step': '1'}, Budget(8, 0, 1, 1), prepare=(('moderator', {'type': 'question-click', 'question_id': '{image_question}'}),)),
+}
+"""Every client message type with the budget it must stay in for every group size."""
+
+
+def png_data_url() -> str:
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), (200, 30, 30)).save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+
+def create_test_game(player_count: int) -> dict:
+    """Creates a game showing its quiz table and returns the ids and keys the actions are filled in with."""
+    created = create_game_from_json(json.dumps({
+        'name': 'Budget game',
+        'tables': [{'name': 'Table', 'columns': [
+            {'name': 'Text', 'questions': [{'question': f'Q{points}', 'answer': 'A', 'points': points} for points in (100, 200, 300)]},
+            {'name': 'Input', 'questions': [{'question': 'How many?', 'answer': '42', 'points': 100, 'type': 'Input'}]},
+            {'name': 'Image', 'questions': [{'question': 'What is it?', 'answer': 'Red', 'points': 100, 'type': 'ImageBlur', 'image': png_data_url()}]},
+        ]}],
+        'participants': [{'name': f'Player {number}'} for number in range(player_count + 1)],
+    }))
+    game = Game.objects.get(id=created.game_id)
+    table = game.jepardytables.get()
+    game.current_view.page = 'JepardyTable'
+    game.current_view.jepardy_table = table
+    game.current_view.save()
+    questions = {column.name: JepardyQuestion.objects.filter(columns=column).order_by('points').first() for column in table.columns.all()}
+    participants = list(game.participants.order_by('id'))
+    return {
+        'game_id': game.id,
+        'moderator_key': game.moderator_key,
+        'player_keys': [participant.private_key for participant in participants],
+        'player_id': participants[0].id,
+        'text_question': questions['Text'].id,
+        'input_question': questions['Input'].id,
+        'image_question': questions['Image'].id,
+    }
+
+
+def fill_in(message: dict, values: dict) -> dict:
+    return {key: value.format(**values) if isinstance(value, str) else value for key, value in message.items()}
+
+
+class QueryCounter:
+    """Counts the queries of all connections it is installed on, whatever thread they belong to."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self):
+        for connection in connections.all():
+            connection.execute_wrappers.append(self)
+
+    def uninstall(self):
+        for connection in connections.all():
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+
+class GameSession:
+    """A moderator and some players logged into one game through WebsocketCommunicators."""
+
+    def __init__(self, values: dict, player_count: int):
+        self.values = values
+        self.player_count = player_count
+        self.moderator = None
+        self.players = []
+
+    async def connect(self, consumer, key: str | None) -> WebsocketCommunicator:
+        communicator = WebsocketCommunicator(consumer.as_asgi(), '/ws/')
+        connected, _ = await communicator.connect()
+        assert connected
+        if key is not None:
+            await communicator.send_to(text_data=json.dumps({'type': 'login', 'gameCode': key}))
+        return communicator
+
+    async def start(self, log_in_moderator: bool = True, log_in_first_player: bool = True):
+        """Connects everybody. Moderator and first player may stay logged out, so their login can be measured."""
+        self.moderator = await self.connect(ModeratorConsumer, self.values['moderator_key'] if log_in_moderator else None)
+        await self.settle()
+        for number in range(self.player_count):
+            logged_in = log_in_first_player or number > 0
+            self.players.append(await self.connect(PlayerConsumer, self.values['player_keys'][number] if logged_in else None))
+            await self.settle()
+
+    @property
+    def communicators(self) -> list[WebsocketCommunicator]:
+        return [self.moderator, *self.players]
+
+    async def send(self, sender: str, message: dict):
+        text_data = json.dumps(fill_in(message, {**self.values, 'player_key': self.values['player_keys'][0]}))
+        if sender == 'moderator':
+            await self.moderator.send_to(text_data=text_data)
+        elif sender == 'player':
+            await self.players[0].send_to(text_data=text_data)
+        else:
+            for player in self.players:
+                await player.send_to(text_data=text_data)
+
+    async def settle(self, quiet: float = QUIET_SECONDS) -> float:
+        """Receives until no connection gets anything for quiet seconds. Returns the time of the last message."""
+        async def drain(communicator):
+            last_received = 0.0
+            while not await communicator.receive_nothing(timeout=quiet, interval=0.001):
+                await communicator.receive_from()
+                last_received = time.perf_counter()
+            return last_received
+        return max(await asyncio.gather(*(drain(communicator) for communicator in self.communicators)))
+
+    async def close(self):
+        for communicator in self.communicators:
+            await communicator.disconnect()
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class ConsumerBudgetTests(TransactionTestCase):
+    """
+    Drives every client message through the consumers with growing groups and fails when an action
+    needs more SQL queries or template renders than its budget in ACTIONS allows.
+    """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_settings = self.settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        self.renders = 0
+        template_rendered.connect(self.count_render)
+        self.addCleanup(template_rendered.disconnect, self.count_render)
+
+        # Measured with the quiz revision check due on every use, as it is once per interval
+        revision_check = mock.patch('game.play_state.QUIZ_REVISION_CHECK_INTERVAL', 0)
+        revision_check.start()
+        self.addCleanup(revision_check.stop)
+
+    def count_render(self, **kwargs):
+        self.renders += 1
+
+    def measure(self, action: Action, player_count: int) -> tuple[int, int, float]:
+        """Runs an action in a fresh game and returns its query count, render count and latency in ms."""
+        values = create_test_game(player_count)
+        counter = QueryCounter()
+
+        async def run():
+            session = GameSession(values, player_count)
+            await session.start(
+                log_in_moderator=action.message['type'] != 'login' or action.sender != 'moderator',
+                log_in_first_player=action.message['type'] != 'login' or action.sender != 'player',
+            )
+            for sender, message in action.prepare:
+                await session.send(sender, message)
+                await session.settle(action.quiet)
+            # Sync consumer handlers run on asgiref's single thread executor, their queries happen there
+            await asyncio.wrap_future(SyncToAsync.single_thread_executor.submit(counter.install))
+            self.renders = 0
+            start = time.perf_counter()
+            await session.send(action.sender, action.message)
+            last_received = await session.settle(action.quiet)
+            await asyncio.wrap_future(SyncToAsync.single_thread_executor.submit(counter.uninstall))
+            renders = self.renders
+            await session.close()
+            return renders, max(last_received - start, 0) * 1000
+
+        renders, latency = asyncio.run(run())
+        return counter.count, renders, latency
+
+    def test_actions_stay_within_budget(self):
+        for name, action in ACTIONS.items():
+            budget = action.budget
+            counts = {}
+            for player_count in GROUP_SIZES:
+                with self.subTest(action=name, players=player_count):
+                    queries, renders, latency = self.measure(action, player_count)
+                    counts[player_count] = queries, renders
+                    self.assertLessEqual(queries, budget.max_queries(player_count), f'{name} with {player_count} players ran {queries} queries')
+                    self.assertLessEqual(renders, budget.max_renders(player_count), f'{name} with {player_count} players rendered {renders} templates')
+                    self.assertLessEqual(latency, budget.latency_ms, f'{name} with {player_count} players took {latency:.0f} ms')
+            if len(counts) < len(GROUP_SIZES):
+                continue
+            # The growth from the smallest to the largest group must stay in the per player budget on its own,
+            # a generous fixed part must not hide a fan-out
+            (small_queries, small_renders), (large_queries, large_renders) = counts[GROUP_SIZES[0]], counts[GROUP_SIZES[-1]]
+            added_players = GROUP_SIZES[-1] - GROUP_SIZES[0]
+            with self.subTest(action=name, slope=True):
+                self.assertLessEqual(large_queries - small_queries, budget.queries_per_player * added_players, f'{name} ran {(large_queries - small_queries) / added_players:.1f} queries per added player')
+                self.assertLessEqual(large_renders - small_renders, budget.renders_per_player * added_players, f'{name} rendered {(large_renders - small_renders) / added_players:.1f} templates per added player')
+
+    def test_score_fan_out_runs_no_queries_per_receiver(self):
+        """A score change is rendered from the shared leaderboard, so the receivers of the event run no queries."""
+        def fan_out(player_count: int) -> int:
+            values = create_test_game(player_count)
+            counter = QueryCounter()
+
+            async def run():
+                session = GameSession(values, player_count)
+                await session.start()
+                await asyncio.wrap_future(SyncToAsync.single_thread_executor.submit(counter.install))
+                event = {'type': 'score_update', 'scores': [[values['player_id'], 100]], 'version': 1_000_000}
+                await get_channel_layer().group_send(f'game_{values["game_id"]}', event)
+                await session.settle()
+                await asyncio.wrap_future(SyncToAsync.single_thread_executor.submit(counter.uninstall))
+                await session.close()
+
+            asyncio.run(run())
+            return counter.count
+
+        self.assertEqual(fan_out(1), 0)
+        self.assertEqual(fan_out(8), 0)
+
+    def test_events_of_one_command_reach_a_client_in_one_frame(self):
+        """Rating an answer changes scores and buzzers, the other players get both in a single websocket message."""
+        values = create_test_game(2)
+
+        async def run():
+            session = GameSession(values, 2)
+            await session.start()
+            for sender, message in (open_text_question(), unlock_buzzers(), player_buzz()):
+                await session.send(sender, message)
+                await session.settle()
+            await session.send('moderator', {'type': 'rate-answer', 'value': 'true', 'player_id': '{player_id}'})
+            frames = []
+            while not await session.players[1].receive_nothing(timeout=QUIET_SECONDS, interval=0.001):
+                frames.append(await session.players[1].receive_from())
+            await session.close()
+            return frames
+
+        frames = asyncio.run(run())
+        self.assertEqual(len(frames), 1)
+        self.assertIn('score_wrap', frames[0])
+        self.assertIn('buzzer', frames[0])
+
+    def test_repeated_commands_change_the_game_once(self):
+        """A double click on rate answer scores the buzz once, a second request for the same state is a no-op."""
+        values = create_test_game(1)
+
+        async def run():
+            session = GameSession(values, 1)
+            await session.start()
+            for sender, message in (open_text_question(), unlock_buzzers(), player_buzz()):
+                await session.send(sender, message)
+                await session.settle()
+            for _ in range(2):
+                await session.send('moderator', {'type': 'rate-answer', 'value': 'true', 'player_id': '{player_id}'})
+            await session.settle()
+            await session.send('moderator', {'type': 'show-answer', 'visible': True})
+            await session.settle()
+            await session.send('moderator', {'type': 'show-answer', 'visible': True})
+            nothing = await session.players[0].receive_nothing(timeout=QUIET_SECONDS)
+            await session.close()
+            return nothing
+
+        self.assertTrue(asyncio.run(run()))
+        participant = GameParticipant.objects.get(id=values['player_id'])
+        self.assertEqual(participant.score, 100)
+        self.assertTrue(participant.game.current_view.answer_visible)
+
+    def test_game_messages_are_dropped_before_login(self):
+        """Handlers rely on the game of the login, before it they would write to or cache for game None."""
+        values = create_test_game(1)
+        counter = QueryCounter()
+
+        async def run():
+            session = GameSession(values, 1)
+            await session.start(log_in_moderator=False, log_in_first_player=False)
+            await asyncio.wrap_future(SyncToAsync.single_thread_executor.submit(counter.install))
+            self.renders = 0
+            for name, action in ACTIONS.items():
+                if action.message['type'] != 'login':
+                    with self.subTest(name):
+                        await session.send(action.sender, action.message)
+                        await session.settle()
+                        self.assertEqual((counter.count, self.renders), (0, 0))
+            await asyncio.wrap_future(SyncToAsync.single_thread_executor.submit(counter.uninstall))
+            await session.close()
+
+        asyncio.run(run())
+        self.assertNotIn(None, play_state._question_indexes)
+
+    def test_admin_create_game_inserts_players_in_batches(self):
+        """Creating a game inserts its players in batches, so a big game needs only a few more queries than a small one."""
+        def create(player_count: int) -> int:
+            counter = QueryCounter()
+
+            async def run():
+                communicator = WebsocketCommunicator(AdminConsumer.as_asgi(), '/ws/admin/')
+                await communicator.connect()
+                await asyncio.wrap_future(SyncToAsync.single_thread_executor.submit(counter.install))
+                await communicator.send_to(text_data=json.dumps({'type': 'create-game', 'game_name': 'Bulk', 'player_names': [f'P{number}' for number in range(player_count)]}))
+                await communicator.receive_from()
+                await asyncio.wrap_future(SyncToAsync.single_thread_executor.submit(counter.uninstall))
+                await communicator.disconnect()
+
+            asyncio.run(run())
+            return counter.count
+
+        self.assertLessEqual(create(500), create(5) + 10)
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class HeartbeatTests(TransactionTestCase):
+    def test_silent_connections_are_reaped(self):
+        values = create_test_game(2)
+
+        async def run():
+            session = GameSession(values, 2)
+            await session.start()
+            channel_names = [channel_name for channel_name, participant_id in presence._connections[values['game_id']].items() if participant_id is not None]
+            self.assertEqual(get_presence(values['game_id'])['players_online'], 2)
+
+            # A connection heard from within HEARTBEAT_TIMEOUT is pinged
+            await get_channel_layer().send(channel_names[0], {'type': 'heartbeat'})
+            pinged = [player for player in session.players if not await player.receive_nothing(timeout=QUIET_SECONDS)]
+            self.assertEqual(len(pinged), 1)
+            self.assertIn('clock_ping', await pinged[0].receive_from())
+
+            late = server_time() + HEARTBEAT_TIMEOUT * 1000 + 1
+            with mock.patch('game.consumers.server_time', return_value=late):
+                await get_channel_layer().send(channel_names[0], {'type': 'heartbeat'})
+                closed = await pinged[0].receive_output()
+            self.assertEqual(closed['type'], 'websocket.close')
+            await session.settle()
+            self.assertEqual(get_presence(values['game_id'])['players_online'], 1)
+            session.players.remove(pinged[0])
+            await session.close()
+
+        asyncio.run(run())
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class LeaderboardEvictionTests(TransactionTestCase):
+    def test_rejoining_a_game_reloads_scores_written_elsewhere(self):
+        values = create_test_game(1)
+        game_id, player_id = values['game_id'], values['player_id']
+
+        async def play(score: int):
+            session = GameSession(values, 1)
+            await session.start()
+            # The logins loaded the leaderboard to send the scores
+            self.assertEqual(leaderboard._leaderboards[game_id].score_of(player_id), score)
+            await session.close()
+
+        asyncio.run(play(0))
+        self.assertNotIn(game_id, leaderboard._leaderboards)
+        # Scored while no connection of the game was on this worker, e.g. through another worker
+        GameParticipant.objects.filter(id=player_id).update(score=700)
+        asyncio.run(play(700))
+        self.assertNotIn(game_id, leaderboard._leaderboards)
+
+
+class LeaderboardTests(TestCase):
+    def test_ranked_keys_match_a_sorted_list(self):
+        rng = random.Random(26)
+        keys, expected = RankedKeys(), []
+        for _ in range(2000):
+            if expected and rng.random() < 0.4:
+                key = rng.choice(expected)
+                keys.remove(key)
+                expected.remove(key)
+            else:
+                key = rng.randrange(1000)
+                if key in expected:
+                    continue
+                keys.insert(key)
+                bisect.insort(expected, key)
+            probe = rng.randrange(1000)
+            start = rng.randrange(len(expected) + 1)
+            self.assertEqual(keys.count_less(probe), bisect.bisect_left(expected, probe))
+            self.assertEqual(keys.slice(start, 10), expected[start:start + 10])
+        self.assertEqual(len(keys), len(expected))
+        self.assertEqual(keys.slice(0, len(expected)), expected)
+        with self.assertRaises(KeyError):
+            keys.remove(1000)
+
+    def test_ranks_and_scores_match_sorted_scores(self):
+        rng = random.Random(29)
+        leaderboard, scores = Leaderboard(), {}
+        for _ in range(1000):
+            participant_id = rng.randrange(40)
+            if participant_id in scores and rng.random() < 0.2:
+                leaderboard.remove(participant_id)
+                del scores[participant_id]
+            elif participant_id in scores:
+                score = rng.randrange(0, 500, 50)
+                self.assertEqual(leaderboard.set_score(participant_id, score), score != scores[participant_id])
+                scores[participant_id] = score
+            else:
+                scores[participant_id] = rng.randrange(0, 500, 50)
+                leaderboard.add(participant_id, f'Player {participant_id}', scores[participant_id])
+            ranking = sorted(scores, key=lambda participant_id: (-scores[participant_id], participant_id))
+            ranks = {participant_id: 1 + sum(score > scores[participant_id] for score in scores.values()) for participant_id in scores}
+            self.assertEqual(
+                leaderboard.top(len(scores) + 1),
+                [{'id': participant_id, 'name': f'Player {participant_id}', 'score': scores[participant_id], 'rank': ranks[participant_id]} for participant_id in ranking],
+            )
+            self.assertEqual([entry['id'] for entry in leaderboard.top(5, 3)], ranking[3:8])
+            self.assertEqual({participant_id: leaderboard.rank_of(participant_id) for participant_id in scores}, ranks)
+        self.assertIsNone(leaderboard.rank_of(40))
+
+
+class MessageTableTests(TestCase):
+    def test_fields_are_typed(self):
+        self.assertEqual(
+            MODERATOR_MESSAGES.decode('{"type": "timer-update", "count": "0", "HEADERS": {"HX-Request": "true"}}'),
+            ('handle_timer_update', [0]),
+        )
+        self.assertEqual(PLAYER_MESSAGES.decode('{"type": "buzzer-click"}'), ('buzz', [None]))
+        self.assertEqual(PLAYER_MESSAGES.decode('{"type": "guess-submit", "latitude": "47.5", "longitude": 8}'), ('receive_guess', [None, 47.5, 8.0]))
+
+    def test_bad_frames_are_rejected_before_any_query(self):
+        frames = [
+            '{"type": "question-click"',
+            '[]',
+            '{"type": ["question-click"]}',
+            '{"type": "question-click", "question_id": "1; DROP TABLE"}',
+            '{"type": "question-click", "question_id": -1}',
+            '{"type": "rate-answer", "value": "maybe"}',
+            '{"type": "clock-pong", "serverTime": "NaN", "clientTime": 1}',
+            '{"type": "unknown"}',
+            '{"type": "question-click", "question_id": 1, "padding": "' + 'x' * MESSAGE_MAX_BYTES + '"}',
+            # Fewer characters than the limit, but three bytes each
+            '{"type": "question-click", "question_id": 1, "padding": "' + '€' * (MESSAGE_MAX_BYTES // 3) + '"}',
+        ]
+        with self.assertNumQueries(0):
+            for frame in frames:
+                with self.subTest(frame=frame[:60]), self.assertRaises(MessageError):
+                    MODERATOR_MESSAGES.decode(frame)
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class FragmentBudgetTests(TestCase):
+    def test_shipped_fragments_are_within_the_budget(self):
+        output = io.StringIO()
+        call_command('audit_fragments', stdout=output)
+        self.assertIn('All fragments are within the budget', output.getvalue())
+
+    def test_a_fragment_over_the_budget_fails(self):
+        with self.assertRaises(CommandError):
+            call_command('audit_fragments', budget=1, stdout=io.StringIO())
+
+class GuessFormTests(TestCase):
+    async def test_forms_without_the_fields_of_the_open_question_are_dropped(self):
+        consumer = PlayerConsumer()
+        consumer.game_id, consumer.game_participant_id = 1, 1
+
+        # Like a consumer handler, in a thread next to a running event loop the guess throttle can use
+        def submit(aggregator_class, answer: str, fields: tuple) -> int:
+            aggregator = start_guessing(1, 1, answer, aggregator_class)
+            consumer.receive_guess(*fields)
+            discard_guessing(1)
+            return len(aggregator)
+
+        for aggregator_class, answer, fields in (
+            (GuessAggregator, '42', (None, None, None)),
+            (GuessAggregator, '42', (None, 47.5, 8.0)),
+            (MapGuessAggregator, '47.4, 8.5', ('Zurich', None, None)),
+            (MapGuessAggregator, '47.4, 8.5', (None, 47.5, None)),
+        ):
+            with self.subTest(question=aggregator_class.__name__, fields=fields):
+                self.assertEqual(await sync_to_async(submit)(aggregator_class, answer, fields), 0)
+
+
+class GuessAggregatorTests(TestCase):
+    def aggregator(self, answer: str, guesses: dict[int, str]) -> GuessAggregator:
+        aggregator = GuessAggregator(1, answer)
+        for participant_id, guess in guesses.items():
+            aggregator.submit(participant_id, guess)
+        return aggregator
+
+    def test_text_answers_are_awarded_when_equal_after_normalizing(self):
+        aggregator = self.aggregator('Mount Everest', {1: 'mount  everest', 2: 'MOUNT EVEREST ', 3: 'K2', 4: 'Everest'})
+        self.assertEqual(aggregator.awards(100), {1: 100, 2: 100})
+
+    def test_numeric_answers_award_all_closest_guesses(self):
+        aggregator = self.aggregator('42', {1: '40', 2: '44', 3: '41,5', 4: 'many'})
+        self.assertEqual(len(aggregator), 3)
+        self.assertEqual(aggregator.awards(100), {3: 100})
+        aggregator.submit(3, '50')
+        self.assertEqual(aggregator.awards(100), {1: 100, 2: 100})
+
+    def test_only_the_latest_guess_counts(self):
+        aggregator = self.aggregator('A', {1: 'B', 2: 'B'})
+        aggregator.submit(1, 'a')
+        self.assertCountEqual(aggregator.histogram(5), [{'label': 'a', 'count': 1, 'percent': 50}, {'label': 'b', 'count': 1, 'percent': 50}])
+        self.assertEqual(aggregator.awards(100), {1: 100})
+
+    def test_text_histogram_shows_the_most_common_answers(self):
+        aggregator = self.aggregator('Paris', {1: 'Paris', 2: 'paris', 3: 'Lyon', 4: 'Nice', 5: 'Nice', 6: 'Paris'})
+        self.assertEqual(aggregator.histogram(2), [{'label': 'paris', 'count': 3, 'percent': 50}, {'label': 'nice', 'count': 2, 'percent': 33}])
+
+    def test_numeric_histogram_bins_the_range(self):
+        aggregator = self.aggregator('5', {1: '0', 2: '1', 3: '6', 4: '10'})
+        self.assertEqual(aggregator.histogram(2), [{'label': '0 - 5', 'count': 2, 'percent': 50}, {'label': '5 - 10', 'count': 2, 'percent': 50}])
+        self.assertEqual(self.aggregator('5', {1: '3', 2: '3'}).histogram(4), [{'label': '3', 'count': 2, 'percent': 100}])
+        self.assertEqual(self.aggregator('5', {}).histogram(4), [])
+
+    def test_closest_guesses_come_best_first(self):
+        aggregator = self.aggregator('100', {1: '150', 2: '99', 3: '90', 4: '100.5'})
+        self.assertEqual(aggregator.closest(3), [
+            {'participant_id': 4, 'guess': '100.5', 'distance': '0.5'},
+            {'participant_id': 2, 'guess': '99', 'distance': '1'},
+            {'participant_id': 3, 'guess': '90', 'distance': '10'},
+        ])
+        self.assertEqual(self.aggregator('Paris', {1: 'Paris'}).closest(3), [])
+
+    def test_closed_collections_reject_guesses(self):
+        aggregator = self.aggregator('42', {1: '40'})
+        aggregator.is_open = False
+        self.assertFalse(aggregator.submit(2, '42'))
+        self.assertEqual(aggregator.awards(100), {1: 100})
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class GuessStatsRoutingTests(TransactionTestCase):
+    def test_live_guess_statistics_only_reach_the_moderators(self):
+        values = create_test_game(3)
+        moderator_updates, player_updates = [], []
+
+        async def run():
+            session = GameSession(values, 3)
+            await session.start()
+            await session.send('moderator', {'type': 'question-click', 'question_id': '{input_question}'})
+            await session.settle()
+            await session.send('players', {'type': 'guess-submit', 'guess': '41'})
+            await session.settle(GUESS_PUBLISH_INTERVAL + QUIET_SECONDS)
+            await session.close()
+
+        with (
+            mock.patch.object(ModeratorConsumer, 'guess_update', autospec=True, side_effect=lambda consumer, event: moderator_updates.append(event)),
+            mock.patch.object(PlayerConsumer, 'guess_update', autospec=True, side_effect=lambda consumer, event: player_updates.append(event)),
+        ):
+            asyncio.run(run())
+        self.assertTrue(moderator_updates)
+        self.assertEqual(player_updates, [])
+
+
+class MapScoringTests(TestCase):
+    def test_distances_match_known_ones(self):
+        quarter_meridian, antipode = math.pi / 2 * EARTH_RADIUS_KM, math.pi * EARTH_RADIUS_KM
+        for target, guess, distance in (
+            ((0, 0), (0, 0), 0),
+            ((0, 0), (0, 1), antipode / 180),
+            ((0, 0), (90, 0), quarter_meridian),
+            ((0, 0), (0, 180), antipode),
+            ((10, -170), (-10, 10), antipode),
+            ((51.5074, -0.1278), (48.8566, 2.3522), 343.56),  # London - Paris
+        ):
+            with self.subTest(target=target, guess=guess):
+                distances = great_circle_distances(np.array([guess[0]]), np.array([guess[1]]), target)
+                self.assertAlmostEqual(distances[0], distance, places=2)
+
+    def test_points_halve_with_every_half_distance(self):
+        self.assertEqual(decay_points(np.array([0, 500, 1000, 1500, 20000]), 800, 500).tolist(), [800, 400, 200, 100, 0])
+        # One degree of latitude is 111.2 km, guesses without points are left out
+        awarded = score_map_guesses(
+            np.array([1, 2, 3]), np.array([0.0, 1.0, -60.0]), np.array([0.0, 0.0, 0.0]), (0, 0), 1000, 'decay', 111.19508,
+        )
+        self.assertEqual(awarded, {1: 1000, 2: 500})
+
+    def test_points_fall_with_the_rank(self):
+        awarded = score_map_guesses(
+            np.array([1, 2, 3, 4]), np.array([3.0, 1.0, 1.0, 0.0]), np.array([0.0, 0.0, 0.0, 0.0]), (0, 0), 100, 'rank',
+        )
+        self.assertEqual(awarded, {1: 25, 2: 75, 3: 75, 4: 100})
+        with self.assertRaises(ValueError):
+            score_map_guesses(np.array([1]), np.array([0.0]), np.array([0.0]), (0, 0), 100, 'nearest')
+
+    def test_guesses_are_scored_against_the_answer(self):
+        aggregator = MapGuessAggregator(1, '0, 0')
+        self.assertFalse(aggregator.submit(1, '91, 0'))
+        self.assertTrue(aggregator.submit(1, '0; 0'))
+        self.assertTrue(aggregator.submit(2, (1.0, 0.0)))
+        awarded = aggregator.awards(1000)
+        self.assertEqual(awarded[1], 1000)
+        self.assertLess(awarded[2], 1000)
+
+
+class QuestionBankTests(TestCase):
+    def search(self, text: str, after: int | None = None, limit: int = 10) -> list[int]:
+        return [row['id'] for row in questions(text, after, limit)]
+
+    def test_index_follows_writes(self):
+        question = GameQuestion.objects.create(question='Which city is the capital of Switzerland?', answer='Bern')
+        self.assertEqual(self.search('switzerland'), [question.id])
+        self.assertEqual(self.search('capi'), [question.id])
+        self.assertEqual(self.search('bern'), [question.id])
+        question.answer = 'Zürich'
+        question.save()
+        self.assertEqual(self.search('bern'), [])
+        self.assertEqual(self.search('zurich'), [question.id])
+        question.delete()
+        self.assertEqual(self.search('switzerland'), [])
+
+    def test_query_syntax_is_matched_literally(self):
+        question = GameQuestion.objects.create(question='Rock OR roll?', answer='"both"')
+        self.assertEqual(self.search('OR'), [question.id])
+        self.assertEqual(self.search('"both'), [question.id])
+        self.assertEqual(self.search('-'), self.search(''))
+
+    def test_keyset_pages_cover_all_matches_once(self):
+        GameQuestion.objects.bulk_create(GameQuestion(question=f'River number {number}', answer='A') for number in range(25))
+        GameQuestion.objects.create(question='Mountain', answer='B')
+        seen, after = [], None
+        while True:
+            page, after = split_page(list(questions('river', after, 10)), 10)
+            seen += [row['id'] for row in page]
+            if after is None:
+                break
+        self.assertEqual(seen, list(GameQuestion.objects.filter(question__startswith='River').order_by('id').values_list('id', flat=True)))
+
+
+class QuizTablePatchTests(TestCase):
+    def setUp(self):
+        create_game_from_json(json.dumps({
+            'name': 'Patch',
+            'tables': [{'name': 'Table', 'columns': [{'name': 'Column', 'questions': [{'question': 'Q', 'answer': 'A', 'points': 100}]}]}],
+            'participants': [],
+        }))
+        self.table = JepardyTable.objects.get()
+        self.column = self.table.columns.get()
+        self.jepardy_question = self.column.questions.get()
+
+    def test_patch_is_all_or_nothing(self):
+        with self.assertRaisesRegex(ValueError, 'Operation 1'):
+            apply_patch([
+                {'op': 'rename_table', 'table': self.table.id, 'name': 'Renamed'},
+                {'op': 'remove_question', 'column': self.column.id, 'jepardy_question': self.jepardy_question.id + 1},
+            ])
+        self.assertEqual(JepardyTable.objects.get().name, 'Table')
+
+    def test_unknown_types_and_boolean_points_are_rejected(self):
+        for change in ({'type': 'Essay'}, {'type': 'text'}, {'points': True}, {'points': '100'}):
+            with self.subTest(change=change), self.assertRaisesRegex(ValueError, 'Operation 0'):
+                apply_patch([{'op': 'update_question', 'jepardy_question': self.jepardy_question.id, **change}])
+        question = JepardyQuestion.objects.select_related('question').get()
+        self.assertEqual((question.question.question_type, question.points), ('Text', 100))
+
+    def test_removing_an_open_question_keeps_the_game(self):
+        game = Game.objects.get()
+        CurrentView.objects.filter(game=game).update(page='TextQuestion', question_id=self.jepardy_question.question_id, jepardy_question=self.jepardy_question)
+        apply_patch([{'op': 'remove_question', 'column': self.column.id, 'jepardy_question': self.jepardy_question.id}])
+        self.assertFalse(JepardyQuestion.objects.exists())
+        game = Game.objects.select_related('current_view').get(id=game.id)
+        self.assertEqual(game.current_view.question_id_id, self.jepardy_question.question_id)
+        self.assertIsNone(game.current_view.jepardy_question_id)
+
+    def test_queries_do_not_grow_with_the_patch(self):
+        def add_columns(count: int) -> list[dict]:
+            return [{'op': 'add_column', 'table': self.table.id, 'name': f'New {number}', 'ref': f'column {number}'} for number in range(count)] + [
+                {'op': 'add_question', 'column': f'column {number}', 'question': f'Q {points}', 'answer': 'A', 'points': points}
+                for number in range(count) for points in (100, 200, 300)
+            ]
+        with self.assertNumQueries(11):
+            result = apply_patch(add_columns(1))
+        self.assertEqual(set(result.created), {'column 0'})
+        with self.assertNumQueries(11):
+            apply_patch(add_columns(6))
+        self.assertEqual(self.table.columns.count(), 8)
+
+
+class LiveStateTests(TestCase):
+    def test_state_is_shared_per_version_and_read_again_for_newer_ones(self):
+        created = create_game_from_json(json.dumps({'name': 'Live', 'tables': [], 'participants': [{'name': 'Player'}]}))
+        game_id = created.game_id
+        self.addCleanup(discard_live_state, game_id)
+        state = get_live_state(game_id)
+        with self.assertNumQueries(0):
+            self.assertIs(get_live_state(game_id, state.version), state)
+        CurrentView.objects.filter(game=game_id).update(page='TextQuestion', answer_visible=True)
+        GameParticipant.objects.filter(game_id=game_id).update(round_lock=True)
+        newer = get_live_state(game_id, bump_game_version(game_id))
+        self.assertTrue(newer.answer_visible)
+        self.assertEqual(newer.round_locks, set(GameParticipant.objects.filter(game_id=game_id).values_list('id', flat=True)))
+
+
+class QuestionIndexTests(TestCase):
+    def setUp(self):
+        created = create_game_from_json(json.dumps({
+            'name': 'Index',
+            'tables': [{'name': 'Round 1', 'columns': [{'name': 'Column', 'questions': [{'question': 'Q', 'answer': 'A', 'points': 100}]}]}],
+            'participants': [],
+        }))
+        self.game = Game.objects.get(id=created.game_id)
+        self.first = JepardyQuestion.objects.get()
+        # The same question again on a second table, worth more
+        self.second = JepardyQuestion.objects.create(question=self.first.question, points=500)
+        column = JepardyColumn.objects.create(name='Column')
+        column.questions.add(self.second)
+        table = JepardyTable.objects.create(name='Round 2')
+        table.columns.add(column)
+        self.game.jepardytables.add(table)
+        # The next revision check is due at once
+        revision_check = mock.patch.object(play_state, '_next_revision_check', 0.0)
+        revision_check.start()
+        self.addCleanup(revision_check.stop)
+
+    def test_a_reused_question_is_opened_on_its_own_table(self):
+        with self.assertNumQueries(1):
+            index = get_question_index(self.game.id)
+        self.assertEqual((index[self.first.id].points, index[self.second.id].points), (100, 500))
+        self.assertTrue(switch_to_question_view(self.game.id, self.second.id))
+        current_view = Game.objects.get(id=self.game.id).current_view
+        self.assertEqual((current_view.question_id_id, current_view.jepardy_question_id), (self.first.question_id, self.second.id))
+        self.assertFalse(switch_to_question_view(self.game.id, self.second.id + 1))
+
+    def test_index_is_reloaded_after_an_edit(self):
+        get_question_index(self.game.id)
+        with self.assertNumQueries(0):
+            get_question_index(self.game.id)
+        apply_patch([{'op': 'update_question', 'jepardy_question': self.first.id, 'answer': 'B'}])
+        self.assertEqual(get_question_index(self.game.id)[self.first.id].answer, 'B')
+
+    @mock.patch('game.play_state.QUIZ_REVISION_CHECK_INTERVAL', 0)
+    def test_edits_of_other_processes_drop_the_index(self):
+        """Another worker edits the quiz: no signal reaches this process, only the revision of the edited table moves."""
+        self.assertEqual(get_question_index(self.game.id)[self.first.id].answer, 'A')
+        GameQuestion.objects.filter(id=self.first.question_id).update(answer='C')
+        self.assertEqual(get_question_index(self.game.id)[self.first.id].answer, 'A')
+        JepardyTable.objects.filter(name='Round 1').update(revision=F('revision') + 1)
+        self.assertEqual(get_question_index(self.game.id)[self.first.id].answer, 'C')
+
+    @mock.patch('game.play_state.QUIZ_REVISION_CHECK_INTERVAL', 0)
+    def test_edits_of_other_tables_keep_the_index(self):
+        get_question_index(self.game.id)
+        create_game_from_json(json.dumps({
+            'name': 'Other',
+            'tables': [{'name': 'Elsewhere', 'columns': [{'name': 'Column', 'questions': [{'question': 'Q', 'answer': 'A', 'points': 100}]}]}],
+            'participants': [],
+        }))
+        apply_patch([{'op': 'rename_table', 'table': JepardyTable.objects.get(name='Elsewhere').id, 'name': 'Renamed'}])
+        self.assertIn(self.game.id, play_state._question_indexes)
+        # Only the revision check
+        with self.assertNumQueries(1):
+            get_question_index(self.game.id)
+
+    def test_revisions_are_checked_once_per_interval(self):
+        get_question_index(self.game.id)
+        JepardyTable.objects.filter(name='Round 1').update(revision=F('revision') + 1)
+        with self.assertNumQueries(0):
+            get_question_index(self.game.id)
+        with mock.patch('game.play_state.time.monotonic', return_value=time.monotonic() + QUIZ_REVISION_CHECK_INTERVAL):
+            with self.assertNumQueries(2):
+                get_question_index(self.game.id)
+
+
+class DependencyLockTests(TestCase):
+    def test_every_dependency_is_locked(self):
+        """E.g. pillow for the question image frames, poetry install --sync fails on a dependency missing in poetry.lock."""
+        root = settings.BASE_DIR.parent
+        with open(root / 'pyproject.toml', 'rb') as f:
+            dependencies = {name.lower() for name in tomllib.load(f)['tool']['poetry']['dependencies']} - {'python'}
+        with open(root / 'poetry.lock', 'rb') as f:
+            locked = {package['name'] for package in tomllib.load(f)['package']}
+        self.assertIn('pillow', dependencies)
+        self.assertEqual(dependencies - locked, set())
+
+
+class WarmupTests(TransactionTestCase):
+    def setUp(self):
+        self.game_ids = [create_test_game(1)['game_id'] for _ in range(12)]
+        leaderboard._leaderboards.clear()
+        affinity.get_worker_ring.cache_clear()
+        self.addCleanup(affinity.get_worker_ring.cache_clear)
+        self.addCleanup(leaderboard._leaderboards.clear)
+
+    def test_nothing_is_preloaded_without_affinity_routing(self):
+        self.assertEqual(preload_games(), 0)
+        self.assertEqual(leaderboard._leaderboards, {})
+
+    @override_settings(GAME_WORKERS=['ws://a', 'ws://b'], GAME_WORKER='ws://a')
+    def test_only_games_owned_by_this_worker_are_preloaded(self):
+        owned = {game_id for game_id in self.game_ids if affinity.worker_for_game(game_id) == 'ws://a'}
+        self.assertTrue(0 < len(owned) < len(self.game_ids))
+        self.assertEqual(preload_games(), len(owned))
+        self.assertEqual(set(leaderboard._leaderboards), owned)
+
+    def test_every_template_is_compiled(self):
+        file_count = sum(file_name.endswith('.html') for _, _, file_names in os.walk(TEMPLATE_DIRECTORY) for file_name in file_names)
+        self.assertGreater(file_count, 0)
+        self.assertEqual(compile_templates(), file_count)
+
+    def test_the_sync_consumer_thread_is_connected(self):
+        """Sync consumer handlers run in the thread of thread sensitive sync_to_async, its connections must be open."""
+        connected_threads = set()
+        database_class = type(connections['default'])
+        ensure_connection = database_class.ensure_connection
+
+        def record(connection):
+            connected_threads.add(threading.get_ident())
+            ensure_connection(connection)
+
+        consumer_thread = asyncio.run(sync_to_async(threading.get_ident, thread_sensitive=True)())
+        with mock.patch.object(database_class, 'ensure_connection', autospec=True, side_effect=record):
+            open_connections()
+        self.assertEqual(connected_threads, {threading.get_ident(), consumer_thread})
+
+
+class HashRingTests(TestCase):
+    KEYS = [f'game_{game_id}' for game_id in range(2000)]
+
+    def owners(self, ring: HashRing) -> dict[str, str]:
+        return {key: ring.node_for(key) for key in self.KEYS}
+
+    def test_every_game_has_one_stable_owner(self):
+        nodes = [f'ws://worker{number}:8001' for number in range(4)]
+        owners = self.owners(HashRing(nodes))
+        self.assertEqual(self.owners(HashRing(reversed(nodes))), owners)
+        self.assertEqual(set(owners.values()), set(nodes))
+        self.assertIsNone(HashRing().node_for('game_1'))
+
+    def test_adding_a_worker_only_moves_games_to_it(self):
+        nodes = [f'ws://worker{number}:8001' for number in range(4)]
+        ring = HashRing(nodes)
+        before = self.owners(ring)
+        ring.add('ws://worker4:8001')
+        moved = {key for key, owner in self.owners(ring).items() if owner != before[key]}
+        self.assertEqual({ring.node_for(key) for key in moved}, {'ws://worker4:8001'})
+        # About a fifth of the games
+        self.assertLess(abs(len(moved) / len(self.KEYS) - 1 / 5), 0.1)
+
+    def test_removing_a_worker_only_moves_its_games(self):
+        nodes = [f'ws://worker{number}:8001' for number in range(5)]
+        ring = HashRing(nodes)
+        before = self.owners(ring)
+        ring.remove('ws://worker2:8001')
+        after = self.owners(ring)
+        self.assertEqual({key for key in self.KEYS if after[key] != before[key]}, {key for key in self.KEYS if before[key] == 'ws://worker2:8001'})
+        self.assertNotIn('ws://worker2:8001', after.values())
+        self.assertEqual(len(ring), 4)
+
+
+@override_settings(
+    GAME_WORKERS=['ws://worker0:8001', 'ws://worker1:8001'],
+    GAME_WORKER='ws://worker0:8001',
+    STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    },
+)
+class GameWorkerRoutingTests(TransactionTestCase):
+    def setUp(self):
+        affinity.get_worker_ring.cache_clear()
+        self.addCleanup(affinity.get_worker_ring.cache_clear)
+        self.values = create_test_game(0)
+        self.owner = affinity.worker_for_game(self.values['game_id'])
+
+    async def log_in(self) -> list[str]:
+        communicator = WebsocketCommunicator(ModeratorConsumer.as_asgi(), '/ws/moderator/')
+        await communicator.connect()
+        await communicator.receive_from()
+        await communicator.send_to(text_data=json.dumps({'type': 'login', 'gameCode': self.values['moderator_key']}))
+        frames = []
+        while not await communicator.receive_nothing(timeout=QUIET_SECONDS):
+            frames.append(await communicator.receive_from())
+        await communicator.disconnect()
+        return frames
+
+    def test_logins_are_sent_to_the_worker_owning_the_game(self):
+        other = next(worker for worker in settings.GAME_WORKERS if worker != self.owner)
+        with self.settings(GAME_WORKER=other):
+            frames = asyncio.run(self.log_in())
+        self.assertEqual(len(frames), 1)
+        self.assertIn(f'ws-connect="{self.owner}/ws/moderator/"', frames[0])
+        self.assertIn(f'data-login-key="{self.values["moderator_key"]}"', frames[0])
+
+    def test_the_owning_worker_logs_the_client_in(self):
+        with self.settings(GAME_WORKER=self.owner):
+            frames = asyncio.run(self.log_in())
+        self.assertGreater(len(frames), 1)
+        self.assertFalse(any('ws-connect' in frame for frame in frames))
+
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class ShellTests(TestCase):
+    def test_current_copies_get_not_modified(self):
+        response = self.client.get(reverse('moderator_page'))
+        self.assertEqual(response.status_code, 200)
+        etag, last_modified = response.headers['ETag'], response.headers['Last-Modified']
+        self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+
+        response = self.client.get(reverse('moderator_page'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.content), (304, b''))
+        self.assertEqual(response.headers['ETag'], etag)
+        self.assertEqual(self.client.get(reverse('moderator_page'), HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.client.get(reverse('moderator_page'), HTTP_IF_NONE_MATCH='"outdated"').status_code, 200)
+        # Every shell has its own ETag
+        self.assertNotEqual(self.client.get(reverse('player_page')).headers['ETag'], etag)
+
+    def test_catalog_is_parsed_again_after_a_change(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'quiztables.json')
+        with open(path, 'w') as f:
+            json.dump([{'name': 'First'}], f)
+        os.utime(path, (1000, 1000))
+
+        with mock.patch.object(shells, 'CATALOG_PATH', path), mock.patch.object(shells, '_catalog', None):
+            catalog = shells.get_quiztables()
+            self.assertEqual(catalog, [{'name': 'First'}])
+            self.assertIs(shells.get_quiztables(), catalog)
+            with open(path, 'w') as f:
+                json.dump([{'name': 'Second'}], f)
+            os.utime(path, (2000, 2000))
+            self.assertEqual(shells.get_quiztables(), [{'name': 'Second'}])
+
+
+class QuestionImageTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_settings = self.settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.file_name = store_frame(Image.new('RGB', (64, 48), (200, 30, 30)))
+        with open(frame_path(self.file_name), 'rb') as f:
+            self.data = f.read()
+        self.url = reverse('question_image', args=[self.file_name])
+
+    async def test_frame_is_streamed(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(int(response['Content-Length']), len(self.data))
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), self.data)
+
+
+    async def read(self, response) -> bytes:
+        return b''.join([chunk async for chunk in response.streaming_content])
+
+    async def test_byte_ranges_are_served_partially(self):
+        size = len(self.data)
+        for range_header, start, end in (('bytes=0-9', 0, 9), ('bytes=10-', 10, size - 1), ('bytes=-5', size - 5, size - 1), (f'bytes=5-{size + 100}', 5, size - 1)):
+            with self.subTest(range=range_header):
+                response = await self.async_client.get(self.url, headers={'Range': range_header})
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'], f'bytes {start}-{end}/{size}')
+                self.assertEqual(int(response['Content-Length']), end - start + 1)
+                self.assertEqual(await self.read(response), self.data[start:end + 1])
+
+    async def test_ranges_of_another_version_get_the_whole_frame(self):
+        response = await self.async_client.get(self.url, headers={'Range': 'bytes=0-9', 'If-Range': '"other"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(await self.read(response), self.data)
+
+    async def test_unsatisfiable_ranges_are_rejected(self):
+        for range_header in (f'bytes={len(self.data)}-', 'bytes=20-10'):
+            with self.subTest(range=range_header):
+                response = await self.async_client.get(self.url, headers={'Range': range_header})
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], f'bytes */{len(self.data)}')
+
+    async def test_cached_frames_are_not_sent_again(self):
+        response = await self.async_client.get(self.url, headers={'If-None-Match': f'"{self.file_name.split(".")[0]}"'})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], f'"{self.file_name.split(".")[0]}"')
+
+class CreateGameFormTests(TestCase):
+    def test_bad_quiz_table_ids_are_rejected_before_anything_is_created(self):
+        for selected in (['abc'], ['create'], ['999']):
+            with self.subTest(selected=selected):
+                response = self.client.post(reverse('api_create_game'), {'game-name': 'Game', 'selected-quiz-table': selected})
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(Game.objects.exists())
+        self.assertFalse(JepardyTable.objects.exists())
+
+
+class GameImportTests(TestCase):
+    def post(self, question: dict):
+        return self.client.post(reverse('create_full_game_api'), json.dumps({
+            'name': 'Import',
+            'tables': [{'name': 'Table', 'columns': [{'name': 'Column', 'questions': [{'question': 'Q', 'answer': 'A', **question}]}]}],
+            'participants': [],
+        }), content_type='application/json')
+
+    def test_bad_questions_are_rejected_before_anything_is_created(self):
+        for question in ({'points': 100, 'type': 'Essay'}, {'points': True}, {'points': 'many'}, {'points': [100]}):
+            with self.subTest(question=question):
+                response = self.post(question)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+        self.assertFalse(Game.objects.exists())
+        self.assertFalse(GameQuestion.objects.exists())
+
+    def test_points_may_be_sent_as_text_like_the_import_form_does(self):
+        # The view imports in a thread of its own, which the test database transaction would lock out
+        create_game_from_json(json.dumps({
+            'name': 'Import',
+            'tables': [{'name': 'Table', 'columns': [{'name': 'Column', 'questions': [{'question': 'Q', 'answer': 'A', 'points': '200', 'type': 'Input'}]}]}],
+            'participants': [],
+        }))
+        question = JepardyQuestion.objects.select_related('question').get()
+        self.assertEqual((question.points, question.question.question_type), (200, 'Input'))
+
+
+class KeyExportTests(TestCase):
+    def setUp(self):
+        self.admin = get_user_model().objects.create_superuser('admin', password='secret')
+        self.game_ids = [
+            create_game_from_json(json.dumps({'name': f'Game {number}', 'tables': [], 'participants': [{'name': 'Ann'}, {'name': 'Bob'}]})).game_id
+            for number in range(3)
+        ]
+
+    async def export(self, query: str):
+        await self.async_client.aforce_login(self.admin)
+        response = await self.async_client.get(reverse('game_keys_export') + query)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, ''.join([chunk.decode() async for chunk in response.streaming_content])
+
+    async def test_csv_rows_follow_the_header_game_by_game(self):
+        response, content = await self.export(f'?games={self.game_ids[2]},{self.game_ids[0]}')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="game_keys.csv"')
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(list(rows[0]), ['game_id', 'game_name', 'role', 'name', 'key'])
+        self.assertEqual(
+            [(int(row['game_id']), row['role'], row['name']) for row in rows],
+            [(game_id, role, name) for game_id in (self.game_ids[0], self.game_ids[2]) for role, name in (('moderator', ''), ('spectator', ''), ('player', 'Ann'), ('player', 'Bob'))],
+        )
+        game = await Game.objects.aget(id=self.game_ids[0])
+        self.assertEqual((rows[0]['game_name'], rows[0]['key'], rows[1]['key']), ('Game 0', game.moderator_key, game.spectator_key))
+        participant_keys = [key async for key in GameParticipant.objects.filter(game_id=self.game_ids[0]).order_by('id').values_list('private_key', flat=True)]
+        self.assertEqual([rows[2]['key'], rows[3]['key']], participant_keys)
+
+    async def test_ndjson_exports_every_game(self):
+        response, content = await self.export('?format=ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="game_keys.ndjson"')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(rows), 4 * len(self.game_ids))
+        self.assertEqual([row['game_id'] for row in rows if row['role'] == 'moderator'], self.game_ids)
+
+    async def test_bad_queries_are_rejected(self):
+        await self.async_client.aforce_login(self.admin)
+        for query in ('?format=xml', '?games=1,x'):
+            with self.subTest(query=query):
+                self.assertEqual((await self.async_client.get(reverse('game_keys_export') + query)).status_code, 400)
+
+
+class ClockEstimatorTests(TestCase):
+    def setUp(self):
+        self.clock = ClockEstimator()
+        # Client clock 1000 ms ahead, samples of 20 ms and 100 ms round trip and one with a negative round trip
+        self.clock.add_sample(100, 1150 + 30, 200)
+        self.clock.add_sample(0, 1000 + 10, 20)
+        self.clock.add_sample(50, 0, 40)
+
+    def test_offset_is_taken_from_the_smallest_round_trip(self):
+        self.assertEqual(len(self.clock), 2)
+        self.assertEqual(self.clock.rtt, 20)
+        self.assertEqual(self.clock.offset, 1000)
+
+    def test_old_samples_are_forgotten(self):
+        clock = ClockEstimator(sample_count=2)
+        for ping_sent, pong_received in ((0, 10), (100, 150), (200, 240)):
+            clock.add_sample(ping_sent, 1000 + (ping_sent + pong_received) / 2, pong_received)
+        self.assertEqual(clock.rtt, 40)
+
+    def test_press_times_are_clamped_to_the_last_round_trip_before_receipt(self):
+        for client_time, server in ((1495, 495), (1300, 480), (1600, 500), ('x', 500), (float('nan'), 500), (None, 500)):
+            with self.subTest(client_time=client_time):
+                self.assertEqual(self.clock.to_server_time(client_time, 500), server)
+        self.assertEqual(ClockEstimator().to_server_time(1495, 500), 500)
+
+    def test_compensation_is_capped(self):
+        clock = ClockEstimator()
+        clock.add_sample(0, 5000 + 500, 1000)
+        self.assertEqual(clock.to_server_time(5100, 2000), 2000 - BUZZ_MAX_COMPENSATION_MS)
+
+
+class BuzzArbiterTests(TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.arbiter = BuzzArbiter(1, self.loop)
+        self.rankings = []
+
+        async def award(ranking):
+            self.rankings.append(ranking)
+        self.arbiter._award = award
+
+    def run_window(self):
+        self.loop.run_until_complete(asyncio.sleep(self.arbiter.window * 4))
+
+    def test_the_earliest_press_within_the_window_wins(self):
+        self.arbiter.submit(3, 1000.0)
+        self.arbiter.submit(2, 990.0)
+        self.arbiter.submit(1, 990.0)
+        self.arbiter.submit(2, 900.0)
+        self.run_window()
+        self.assertEqual(self.rankings, [[1, 2, 3]])
+        # A buzz after the window starts a race of its own, however early it was pressed
+        self.arbiter.submit(4, 800.0)
+        self.run_window()
+        self.assertEqual(self.rankings, [[1, 2, 3], [4]])
+
+    def test_closed_arbiters_drop_pending_buzzes(self):
+        self.arbiter.submit(1, 1000.0)
+        self.arbiter.close()
+        self.run_window()
+        self.assertEqual(self.rankings, [])
+
+    def test_arbiters_are_dropped_with_their_question(self):
+        arbiter = get_buzz_arbiter(1, self.loop)
+        self.assertIs(get_buzz_arbiter(1, self.loop), arbiter)
+        discard_buzz_arbiter(1)
+        self.assertIsNot(get_buzz_arbiter(1, self.loop), arbiter)
+        discard_buzz_arbiter(1)
+
+
+class UnixSocketChannelLayerTests(TestCase):
+    def setUp(self):
+        self.socket_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.socket_dir, ignore_errors=True)
+
+    def test_group_messages_reach_the_members_of_another_process(self):
+        context = multiprocessing.get_context('spawn')
+        ready, results = context.Event(), context.Queue()
+        worker = context.Process(target=run_worker, args=(self.socket_dir, 2, 2, ready, results))
+        worker.start()
+        self.addCleanup(worker.join)
+        self.assertTrue(ready.wait(30))
+
+        async def main():
+            layer = UnixSocketChannelLayer(self.socket_dir)
+            await layer.new_channel()
+            await layer.group_send(GROUP, {'type': 'game_event'})
+            await layer.group_send(GROUP, {'type': 'game_event', 'html': 'x' * (MAX_PACKET_BYTES - 100)})
+            await layer.close()
+        asyncio.run(main())
+        delivered, _ = results.get(timeout=30)
+        self.assertEqual(delivered, 4)
+
+    def test_oversized_messages_raise_before_anything_is_sent(self):
+        async def main():
+            layer = UnixSocketChannelLayer(self.socket_dir)
+            channel = await layer.new_channel()
+            await layer.group_add(GROUP, channel)
+            with self.assertRaises(PacketTooLarge):
+                await layer.group_send(GROUP, {'type': 'game_event', 'html': 'x' * MAX_PACKET_BYTES})
+            with self.assertRaises(PacketTooLarge):
+                await layer.send('specific.w1!other', {'type': 'game_event', 'html': 'x' * MAX_PACKET_BYTES})
+            await layer.group_send(GROUP, {'type': 'game_event'})
+            self.assertEqual(await layer.receive(channel), {'type': 'game_event'})
+            await layer.close()
+        asyncio.run(main())
+
+    def test_dead_processes_are_forgotten(self):
+        dead = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        dead.bind(os.path.join(self.socket_dir, 'w1.sock'))
+        dead.close()
+
+        async def main():
+            layer = UnixSocketChannelLayer(self.socket_dir)
+            await layer.new_channel()
+            await layer.group_send(GROUP, {'type': 'game_event'})
+            await layer.send('specific.w1!gone', {'type': 'game_event'})
+            self.assertEqual(layer._peers, [])
+            await layer.close()
+        asyncio.run(main())
+        self.assertEqual(os.listdir(self.socket_dir), [])
+
+    def test_a_full_buffer_raises_channel_full(self):
+        stuck = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        stuck.bind(os.path.join(self.socket_dir, 'w1.sock'))
+        self.addCleanup(stuck.close)
+
+        async def main():
+            layer = UnixSocketChannelLayer(self.socket_dir)
+            await layer.new_channel()
+            with mock.patch('game.channel_layers.SEND_RETRIES', 3), self.assertRaises(ChannelFull):
+                for _ in range(10000):
+                    await layer.send('specific.w1!stuck', {'type': 'game_event'})
+            # Group messages skip a process that does not keep up, like full channels
+            await layer.group_send(GROUP, {'type': 'game_event'})
+            await layer.close()
+        asyncio.run(main())
+
+    def test_a_failing_packet_does_not_stop_the_following_ones(self):
+        sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.addCleanup(sender.close)
+
+        async def main():
+            layer = UnixSocketChannelLayer(self.socket_dir, capacity=1)
+            full, other = await layer.new_channel(), await layer.new_channel()
+            await layer.send(full, {'type': 'game_event'})
+            packets = [
+                {'op': 'send', 'channel': full, 'message': {'type': 'game_event'}},
+                {'op': 'unknown'},
+                {'channel': other},
+                [],
+            ]
+            with self.assertLogs('game.channel_layers', 'ERROR') as logs:
+                for packet in packets:
+                    sender.sendto(json.dumps(packet).encode('utf-8'), layer.socket_path)
+                sender.sendto(b'not json', layer.socket_path)
+                sender.sendto(json.dumps({'op': 'send', 'channel': other, 'message': {'type': 'later'}}).encode('utf-8'), layer.socket_path)
+                self.assertEqual(await asyncio.wait_for(layer.receive(other), 5), {'type': 'later'})
+            self.assertEqual(len(logs.records), 5)
+            await layer.close()
+        asyncio.run(main())
+
+
+class HandoffTests(TestCase):
+    def setUp(self):
+        self.snapshot_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.snapshot_root, ignore_errors=True)
+        snapshot_settings = self.settings(SNAPSHOT_ROOT=self.snapshot_root)
+        snapshot_settings.enable()
+        self.addCleanup(snapshot_settings.disable)
+        self.games = [Game.objects.create(name=f'Drained {number}') for number in (1, 2)]
+        for game in self.games:
+            self.addCleanup(set_timer_count, game.id, None)
+
+    def leave_snapshot(self, game: Game, timer: int) -> str:
+        """Writes the snapshot of a game as a drained worker would."""
+        path = snapshot_path(1, game.id)
+        with open(path, 'w') as f:
+            json.dump({'version': game.version, 'guessing': None, 'timer': timer}, f)
+        return path
+
+    def restore(self) -> int:
+        with mock.patch.object(handoff, '_next_check', 0.0):
+            return restore_snapshots()
+
+    def test_snapshots_are_restored_once(self):
+        self.leave_snapshot(self.games[0], 30)
+        self.assertEqual(self.restore(), 1)
+        self.assertEqual(get_timer_count(self.games[0].id), 30)
+        self.assertEqual(os.listdir(self.snapshot_root), [])
+        set_timer_count(self.games[0].id, None)
+        self.assertEqual(self.restore(), 0)
+        self.assertIsNone(get_timer_count(self.games[0].id))
+
+    def test_outdated_snapshots_are_deleted_unread(self):
+        path = self.leave_snapshot(self.games[0], 30)
+        os.utime(path, (time.time() - SNAPSHOT_MAX_AGE - 1,) * 2)
+        bump_game_version(self.games[1].id)
+        self.leave_snapshot(self.games[1], 20)
+        self.assertEqual(self.restore(), 0)
+        self.assertIsNone(get_timer_count(self.games[0].id))
+        self.assertIsNone(get_timer_count(self.games[1].id))
+        self.assertEqual(os.listdir(self.snapshot_root), [])
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.profile_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_root, ignore_errors=True)
+        profile_settings = self.settings(PROFILE_ROOT=self.profile_root)
+        profile_settings.enable()
+        self.addCleanup(profile_settings.disable)
+        # The switch file is read on every message and no earlier reading is remembered
+        switch = mock.patch.multiple(profiling, PROFILE_CONFIG_CHECK_INTERVAL=0, _next_check=0.0, _config=None, _config_mtime=None)
+        switch.start()
+        self.addCleanup(switch.stop)
+
+    def handle(self, message_type: str, game_id: int):
+        with profiling.profile_message(json.dumps({'type': message_type}), game_id):
+            Game.objects.filter(id=game_id).exists()
+
+    def test_matching_messages_are_profiled_and_logged(self):
+        profiling.write_config(['question-click'], [7], time.time() + 60)
+        with self.assertLogs('game.profiling', 'INFO') as logs:
+            self.handle('question-click', 7)
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('Profiled question-click of game 7', logs.output[0])
+        names = sorted(name for name in os.listdir(self.profile_root) if name != profiling.CONFIG_FILE_NAME)
+        self.assertEqual([os.path.splitext(name)[1] for name in names], ['.prof', '.sql'])
+        self.assertGreater(pstats.Stats(os.path.join(self.profile_root, names[0])).total_calls, 0)
+        with open(os.path.join(self.profile_root, names[1])) as f:
+            header, query = f.read().splitlines()
+        self.assertTrue(header.startswith('-- question-click of game 7:'))
+        self.assertIn('1 queries', header)
+        self.assertIn('"game_game"', query)
+
+    def test_nothing_is_written_while_profiling_is_off(self):
+        cases = (
+            ('no switch', None),
+            ('other message', (['show-answer'], [7], time.time() + 60)),
+            ('other game', (['question-click'], [8], time.time() + 60)),
+            ('expired', ([], [], time.time() - 1)),
+        )
+        for name, config in cases:
+            with self.subTest(name):
+                if config is not None:
+                    profiling.write_config(*config)
+                with self.assertNoLogs('game.profiling'):
+                    self.handle('question-click', 7)
+                self.assertEqual([name for name in os.listdir(self.profile_root) if name != profiling.CONFIG_FILE_NAME], [])
+
+
+class TournamentTests(TestCase):
+    def setUp(self):
+        self.tournament = Tournament.objects.create(name='Tournament')
+        self.games = [Game.objects.create(name=f'Round {number}') for number in (1, 2)]
+        for game in self.games:
+            GameParticipant.objects.bulk_create([GameParticipant(game=game, name=name, score=10) for name in ('Red', 'Blue')])
+
+    def standings(self) -> dict[str, int]:
+        return dict(self.tournament.entries.values_list('name', 'score'))
+
+    def test_players_of_the_same_name_share_an_entry(self):
+        self.assertEqual(add_games(self.tournament.id, [game.id for game in self.games]), 4)
+        self.assertEqual(self.standings(), {'Red': 20, 'Blue': 20})
+        self.assertEqual(add_games(self.tournament.id, [self.games[0].id]), 0)
+        self.assertEqual(self.standings(), {'Red': 20, 'Blue': 20})
+        with self.assertRaisesRegex(ValueError, 'another tournament'):
+            add_games(Tournament.objects.create(name='Other').id, [self.games[0].id])
+
+    def test_score_changes_update_the_standings_incrementally(self):
+        add_games(self.tournament.id, [game.id for game in self.games])
+        red, blue = GameParticipant.objects.filter(game=self.games[0]).order_by('name').values_list('id', flat=True)[::-1]
+        # Update, read back scores, update entries, read back standings, whatever the size of the tournament, plus the savepoint
+        with self.assertNumQueries(6):
+            apply_score_deltas({red: 5, blue: -3})
+        self.assertEqual(self.standings(), {'Red': 25, 'Blue': 17})
+        outside = GameParticipant.objects.create(game=Game.objects.create(name='Friendly'), name='Red')
+        with self.assertNumQueries(4):
+            apply_score_deltas({outside.id: 100})
+        self.assertEqual(TournamentEntry.objects.get(name='Red').score, 25)
@@ -0,0 +1,53 @@
+import asyncio
+from asgiref.sync import async_to_sync
+
+
+async def _running_loop():
+    return asyncio.get_running_loop()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Returns the server's event loop. Must be called from a sync consumer handler."""
+    return async_to_sync(_running_loop)()
+
+
+class Throttle:
+    """
+    Runs the coroutine function callback at most once per interval seconds on the given event loop.
+    Requests arriving inside the interval are collapsed into one trailing call at the end of it.
+    request() and cancel() may be called from any thread.
+    """
+
+    def __init__(self, interval: float, callback, loop: asyncio.AbstractEventLoop):
+        self.interval = interval
+        self.callback = callback
+        self.loop = loop
+        self._last_call = float('-inf')
+        self._handle: asyncio.TimerHandle | None = None
+
+    def request(self):
+        """Asks for a callback call."""
+        self.loop.call_soon_threadsafe(self._request)
+
+    def cancel(self):
+        """Drops a pending trailing call."""
+        self.loop.call_soon_threadsafe(self._cancel)
+
+    def _request(self):
+        if self._handle is not None:
+            return
+        wait = self._last_call + self.interval - self.loop.time()
+        if wait > 0:
+            self._handle = self.loop.call_later(wait, self._fire)
+            return
+        self._fire()
+
+    def _cancel(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _fire(self):
+        self._handle = None
+        self._last_call = self.loop.time()
+        self.loop.create_task(self.callback())
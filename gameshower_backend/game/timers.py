@@ -0,0 +1,15 @@
+_counts: dict[int, int | str] = {}
+"""Per game the last timer count the moderator sent, so clients logging in later see the running timer."""
+
+
+def set_timer_count(game_id: int, count: int | str | None):
+    """Records the timer count of a game, None clears it."""
+    if count is None:
+        _counts.pop(game_id, None)
+    else:
+        _counts[game_id] = count
+
+
+def get_timer_count(game_id: int) -> int | str | None:
+    """The last timer count of a game, None if no timer runs."""
+    return _counts.get(game_id)
@@ -0,0 +1,122 @@
+import threading
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models import Sum
+from . import scoring
+from .leaderboard import Leaderboard
+from .models import Game, GameParticipant, TournamentEntry
+from .settings import PROVISION_BATCH_SIZE
+
+_leaderboards: dict[int, Leaderboard] = {}
+_leaderboards_lock = threading.Lock()
+_displays: dict[int, int] = {}
+
+
+def tournament_group_name(tournament_id: int) -> str:
+    """The channel group of the displays of a tournament."""
+    return f'tournament_{tournament_id}'
+
+
+#region standings
+def get_tournament_leaderboard(tournament_id: int) -> Leaderboard:
+    """The overall standings of a tournament, loaded from its materialized entries on first use."""
+    leaderboard = _leaderboards.get(tournament_id)
+    if leaderboard is not None:
+        return leaderboard
+    with _leaderboards_lock:
+        leaderboard = _leaderboards.get(tournament_id)
+        if leaderboard is None:
+            leaderboard = Leaderboard(TournamentEntry.objects.filter(tournament_id=tournament_id).values_list('id', 'name', 'score'))
+            _leaderboards[tournament_id] = leaderboard
+    return leaderboard
+
+
+def apply_standings(tournament_id: int, entries) -> bool:
+    """Applies changed (entry_id, name, score) standings to a loaded leaderboard. Returns whether anything changed."""
+    leaderboard = _leaderboards.get(tournament_id)
+    if leaderboard is None:
+        # Loaded from the database with the change on first use
+        return True
+    changed = False
+    for entry_id, name, score in entries:
+        if entry_id in leaderboard:
+            changed = leaderboard.set_score(entry_id, score) or changed
+        else:
+            leaderboard.add(entry_id, name, score)
+            changed = True
+    return changed
+
+
+def watch_tournament(tournament_id: int):
+    """Counts a display of the tournament connected to this process."""
+    with _leaderboards_lock:
+        _displays[tournament_id] = _displays.get(tournament_id, 0) + 1
+
+
+def unwatch_tournament(tournament_id: int):
+    """
+    Counts a display of the tournament disconnected. Without displays the process no longer receives the
+    standings changes, so the leaderboard is dropped and reloaded when the next display connects.
+    """
+    with _leaderboards_lock:
+        count = _displays.get(tournament_id, 0) - 1
+        if count > 0:
+            _displays[tournament_id] = count
+            return
+        _displays.pop(tournament_id, None)
+        _leaderboards.pop(tournament_id, None)
+
+
+def publish_standings(standings):
+    """Sends changed (tournament_id, entry_id, name, score) standings to the displays of their tournaments."""
+    tournaments: dict[int, list] = {}
+    for tournament_id, entry_id, name, score in standings:
+        tournaments.setdefault(tournament_id, []).append([entry_id, name, score])
+    channel_layer = get_channel_layer()
+    for tournament_id, entries in tournaments.items():
+        async_to_sync(channel_layer.group_send)(tournament_group_name(tournament_id), {'type': 'tournament_scores', 'entries': entries})
+#endregion
+
+
+#region membership
+@transaction.atomic
+def link_participants(tournament_id: int, game_ids: list[int]) -> int:
+    """
+    Adds the participants of games playing in a tournament to its standings. Participants with the same name
+    share an entry, so a team keeps collecting points over the rounds. Their current scores are added once,
+    afterwards every score change updates the entries incrementally. Returns the number of linked participants.
+    """
+    participants = list(
+        GameParticipant.objects.filter(game_id__in=game_ids, game__tournament_id=tournament_id, tournament_entry__isnull=True)
+        .values_list('id', 'name')
+    )
+    if not participants:
+        return 0
+    TournamentEntry.objects.bulk_create(
+        [TournamentEntry(tournament_id=tournament_id, name=name) for name in {name for _, name in participants}],
+        batch_size=PROVISION_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    entry_ids = dict(TournamentEntry.objects.filter(tournament_id=tournament_id).values_list('name', 'id'))
+    GameParticipant.objects.bulk_update(
+        [GameParticipant(id=participant_id, tournament_entry_id=entry_ids[name]) for participant_id, name in participants],
+        ['tournament_entry'],
+        batch_size=PROVISION_BATCH_SIZE,
+    )
+    added = GameParticipant.objects.filter(id__in=[participant_id for participant_id, _ in participants]).values('tournament_entry_id').annotate(total=Sum('score'))
+    scoring.add_to_scores(TournamentEntry, {row['tournament_entry_id']: row['total'] for row in added if row['total']})
+    standings = list(TournamentEntry.objects.filter(id__in=set(entry_ids[name] for _, name in participants)).values_list('tournament_id', 'id', 'name', 'score'))
+    transaction.on_commit(lambda: publish_standings(standings))
+    return len(participants)
+
+
+@transaction.atomic
+def add_games(tournament_id: int, game_ids: list[int]) -> int:
+    """Lets games play in a tournament. Raises ValueError for games of another tournament. Returns the number of linked participants."""
+    other = Game.objects.filter(id__in=game_ids, tournament__isnull=False).exclude(tournament_id=tournament_id).values_list('id', flat=True).first()
+    if other is not None:
+        raise ValueError(f'Game {other} plays in another tournament')
+    Game.objects.filter(id__in=game_ids).update(tournament_id=tournament_id)
+    return link_participants(tournament_id, game_ids)
+#endregion
@@ -8,12 +8,18 @@ urlpatterns = [
     path('timer', views.timer, name='timer'),
     path('player', views.player_page, name='player_page'),
     path('game_keys/<int:game_id>/', views.game_keys_page, name='game_keys'),
+    path('game_keys/export', views.game_keys_export, name='game_keys_export'),
     path('moderator', views.moderator_page, name='moderator_page'),
+    path('tournament', views.tournament_page, name='tournament_page'),
     path('create-game-page', views.create_game_page, name='create_game_page'),
     path('quiz-tables', views.add_quiz_table, name='add_quiz_table'),
     path('api/add-quiz-table', htmx_apis.add_quiz_table, name='add_quiz_table'),
+    path('api/quiz-table-options', htmx_apis.quiz_table_options, name='quiz_table_options'),
+    path('api/search-questions', htmx_apis.search_questions, name='search_questions'),
     path('api/create-game', htmx_apis.create_game, name='api_create_game'),
+    path('api/patch-quiz-table', htmx_apis.patch_quiz_table, name='patch_quiz_table'),
     path('api/load-quiz-table', htmx_apis.laod_quiz_table, name='load_quiz_table'),
     path('api/create-full-game/', plain_db_apis.create_game_api, name='create_full_game_api'),
     path('create/full-game/', views.create_full_game, name='create_full_game'),
+    path('media/question-images/<str:file_name>', views.question_image, name='question_image'),
 ]
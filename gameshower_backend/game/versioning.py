@@ -0,0 +1,14 @@
+from django.db import transaction
+from django.db.models import F
+from .models import Game
+
+
+def bump_game_version(game_id: int, count: int = 1) -> int:
+    """
+    Increments the version of a game after a mutation and returns the new version. A command raising several
+    events takes count versions at once, they are the returned version and the count - 1 before it.
+    """
+    with transaction.atomic():
+        Game.objects.filter(id=game_id).update(version=F('version') + count)
+        return Game.objects.filter(id=game_id).values_list('version', flat=True).get()
+
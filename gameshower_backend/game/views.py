@@ -1,72 +1,141 @@
 from django.shortcuts import render
-from django.http import JsonResponse
-import json
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse, Http404, HttpResponseBadRequest
 import os
+import re
 from .models import Game, JepardyTable
+from .media import FRAME_NAME_PATTERN, aiter_frame, frame_path
+from .provisioning import KEY_EXPORT_FORMATS, aiter_chunks, iter_game_keys
+from .question_bank import quiz_tables, split_page
+from .settings import IMAGE_CACHE_MAX_AGE, QUIZ_TABLE_PAGE_SIZE
+from .shells import get_quiztables, shell_response
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.views.decorators.http import require_safe
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
 
 def admin_required(view_func):
     decorated_view_func = login_required(user_passes_test(lambda u: u.is_superuser)(view_func))
     return decorated_view_func
 
-def index(request):
-    return render(request, 'game/index.html')
+async def index(request):
+    return shell_response(request, 'game/index.html')
 
-def start_game(request):
+async def start_game(request):
+    # The page carries a csrf token, so only the catalog is cached
     quiztables = get_quiztables()
     return render(request, 'game/start_game.html', {'quiztables': quiztables})
 
-def timer(request):
-    return render(request, 'game/timer.html')
+async def timer(request):
+    return shell_response(request, 'game/timer.html')
+
+async def create_game(request):
+    return shell_response(request, 'game/create_game.html')
 
-def get_quiztables():
-    with open(os.path.join(os.path.dirname(__file__), 'quiztables.json')) as f:
-        return json.load(f)
-    
-def create_game(request):
-    return render(request, 'game/create_game.html')
+async def player_page(request):
+    return shell_response(request, 'bases/player_base.html', {'page_title': 'Loading'})
 
-def player_page(request):
-    return render(request, 'bases/player_base.html', {'page_title': 'Loading'})
+async def moderator_page(request):
+    return shell_response(request, 'bases/moderator_base.html', {'page_title': 'Loading'})
 
-def moderator_page(request):
-    return render(request, 'bases/moderator_base.html', {'page_title': 'Loading'})
+async def tournament_page(request):
+    return shell_response(request, 'bases/tournament_base.html', {'page_title': 'Tournament'})
 
-def welcome_page(request):
-    return render(request, 'other/welcome.html', {'page_title': 'Welcome'})
+async def welcome_page(request):
+    return shell_response(request, 'other/welcome.html', {'page_title': 'Welcome'})
 
 @admin_required
-def game_keys_page(request, game_id):
-    desired_game = Game.objects.get(id=game_id)
+async def game_keys_page(request, game_id):
+    desired_game = await Game.objects.aget(id=game_id)
     context = {
         'moderator_key': desired_game.moderator_key,
         'spectator_key': desired_game.spectator_key,
         'participants': [
-            {
-                'name': participant.name,
-                'private_key': participant.private_key
-            } for participant in desired_game.participants.all()
+            participant async for participant in desired_game.participants.values('name', 'private_key')
         ]
     }
     return render(request, 'game/game_keys.html', context=context)
 
 @admin_required
-def create_game_page(request):
+@require_safe
+async def game_keys_export(request):
+    """
+    Streams the keys of all games, or of the games given as ?games=1,2,3, as ?format=csv (default) or ndjson.
+    """
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in KEY_EXPORT_FORMATS:
+        return HttpResponseBadRequest(f'Unknown format, use one of {", ".join(KEY_EXPORT_FORMATS)}')
+    game_ids = None
+    if request.GET.get('games'):
+        try:
+            game_ids = [int(game_id) for game_id in request.GET['games'].split(',')]
+        except ValueError:
+            return HttpResponseBadRequest('games must be a comma separated list of game ids')
+    formatter, content_type = KEY_EXPORT_FORMATS[export_format]
+    return StreamingHttpResponse(
+        aiter_chunks(formatter(iter_game_keys(game_ids))),
+        content_type=content_type,
+        headers={'Content-Disposition': f'attachment; filename="game_keys.{export_format}"'},
+    )
+
+@admin_required
+async def create_game_page(request):
     return render(request, 'creation/game_page.html')
 
 @admin_required
-def create_full_game(request):
+async def create_full_game(request):
     return render(request, 'creation/full_create.html')
 
 @admin_required
-def add_quiz_table(request):
-    quiz_tables = JepardyTable.objects.all()
+async def add_quiz_table(request):
+    rows = [table async for table in quiz_tables(None, QUIZ_TABLE_PAGE_SIZE)]
+    page, next_after = split_page(rows, QUIZ_TABLE_PAGE_SIZE)
     context = {
-        'quiz_tables': [
-            {
-                'id': table.id,
-                'name': table.name,
-            } for table in quiz_tables
-        ]
+        'quiz_tables': page,
+        'next_after': next_after,
+        'select_id': 'quiz-table-select',
     }
     return render(request, 'creation/quiz_table_page.html', context=context)
+
+@require_safe
+async def question_image(request, file_name):
+    """
+    Serves a question image frame. Frames are named by their content hash, so they are cached forever
+    and the name doubles as ETag. Single byte ranges are supported. The file is read in worker threads
+    and streamed, so the event loop never waits for the disk.
+    """
+    if not FRAME_NAME_PATTERN.match(file_name):
+        raise Http404()
+    path = frame_path(file_name)
+    try:
+        size = await sync_to_async(os.path.getsize, thread_sensitive=False)(path)
+    except OSError:
+        raise Http404()
+    etag = f'"{file_name.split(".")[0]}"'
+    headers = {
+        'ETag': etag,
+        'Cache-Control': f'public, max-age={IMAGE_CACHE_MAX_AGE}, immutable',
+        'Accept-Ranges': 'bytes',
+    }
+    if etag in request.headers.get('If-None-Match', ''):
+        return HttpResponseNotModified(headers=headers)
+
+    range_match = RANGE_PATTERN.match(request.headers.get('Range', ''))
+    if range_match is None or request.headers.get('If-Range', etag) != etag:
+        return StreamingHttpResponse(aiter_frame(path, 0, size), content_type='image/jpeg', headers={**headers, 'Content-Length': str(size)})
+
+    start, end = range_match.groups()
+    if start:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    elif end:
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = size, size - 1
+    if start > end or start >= size:
+        return HttpResponse(status=416, headers={**headers, 'Content-Range': f'bytes */{size}'})
+    return StreamingHttpResponse(
+        aiter_frame(path, start, end - start + 1),
+        status=206,
+        content_type='image/jpeg',
+        headers={**headers, 'Content-Range': f'bytes {start}-{end}/{size}', 'Content-Length': str(end - start + 1)},
+    )
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import os
+import time
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.template.loader import get_template
+from django.conf import settings
+from .affinity import worker_for_game
+from .leaderboard import get_leaderboard
+from .media import get_frame_urls
+from .models import Game
+from .settings import WARMUP_GAME_LIMIT
+
+TEMPLATE_DIRECTORY = os.path.join(os.path.dirname(__file__), 'templates')
+
+logger = logging.getLogger(__name__)
+
+
+def compile_templates() -> int:
+    """Compiles every template of the game app into the cached template loader. Returns the number of templates."""
+    count = 0
+    for directory, _, file_names in os.walk(TEMPLATE_DIRECTORY):
+        for file_name in file_names:
+            if not file_name.endswith('.html'):
+                continue
+            get_template(os.path.relpath(os.path.join(directory, file_name), TEMPLATE_DIRECTORY).replace(os.sep, '/'))
+            count += 1
+    return count
+
+
+def preload_games() -> int:
+    """
+    Loads the leaderboards and current image frames of the latest games this worker owns through affinity routing.
+    Without affinity routing no worker owns a game and nothing is preloaded. Returns the number of games.
+    """
+    games = Game.objects.select_related('current_view').order_by('-id')[:WARMUP_GAME_LIMIT]
+    count = 0
+    for game in games:
+        if worker_for_game(game.id) != settings.GAME_WORKER:
+            continue
+        get_leaderboard(game.id)
+        if game.current_view.question_id_id is not None:
+            get_frame_urls(game.current_view.question_id_id)
+        count += 1
+    return count
+
+
+def open_connections():
+    """
+    Opens the database connections of the current thread and of the thread running the sync consumers.
+    Sync consumer handlers called from the server loop all run in the one thread of thread sensitive sync_to_async.
+    """
+    def connect():
+        for connection in connections.all():
+            connection.ensure_connection()
+    connect()
+    # A loop of its own, the server's loop is not running yet and stays the current one
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(sync_to_async(connect, thread_sensitive=True)())
+    finally:
+        loop.close()
+
+
+def warm_up() -> dict[str, float]:
+    """Runs all warmup stages and returns their durations in ms."""
+    timings = {}
+    start = time.perf_counter()
+    open_connections()
+    timings['connections'] = (time.perf_counter() - start) * 1000
+    stage_start = time.perf_counter()
+    template_count = compile_templates()
+    timings['templates'] = (time.perf_counter() - stage_start) * 1000
+    stage_start = time.perf_counter()
+    game_count = preload_games()
+    timings['games'] = (time.perf_counter() - stage_start) * 1000
+    timings['total'] = (time.perf_counter() - start) * 1000
+    logger.info(
+        'Warmup done in %.0f ms: connections %.0f ms, %d templates %.0f ms, %d games %.0f ms',
+        timings['total'], timings['connections'], template_count, timings['templates'], game_count, timings['games'],
+    )
+    return timings
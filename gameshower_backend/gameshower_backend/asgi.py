@@ -1,15 +1,24 @@
 import os
-import django
-from channels.routing import get_default_application
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
-from game.routing import websocket_urlpatterns
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gameshower_backend.settings')
 
+# Sets up Django, everything importing models has to come after it
+django_asgi_app = get_asgi_application()
+
+from game.routing import websocket_urlpatterns
+from game.warmup import warm_up
+from game.handoff import install_drain_signal
+
+# The server only starts accepting connections once the application is imported, so the first clients find it warm
+warm_up()
+# kill -USR1 <pid> hands the live games over to a replacement worker, see game/handoff.py
+install_drain_signal()
+
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
+    "http": django_asgi_app,
     "websocket": AuthMiddlewareStack(
         URLRouter(
             websocket_urlpatterns
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -76,6 +77,15 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections open between consumer handlers, the warmup opens them at startup
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        # The JSON import writes from a thread of its own: WAL keeps readers out of its way and
+        # IMMEDIATE transactions take the write lock up front instead of failing on the upgrade
+        'OPTIONS': {
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
@@ -121,6 +131,42 @@ STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
 
+STATIC_ROOT = BASE_DIR / "staticfiles"
+
+# Uploaded and generated files, e.g. question image frames
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / "media"
+
+# Message profiles and SQL traces written while profiling is switched on, see the profile_messages command
+PROFILE_ROOT = Path(os.environ.get('GAMESHOWER_PROFILE_DIR', BASE_DIR / "profiles"))
+
+# Live game state a draining worker hands over to its replacement, see game/handoff.py
+SNAPSHOT_ROOT = Path(os.environ.get('GAMESHOWER_SNAPSHOT_DIR', BASE_DIR / "snapshots"))
+
+# Diagnostics of the game app (written profiles, drains, reaped connections) go to the console.
+# Set GAMESHOWER_LOG_LEVEL, e.g. to DEBUG for every rejected client message or WARNING for quiet test runs.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'game': {'handlers': ['console'], 'level': os.environ.get('GAMESHOWER_LOG_LEVEL', 'INFO')},
+    },
+}
+
+# Hashed file names (e.g. styles.3f2a9c.css) so the web server can serve
+# static files with a far-future, immutable Cache-Control header.
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.ManifestStaticFilesStorage",
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -145,3 +191,19 @@ CHANNEL_LAYERS = {
         'BACKEND': 'channels.layers.InMemoryChannelLayer',
     },
 }
+
+# Set GAMESHOWER_CHANNEL_SOCKET_DIR to run several worker processes on one host,
+# they exchange channel messages over unix sockets in that directory.
+if os.environ.get('GAMESHOWER_CHANNEL_SOCKET_DIR'):
+    CHANNEL_LAYERS['default'] = {
+        'BACKEND': 'game.channel_layers.UnixSocketChannelLayer',
+        'CONFIG': {
+            'socket_dir': os.environ['GAMESHOWER_CHANNEL_SOCKET_DIR'],
+        },
+    }
+
+# Game affinity routing: GAMESHOWER_WORKERS lists the websocket base URL of every worker process
+# (e.g. "ws://localhost:8001,ws://localhost:8002"), GAMESHOWER_WORKER is the URL of this process.
+# Clients logging in on the wrong worker are sent to the one owning their game.
+GAME_WORKERS = [url.strip() for url in os.environ.get('GAMESHOWER_WORKERS', '').split(',') if url.strip()]
+GAME_WORKER = os.environ.get('GAMESHOWER_WORKER', '')
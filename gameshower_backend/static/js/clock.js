@@ -0,0 +1,15 @@
+// Client clock used for clock pings and buzzer timestamps.
+function gameshowerClock() {
+  return performance.timeOrigin + performance.now();
+}
+
+// Answers clock pings right away instead of swapping them into the page.
+document.addEventListener('htmx:wsBeforeMessage', function (event) {
+  if (!event.detail.message.startsWith('<div id="clock_ping"')) {
+    return;
+  }
+  const clientTime = gameshowerClock();
+  const serverTime = event.detail.message.match(/data-server-time="([^"]+)"/)[1];
+  event.detail.socketWrapper.send(JSON.stringify({type: 'clock-pong', serverTime: serverTime, clientTime: clientTime}), event.target);
+  event.preventDefault();
+});
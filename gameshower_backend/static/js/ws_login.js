@@ -0,0 +1,7 @@
+// Logs in again after the server moved the websocket to the worker owning the game.
+document.addEventListener('htmx:wsOpen', function (event) {
+  const loginKey = event.target.dataset.loginKey;
+  if (loginKey) {
+    event.detail.socketWrapper.send(JSON.stringify({type: 'login', gameCode: loginKey}), event.target);
+  }
+});